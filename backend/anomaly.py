@@ -0,0 +1,147 @@
+"""Streaming price-anomaly detection over the mandi price feed
+
+Each (commodity, district, market) series keeps an exponentially weighted
+mean and variance of its modal price in shared NumPy arrays. Every record
+is scored against its series' state before being folded in. When the
+z-score passes the threshold, an alert is appended to a bounded,
+time-ordered buffer that /api/demand-alerts reads directly. One call to
+`update_frame` is one ingest tick. Alerts are raised during the tick that
+delivers the record, not when a batch job runs again.
+"""
+import math
+import threading
+from collections import deque
+
+import numpy as np
+
+EWMA_ALPHA = 0.1
+Z_THRESHOLD = 3.0
+# Reports a series needs before it can raise alerts
+WARMUP_REPORTS = 10
+# Floor on the standard deviation, relative to the mean, so flat series don't alert on noise
+MIN_RELATIVE_STD = 0.02
+MAX_ALERTS = 200
+
+
+class AnomalyDetector:
+    """EWMA mean/variance per market series and a ring buffer of alerts"""
+
+    def __init__(self, alpha=EWMA_ALPHA, threshold=Z_THRESHOLD, warmup=WARMUP_REPORTS,
+                 max_alerts=MAX_ALERTS, capacity=256):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self.slots = {}
+        self.keys = []
+        self.alerts = deque(maxlen=max_alerts)
+        self.tick = 0
+        self.counters = {'records': 0, 'out_of_order': 0, 'alerts': 0}
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        mean = np.zeros(capacity, dtype=np.float64)
+        var = np.zeros(capacity, dtype=np.float64)
+        reports = np.zeros(capacity, dtype=np.int32)
+        last_day = np.full(capacity, np.iinfo(np.int32).min, dtype=np.int32)
+        used = len(self.keys)
+        if used:
+            mean[:used] = self.mean[:used]
+            var[:used] = self.var[:used]
+            reports[:used] = self.reports[:used]
+            last_day[:used] = self.last_day[:used]
+        self.mean, self.var, self.reports, self.last_day = mean, var, reports, last_day
+
+    def _slot(self, key):
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = len(self.keys)
+            if slot == len(self.mean):
+                self._allocate(2 * slot)
+            self.slots[key] = slot
+            self.keys.append(key)
+        return slot
+
+    def _observe(self, key, day, price):
+        slot = self._slot(key)
+        self.counters['records'] += 1
+        if day < self.last_day[slot]:
+            self.counters['out_of_order'] += 1
+            return None
+        self.last_day[slot] = day
+
+        if self.reports[slot] == 0:
+            self.mean[slot] = price
+            self.reports[slot] = 1
+            return None
+
+        mean = self.mean[slot]
+        std = max(math.sqrt(self.var[slot]), MIN_RELATIVE_STD * mean)
+        zscore = (price - mean) / std
+        alert = None
+        if self.reports[slot] >= self.warmup and abs(zscore) >= self.threshold:
+            alert = self._alert(key, day, price, mean, zscore)
+
+        diff = price - mean
+        increment = self.alpha * diff
+        self.mean[slot] = mean + increment
+        self.var[slot] = (1 - self.alpha) * (self.var[slot] + diff * increment)
+        self.reports[slot] += 1
+        return alert
+
+    def _alert(self, key, day, price, expected, zscore):
+        commodity, district, market = key
+        alert = {
+            'id': self._next_id,
+            'kind': 'spike' if zscore > 0 else 'drop',
+            'commodity': commodity,
+            'district': district,
+            'market': market,
+            'day': int(day),
+            'price': round(float(price), 2),
+            'expected': round(float(expected), 2),
+            'change_pct': round(float(price / expected - 1) * 100, 2),
+            'zscore': round(float(zscore), 2),
+            'tick': self.tick
+        }
+        self._next_id += 1
+        self.counters['alerts'] += 1
+        self.alerts.append(alert)
+        return alert
+
+    def update_frame(self, frame):
+        """Score and absorb one ingest chunk (commodity, district_name, market_name, date, p_modal); returns its alerts"""
+        with self._lock:
+            self.tick += 1
+            raised = []
+            for commodity, district, market, day, price in zip(frame['commodity'], frame['district_name'],
+                                                               frame['market_name'], frame['date'], frame['p_modal']):
+                alert = self._observe((commodity, district, market), int(day), float(price))
+                if alert is not None:
+                    raised.append(alert)
+            return raised
+
+    def recent(self, limit=None, commodity=None, district=None):
+        """Newest alerts first, optionally filtered by commodity and district name"""
+        with self._lock:
+            alerts = list(self.alerts)
+        alerts = [alert for alert in reversed(alerts)
+                  if (commodity is None or alert['commodity'] == commodity) and
+                  (district is None or alert['district'].lower() == district)]
+        return alerts[:limit] if limit else alerts
+
+    def clear(self):
+        with self._lock:
+            self.slots, self.keys = {}, []
+            self.alerts.clear()
+            self._allocate(len(self.mean))
+
+    def stats(self):
+        return {
+            **self.counters,
+            'series': len(self.keys),
+            'buffered_alerts': len(self.alerts),
+            'tick': self.tick,
+            'bytes': int(self.mean.nbytes + self.var.nbytes + self.reports.nbytes + self.last_day.nbytes)
+        }
@@ -1,302 +1,140 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g
 import pickle
 import numpy as np
-from datetime import datetime
+from datetime import datetime, timedelta
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
 import logging
-import random
+import time
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from catalog import (COMMODITY_CONFIG, COMMODITY_FILES, DISTRICT_TO_MARKETS, DISTRICT_ALIASES, HARVEST_TIME,
+                     SOIL_AFFINITY, build_feature_row, build_feature_grid)
+from registry import ModelRegistry
+from bundle import BUNDLES_PATH
+from prediction_cache import PredictionCache
+from price_table import DailyPriceTable
+from district_index import DistrictIndex, market_key
+from static_responses import VersionedResponseCache
+from serialization import compress_response, json_provider, parse_fields, project
+from market_stats import RollingAggregates, WINDOW_DAYS
+from anomaly import AnomalyDetector
+from metrics import MetricsRegistry, process_memory
+from single_flight import SingleFlight
+from intervals import PriceIntervals, parse_quantiles, tree_predictions
+from crop_health import CropHealthJobs, QueueFull, UploadTooLarge
+import request_log
+import history_store
+import timeseries
+import crop_health
+import profitability
+import ingest
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging: records are written by a background thread. LOG_FORMAT=json
+# emits one JSON object per line. LOG_SAMPLE_RATES keeps a fraction of each
+# route's INFO lines, e.g. "predict=0.01,predict_batch=0.1" (default: all).
+request_log.configure_logging(
+    level=os.environ.get('LOG_LEVEL', 'INFO'),
+    json_lines=os.environ.get('LOG_FORMAT', 'text') == 'json',
+    queue_size=int(os.environ.get('LOG_QUEUE_SIZE', 10000)),
+    sample_rates=request_log.parse_sample_rates(os.environ.get('LOG_SAMPLE_RATES')),
+    default_rate=float(os.environ.get('LOG_SAMPLE_DEFAULT', 1.0))
+)
 logger = logging.getLogger(__name__)
+# Sampled, lazily formatted logger for per-request lines
+hot_log = request_log.RequestLogger(logger)
 
 app = Flask(__name__)
 CORS(app, origins=["http://localhost:3000"])
+# JSON_SERIALIZER=orjson (default, when installed) or stdlib
+app.json = json_provider(os.environ.get('JSON_SERIALIZER', 'orjson'))(app)
+# JSON responses at least this large are gzip/brotli compressed for clients that accept it (0 disables)
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
 
-# Commodity configuration
-COMMODITY_CONFIG = {
-    'bajra': {
-        'name': 'Bajra',
-        'display_name': '🌾 Bajra',
-        'default_p_min': 1800,
-        'default_p_max': 2500,
-        'color': 'green',
-        'icon': '🌾'
-    },
-    'wheat': {
-        'name': 'Wheat',
-        'display_name': '🌾 Wheat', 
-        'default_p_min': 2000,
-        'default_p_max': 2800,
-        'color': 'amber',
-        'icon': '🌾'
-    },
-    'cotton': {
-        'name': 'Cotton',
-        'display_name': '🧵 Cotton',
-        'default_p_min': 5000, 
-        'default_p_max': 8000,
-        'color': 'blue',
-        'icon': '🧵'
-    },
-    'jowar': {
-        'name': 'Jowar',
-        'display_name': '🌾 Jowar',
-        'default_p_min': 1900,
-        'default_p_max': 2600, 
-        'color': 'purple',
-        'icon': '🌾'
-    },
-    'rice': {
-        'name': 'Rice',
-        'display_name': '🍚 Rice',
-        'default_p_min': 2500,
-        'default_p_max': 5000,
-        'color': 'red',
-        'icon': '🍚'
-    },
-    'chikoo': {
-        'name': 'Chikoo',
-        'display_name': '🥭 Chikoo',
-        'default_p_min': 3000,
-        'default_p_max': 6000,
-        'color': 'green',
-        'icon': '🥭'
-    },
-    'grapes': {
-        'name': 'Grapes',
-        'display_name': '🍇 Grapes',
-        'default_p_min': 4000,
-        'default_p_max': 8000,
-        'color': 'purple',
-        'icon': '🍇'
-    },
-    'mangos': {
-        'name': 'Mangoes',
-        'display_name': '🥭 Mangoes',
-        'default_p_min': 2000,
-        'default_p_max': 5000,
-        'color': 'orange',
-        'icon': '🥭'
-    },
-    'orange': {
-        'name': 'Orange',
-        'display_name': '🍊 Orange',
-        'default_p_min': 2500,
-        'default_p_max': 4500,
-        'color': 'orange',
-        'icon': '🍊'
-    },
-    'papaya': {
-        'name': 'Papaya',
-        'display_name': '🍈 Papaya',
-        'default_p_min': 1500,
-        'default_p_max': 3000,
-        'color': 'yellow',
-        'icon': '🍈'
-    }
-}
+# Prometheus metrics, scraped from /api/metrics
+METRICS = MetricsRegistry(prefix='mandinetra_')
+REQUEST_SECONDS = METRICS.histogram('http_request_duration_seconds', 'Request latency by endpoint', ('endpoint', 'method'))
+REQUESTS_TOTAL = METRICS.counter('http_requests_total', 'Requests by endpoint and status', ('endpoint', 'method', 'status'))
+PREDICT_STAGE_SECONDS = METRICS.histogram(
+    'predict_stage_seconds',
+    'Time spent per prediction stage (resolve_district, resolve_market, encode, lookup, features, preprocess, model, engine, intervals, serialize)',
+    ('stage', 'commodity')
+)
+PREDICTIONS_TOTAL = METRICS.counter('predictions_total', 'Predicted prices served, by where they came from', ('commodity', 'source'))
+PREDICTION_ERRORS = METRICS.counter('prediction_errors_total', 'Rejected prediction items by error class', ('endpoint', 'kind', 'commodity'))
+MODEL_LOAD_SECONDS = METRICS.histogram('model_load_seconds', 'Model load time', ('commodity', 'source', 'outcome'))
+STARTUP_SECONDS = METRICS.gauge('startup_seconds', 'Time spent in each startup phase', ('phase',))
+startup_start = time.perf_counter()
 
-# File name patterns for each commodity
-COMMODITY_FILES = {
-    'bajra': {
-        'model': './models/bajra_model.pkl',
-        'preprocessor': './models/bajra_preprocessor.pkl',
-        'district_encoder': './models/Bajradistrict_encoder.pkl'
-    },
-    'wheat': {
-        'model': './models/wheat_model.pkl',
-        'preprocessor': './models/wheat_preprocessor.pkl',
-        'district_encoder': './models/Wheatdistrict_encoder.pkl'
-    },
-    'cotton': {
-        'model': './models/cotton_model.pkl',
-        'preprocessor': './models/cotton_preprocessor.pkl',
-        'district_encoder': './models/Cottondistrict_encoder.pkl'
-    },
-    'jowar': {
-        'model': './models/jowar_model.pkl',
-        'preprocessor': './models/jowar_preprocessor.pkl',
-        'district_encoder': './models/Jowardistrict_encoder.pkl'
-    },
-    'rice': {
-        'model': './models/rice_model.pkl',
-        'preprocessor': './models/rice_preprocessor.pkl',
-        'district_encoder': './models/Ricedistrict_encoder.pkl'
-    },
-    'chikoo': {
-        'model': './models/chikoo_model.pkl',
-        'preprocessor': './models/chikoo_preprocessor.pkl',
-        'district_encoder': './models/chikoodistrict_encoder.pkl'
-    },
-    'grapes': {
-        'model': './models/grapes_model.pkl',
-        'preprocessor': './models/grapes_preprocessor.pkl',
-        'district_encoder': './models/grapesdistrict_encoder.pkl'
-    },
-    'mangos': {
-        'model': './models/mangos_model.pkl',
-        'preprocessor': './models/mangos_preprocessor.pkl',
-        'district_encoder': './models/mangosdistrict_encoder.pkl'
-    },
-    'orange': {
-        'model': './models/orange_model.pkl',
-        'preprocessor': './models/orange_preprocessor.pkl',
-        'district_encoder': './models/orangedistrict_encoder.pkl'
-    },
-    'papaya': {
-        'model': './models/papaya_model.pkl',
-        'preprocessor': './models/papaya_preprocessor.pkl',
-        'district_encoder': './models/papayadistrict_encoder.pkl'
-    }
-}
+# Compile forests into flat-array engines at load time (parity-checked against sklearn)
+COMPILED_INFERENCE = os.environ.get('COMPILED_INFERENCE', '1') == '1'
 
-# Maharashtra districts and markets - EXPANDED WITH NAGPUR
-DISTRICT_TO_MARKETS = {
-    'ahmadnagar': {
-        'district_name': 'Ahmadnagar',
-        'markets': ['Ahmednagar', 'Ahmedpur', 'Akhadabalapur'],
-        'district_id': 501,
-        'market_id': 1101
-    },
-    'akola': {
-        'district_name': 'Akola',
-        'markets': ['Akola', 'Akot', 'Achalpur'],
-        'district_id': 502,
-        'market_id': 1102
-    },
-    'amravati': {
-        'district_name': 'Amravati',
-        'markets': ['Amravati', 'Achalpur'],
-        'district_id': 503,
-        'market_id': 1103
-    },
-    'aurangabad': {
-        'district_name': 'Aurangabad',
-        'markets': ['Aurangabad'],
-        'district_id': 504,
-        'market_id': 1104
-    },
-    'bid': {
-        'district_name': 'Bid',
-        'markets': ['Ahmedpur'],
-        'district_id': 505,
-        'market_id': 1105
-    },
-    'bhandara': {
-        'district_name': 'Bhandara',
-        'markets': ['Bhandara', 'Tumsar'],
-        'district_id': 506,
-        'market_id': 1106
-    },
-    'nandurbar': {
-        'district_name': 'Nandurbar',
-        'markets': ['Nandurbar'],
-        'district_id': 497,
-        'market_id': 165
-    },
-    'nashik': {
-        'district_name': 'Nashik',
-        'markets': ['Nashik', 'Malegaon'],
-        'district_id': 507,
-        'market_id': 1107
-    },
-    'pune': {
-        'district_name': 'Pune',
-        'markets': ['Pune', 'Baramati'],
-        'district_id': 508,
-        'market_id': 1108
-    },
-    'kolhapur': {
-        'district_name': 'Kolhapur',
-        'markets': ['Kolhapur'],
-        'district_id': 509,
-        'market_id': 1109
-    },
-    'nagpur': {
-        'district_name': 'Nagpur',
-        'markets': ['Nagpur', 'Katol', 'Kalmeshwar', 'Umred'],
-        'district_id': 510,
-        'market_id': 1110
-    },
-    'yavatmal': {
-        'district_name': 'Yavatmal',
-        'markets': ['Yavatmal', 'Wani'],
-        'district_id': 511,
-        'market_id': 1111
-    },
-    'latur': {
-        'district_name': 'Latur',
-        'markets': ['Latur'],
-        'district_id': 512,
-        'market_id': 1112
-    },
-    'jalna': {
-        'district_name': 'Jalna',
-        'markets': ['Jalna'],
-        'district_id': 513,
-        'market_id': 1113
-    },
-    'thane': {
-        'district_name': 'Thane',
-        'markets': ['Thane', 'Kalyan'],
-        'district_id': 514,
-        'market_id': 1114
-    }
-}
+# Commodity models are loaded lazily on first request and kept in an LRU
+# bounded by MODEL_CACHE_MAX_MODELS entries and MODEL_CACHE_MAX_MB megabytes (0 = no limit).
+# Versioned bundles under MODEL_BUNDLES_PATH take precedence over the legacy pickles.
+# MODEL_SHARED_WEIGHTS=1 exports legacy pickles to bundles once so every worker
+# process maps the same read-only weights; MODEL_PRELOAD=1 maps them all at startup.
+logger.info("🚀 Discovering commodity models...")
+logger.info(f"📁 Current directory: {os.getcwd()}")
 
-STATE_ID = 27
+COMMODITY_MODELS = ModelRegistry(
+    COMMODITY_FILES,
+    max_models=int(os.environ.get('MODEL_CACHE_MAX_MODELS', 6)),
+    max_bytes=int(float(os.environ.get('MODEL_CACHE_MAX_MB', 0)) * 1024 * 1024),
+    compile_models=COMPILED_INFERENCE,
+    bundles_path=os.environ.get('MODEL_BUNDLES_PATH', BUNDLES_PATH),
+    verify_bundles=os.environ.get('MODEL_BUNDLES_VERIFY', '1') == '1',
+    shared_weights=os.environ.get('MODEL_SHARED_WEIGHTS', '0') == '1'
+)
+STARTUP_SECONDS.set(time.perf_counter() - startup_start, phase='model_discovery')
+COMMODITY_MODELS.add_load_listener(
+    lambda commodity, source, seconds, ok: MODEL_LOAD_SECONDS.observe(seconds, commodity=commodity, source=source,
+                                                                      outcome='ok' if ok else 'error')
+)
+if os.environ.get('MODEL_PRELOAD', '0') == '1':
+    preload_start = time.perf_counter()
+    COMMODITY_MODELS.preload()
+    STARTUP_SECONDS.set(time.perf_counter() - preload_start, phase='model_preload')
+# Seconds between checks for newly published bundles (0 disables the watcher)
+BUNDLE_WATCH_INTERVAL = float(os.environ.get('BUNDLE_WATCH_INTERVAL', 30))
+# Shared secret for /api/admin/*; without one only loopback clients are allowed
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+available_commodities = COMMODITY_MODELS.available
+COMMODITY_DISTRICTS = COMMODITY_MODELS.districts
 
-# Load all commodity models with error handling
-COMMODITY_MODELS = {}
-available_commodities = []
-COMMODITY_DISTRICTS = {}
+logger.info(f"🌾 Available commodities: {available_commodities}")
 
-logger.info("🚀 Loading commodity models...")
-logger.info(f"📁 Current directory: {os.getcwd()}")
+# Predictions carry quantile bands of the forest's per-tree outputs, e.g.
+# PREDICTION_QUANTILES="0.05,0.5,0.95"; the outermost pair is the interval
+PRICE_INTERVALS = PriceIntervals(parse_quantiles(os.environ.get('PREDICTION_QUANTILES')))
 
-for commodity, files in COMMODITY_FILES.items():
-    try:
-        logger.info(f"🔍 Attempting to load {commodity}...")
-        
-        # Check if essential files exist
-        missing_files = []
-        for file_type, file_path in files.items():
-            if not os.path.exists(file_path):
-                missing_files.append(f"{file_type}: {file_path}")
-        
-        if missing_files:
-            logger.warning(f"❌ Missing files for {commodity}: {', '.join(missing_files)}")
-            continue
-            
-        # Load files
-        with open(files['model'], "rb") as f:
-            model = pickle.load(f)
-        with open(files['preprocessor'], "rb") as f:
-            preprocessor = pickle.load(f)
-        with open(files['district_encoder'], "rb") as f:
-            district_encoder = pickle.load(f)
-        
-        COMMODITY_MODELS[commodity] = {
-            'model': model,
-            'preprocessor': preprocessor,
-            'district_encoder': district_encoder
-        }
-        available_commodities.append(commodity)
-        
-        # Store the districts this commodity knows
-        if hasattr(district_encoder, 'classes_'):
-            COMMODITY_DISTRICTS[commodity] = [district.strip() for district in district_encoder.classes_]
-            logger.info(f"✅ {commodity} loaded with {len(COMMODITY_DISTRICTS[commodity])} districts")
-        else:
-            COMMODITY_DISTRICTS[commodity] = []
-            logger.info(f"✅ {commodity} loaded (no district classes info)")
-            
-    except Exception as e:
-        logger.error(f"❌ Error loading {commodity}: {str(e)}")
+# Same-day predictions (price and interval) are reused until the date rolls over or models reload
+PREDICTION_CACHE = PredictionCache(max_entries=int(os.environ.get('PREDICTION_CACHE_SIZE', 10000)))
+COMMODITY_MODELS.add_reload_listener(PREDICTION_CACHE.invalidate)
+
+def build_district_index():
+    """Resolution index over DISTRICT_TO_MARKETS and the current encoders"""
+    return DistrictIndex(DISTRICT_TO_MARKETS, DISTRICT_ALIASES, COMMODITY_DISTRICTS, COMMODITY_MODELS.encoders)
 
-logger.info(f"🌾 Available commodities: {available_commodities}")
+
+def rebuild_district_index():
+    global DISTRICT_INDEX
+    DISTRICT_INDEX = build_district_index()
+
+
+DISTRICT_INDEX = build_district_index()
+COMMODITY_MODELS.add_reload_listener(rebuild_district_index)
+
+# Catalog responses are serialized once per registry version and `fields=` projection
+# and served with ETags; compressed variants are cached next to the plain body
+CATALOG_RESPONSES = VersionedResponseCache(
+    version=lambda: COMMODITY_MODELS.version,
+    max_age=int(os.environ.get('CATALOG_MAX_AGE', 300)),
+    max_entries=int(os.environ.get('CATALOG_MAX_ENTRIES', 512)),
+    compress_min_bytes=COMPRESS_MIN_BYTES
+)
 
 # Debug: Check what districts orange model knows
 if 'orange' in COMMODITY_DISTRICTS:
@@ -315,6 +153,10 @@ def home():
 @app.route('/api/commodities', methods=['GET'])
 def get_commodities():
     """Get available commodities"""
+    return CATALOG_RESPONSES.respond('commodities', commodities_payload)
+
+
+def commodities_payload():
     commodities_list = []
     for commodity in available_commodities:
         config = COMMODITY_CONFIG.get(commodity, {})
@@ -325,7 +167,7 @@ def get_commodities():
             "icon": config.get('icon', '🌾')
         })
     
-    return jsonify({"commodities": commodities_list})
+    return {"commodities": commodities_list}
 
 @app.route('/api/districts/<commodity>', methods=['GET'])
 def get_districts(commodity):
@@ -339,33 +181,10 @@ def get_districts(commodity):
             }), 400
         
         # Get districts that this commodity supports
-        supported_districts = COMMODITY_DISTRICTS.get(commodity_lower, [])
-        districts = []
-        
-        for district_name in supported_districts:
-            # Clean district name for matching
-            clean_district_name = district_name.strip().lower()
-            
-            # Find matching district info
-            found = False
-            for district_id, district_info in DISTRICT_TO_MARKETS.items():
-                if district_info['district_name'].lower() == clean_district_name:
-                    districts.append({
-                        "id": district_id,
-                        "name": district_info['district_name']
-                    })
-                    found = True
-                    break
-            
-            # If not found in DISTRICT_TO_MARKETS, still include it
-            if not found:
-                districts.append({
-                    "id": clean_district_name.replace(' ', '_'),
-                    "name": district_name.strip()
-                })
-        
-        logger.info(f"📋 Returning {len(districts)} districts for {commodity}")
-        return jsonify({"districts": districts})
+        districts = DISTRICT_INDEX.commodity_districts.get(commodity_lower, [])
+
+        hot_log.info("📋 Returning %d districts for %s", len(districts), commodity_lower)
+        return CATALOG_RESPONSES.respond(('districts', commodity_lower), lambda: {"districts": districts})
         
     except Exception as e:
         logger.error(f"Error getting districts for {commodity}: {str(e)}")
@@ -375,36 +194,22 @@ def get_districts(commodity):
 def get_markets(district):
     """Get markets for a specific district"""
     try:
-        district_lower = district.lower()
-        district_info = DISTRICT_TO_MARKETS.get(district_lower)
-        
+        district_info = DISTRICT_INDEX.resolve(district.lower())
         if not district_info:
-            # Try to find by partial match or name match
-            matching_districts = []
-            for dist_id, dist_info in DISTRICT_TO_MARKETS.items():
-                if (district_lower in dist_id or 
-                    district_lower in dist_info['district_name'].lower() or
-                    dist_info['district_name'].lower() in district_lower):
-                    matching_districts.append((dist_id, dist_info))
-            
-            if matching_districts:
-                district_id, district_info = matching_districts[0]
-                logger.info(f"🔍 Found matching district '{district_info['district_name']}' for input '{district}'")
-            else:
-                return jsonify({
-                    "error": f"District '{district}' not found.",
-                    "available_districts": list(DISTRICT_TO_MARKETS.keys())
-                }), 404
-        
+            return jsonify({
+                "error": f"District '{district}' not found.",
+                "available_districts": list(DISTRICT_TO_MARKETS.keys())
+            }), 404
+
         markets = []
         for market in district_info['markets']:
             markets.append({
-                "id": market.lower().replace(' ', '_'),
+                "id": market_key(market),
                 "name": market
             })
             
-        logger.info(f"🏪 Returning {len(markets)} markets for {district_info['district_name']}")
-        return jsonify({
+        hot_log.info("🏪 Returning %d markets for %s", len(markets), district_info['district_name'])
+        return CATALOG_RESPONSES.respond(('markets', district_info['district_name']), lambda: {
             "markets": markets,
             "district_name": district_info['district_name']
         })
@@ -413,6 +218,172 @@ def get_markets(district):
         logger.error(f"Error getting markets for {district}: {str(e)}")
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
+class PredictionError(Exception):
+    """Validation failure for a single prediction item"""
+
+    def __init__(self, message, status_code=400, kind='invalid_request', commodity=''):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        # Error class and (known) commodity for the prediction_errors_total metric
+        self.kind = kind
+        self.commodity = commodity
+
+
+def prepare_prediction(data):
+    """Validate a prediction request and encode its district
+
+    Returns a dict with the resolved commodity, district info, market and
+    encoded district, or raises PredictionError. Rejections are counted by
+    error class.
+    """
+    try:
+        return resolve_prediction(data)
+    except PredictionError as e:
+        PREDICTION_ERRORS.inc(endpoint=request.endpoint, kind=e.kind, commodity=e.commodity)
+        raise
+
+
+def resolve_prediction(data):
+    commodity = (data.get('commodity') or '').lower()
+    district_input = (data.get('district') or '').lower()
+    market_input = (data.get('market') or '').lower()
+
+    # Validation
+    if not commodity:
+        raise PredictionError("Commodity is required", kind='missing_field')
+    if not district_input:
+        raise PredictionError("District is required", kind='missing_field')
+    if not market_input:
+        raise PredictionError("Market is required", kind='missing_field')
+
+    if commodity not in COMMODITY_MODELS:
+        raise PredictionError(
+            f"Commodity '{commodity}' not available. Available: {', '.join(available_commodities)}",
+            kind='unknown_commodity'
+        )
+
+    # Get district info
+    district_index = DISTRICT_INDEX
+    with PREDICT_STAGE_SECONDS.time(stage='resolve_district', commodity=commodity):
+        district_id = district_index.resolve_id(district_input)
+    if not district_id:
+        raise PredictionError(
+            f"District '{district_input}' not found. Available districts: {list(DISTRICT_TO_MARKETS.keys())}",
+            kind='unknown_district', commodity=commodity
+        )
+    district_info = DISTRICT_TO_MARKETS[district_id]
+
+    # Verify market exists in district
+    with PREDICT_STAGE_SECONDS.time(stage='resolve_market', commodity=commodity):
+        market_name = district_index.market_name(district_id, market_input)
+    if market_name is None:
+        raise PredictionError(
+            f"Market '{market_input}' not found in {district_info['district_name']}. Available markets: {district_info['markets']}",
+            kind='unknown_market', commodity=commodity
+        )
+
+    # Encode district
+    with PREDICT_STAGE_SECONDS.time(stage='encode', commodity=commodity):
+        district_encoded = district_index.encode(commodity, district_info['district_name'])
+    if district_encoded is None:
+        available_for_commodity = COMMODITY_DISTRICTS.get(commodity, [])
+        logger.error(f"District encoding failed: '{district_info['district_name']}' unknown to {commodity}")
+        raise PredictionError(
+            f"District '{district_info['district_name']}' not available for {commodity}. Available districts: {available_for_commodity}",
+            kind='encoder_failure', commodity=commodity
+        )
+
+    return {
+        'commodity': commodity,
+        'district_info': district_info,
+        'market': market_input,
+        'district_encoded': district_encoded
+    }
+
+
+def predict_matrix(commodity, features):
+    """Run one preprocess + predict pass over a feature matrix"""
+    model_data = COMMODITY_MODELS[commodity]
+    if model_data.get('engine') is not None:
+        # The compiled engine fuses preprocessing into the tree walk
+        with PREDICT_STAGE_SECONDS.time(stage='engine', commodity=commodity):
+            return model_data['engine'].predict(features)
+    with PREDICT_STAGE_SECONDS.time(stage='preprocess', commodity=commodity):
+        prepared_features = model_data['preprocessor'].transform(features)
+    with PREDICT_STAGE_SECONDS.time(stage='model', commodity=commodity):
+        return model_data['model'].predict(prepared_features)
+
+
+def predict_summary(commodity, features, model_data=None, timed=True):
+    """Price, spread and quantile bands per row from one walk over the forest
+
+    The per-tree outputs behind the mean are reduced in place, so the
+    interval costs no extra model and no second traversal. `timed=False`
+    keeps background precomputes out of the per-request stage histograms.
+    """
+    def stage(name):
+        return PREDICT_STAGE_SECONDS.time(stage=name, commodity=commodity) if timed else nullcontext()
+
+    model_data = model_data or COMMODITY_MODELS[commodity]
+    if model_data.get('engine') is not None:
+        with stage('engine'):
+            per_tree = model_data['engine'].predict_trees(features)
+    else:
+        with stage('preprocess'):
+            prepared_features = model_data['preprocessor'].transform(features)
+        with stage('model'):
+            per_tree = tree_predictions(model_data['model'], prepared_features)
+    with stage('intervals'):
+        return PRICE_INTERVALS.summarize(per_tree)
+
+
+def prediction_response(prepared, predicted_price, current_date, interval=None):
+    """Build the JSON body returned for a successful prediction"""
+    config = COMMODITY_CONFIG.get(prepared['commodity'], COMMODITY_CONFIG['bajra'])
+    response = {
+        "predicted_price": predicted_price,
+        "commodity": config['name'],
+        "commodity_display": config['display_name'],
+        "commodity_icon": config['icon'],
+        "commodity_color": config['color'],
+        "district": prepared['district_info']['district_name'],
+        "market": prepared['market'].replace('_', ' ').title(),
+        "state": "Maharashtra",
+        "prediction_date": current_date.strftime("%Y-%m-%d"),
+        "prediction_time": current_date.strftime("%H:%M:%S"),
+        "status": "success"
+    }
+    if interval is not None:
+        response["interval"] = interval
+    return response
+
+
+def summary_response(prepared, summary, current_date):
+    """prediction_response for a stored [price, spread, quantiles...] summary"""
+    predicted_price, interval = PRICE_INTERVALS.describe(summary)
+    return prediction_response(prepared, predicted_price, current_date, interval)
+
+
+# Seconds a request waits on an identical in-flight prediction before running
+# its own (0 disables coalescing)
+PREDICTION_FLIGHTS = SingleFlight(timeout=float(os.environ.get('PREDICT_COALESCE_TIMEOUT', 2)))
+
+
+def compute_prediction(prepared, current_date, cache_key, generation):
+    """Run the model for one prepared request and cache its summary"""
+    commodity = prepared['commodity']
+    with PREDICT_STAGE_SECONDS.time(stage='features', commodity=commodity):
+        features = np.array([build_feature_row(
+            commodity, prepared['district_info'], prepared['district_encoded'], current_date
+        )])
+
+    # Non-negative price and bands, rounded to paise
+    summary = tuple(float(value) for value in predict_summary(commodity, features)[0])
+    PREDICTION_CACHE.put(*cache_key, summary, generation=generation)
+    return summary
+
+
 @app.route('/api/predict', methods=['POST'])
 def predict():
     """Predict price for commodity"""
@@ -420,109 +391,538 @@ def predict():
         data = request.get_json()
         if not data:
             return jsonify({"error": "No JSON data provided"}), 400
-            
-        commodity = data.get('commodity', '').lower()
-        district_input = data.get('district', '').lower()
-        market_input = data.get('market', '').lower()
-        
-        logger.info(f"🎯 Prediction request for: {commodity}, district: {district_input}, market: {market_input}")
-        
-        # Validation
+
+        hot_log.debug("🎯 Prediction request", commodity=data.get('commodity'), district=data.get('district'), market=data.get('market'))
+
+        try:
+            prepared = prepare_prediction(data)
+        except PredictionError as e:
+            return jsonify({"error": e.message}), e.status_code
+
+        commodity = prepared['commodity']
+        current_date = datetime.now()
+        cache_key = (commodity, prepared['district_info']['district_name'], prepared['market'], current_date.date())
+        source = 'price_table'
+        with PREDICT_STAGE_SECONDS.time(stage='lookup', commodity=commodity):
+            summary = PRICE_TABLE.lookup(*cache_key)
+            if summary is None:
+                source = 'cache'
+                summary = PREDICTION_CACHE.get(*cache_key)
+
+        if summary is None:
+            generation = PREDICTION_CACHE.generation
+            # Identical concurrent misses share one model run; the generation
+            # keeps requests after a reload from joining a stale computation
+            summary, coalesced = PREDICTION_FLIGHTS.do(
+                cache_key + (generation,), lambda: compute_prediction(prepared, current_date, cache_key, generation)
+            )
+            source = 'coalesced' if coalesced else 'model'
+        PREDICTIONS_TOTAL.inc(commodity=commodity, source=source)
+
+        hot_log.info("✅ Prediction ₹%s for %s in %s", summary[0], commodity, prepared['district_info']['district_name'],
+                     market=prepared['market'], source=source)
+
+        with PREDICT_STAGE_SECONDS.time(stage='serialize', commodity=commodity):
+            return jsonify(summary_response(prepared, summary, current_date))
+
+    except Exception as e:
+        logger.error(f"❌ Prediction error: {str(e)}")
+        PREDICTION_ERRORS.inc(endpoint=request.endpoint, kind='internal_error')
+        return jsonify({"error": f"Prediction failed: {str(e)}"}), 500
+
+MAX_FORECAST_DAYS = int(os.environ.get('MAX_FORECAST_DAYS', 90))
+
+@app.route('/api/forecast', methods=['POST'])
+def forecast():
+    """Daily price curve for the next `horizon` days (default 30) with the best day to sell
+
+    Takes the same commodity/district/market body as /api/predict. The whole
+    date grid is predicted in one preprocess + predict pass.
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "No JSON data provided"}), 400
+
+        try:
+            prepared = prepare_prediction(data)
+        except PredictionError as e:
+            return jsonify({"error": e.message}), e.status_code
+
+        try:
+            horizon = int(data.get('horizon', 30))
+        except (TypeError, ValueError):
+            return jsonify({"error": "horizon must be a whole number of days"}), 400
+        if not 1 <= horizon <= MAX_FORECAST_DAYS:
+            return jsonify({"error": f"horizon must be between 1 and {MAX_FORECAST_DAYS} days"}), 400
+
+        current_date = datetime.now()
+        dates = [current_date.date() + timedelta(days=offset) for offset in range(horizon)]
+        features = build_feature_grid(prepared['commodity'], prepared['district_info'], prepared['district_encoded'], dates)
+        prices = np.round(np.maximum(predict_matrix(prepared['commodity'], features), 0), 2)
+
+        best = int(np.argmax(prices))
+        today_price = float(prices[0])
+        response = prediction_response(prepared, today_price, current_date)
+        response.update({
+            "horizon": horizon,
+            "forecast": [{"date": day.isoformat(), "price": float(price)} for day, price in zip(dates, prices)],
+            "best_sell": {
+                "date": dates[best].isoformat(),
+                "price": float(prices[best]),
+                "days_from_now": best,
+                "gain_vs_today_pct": round((float(prices[best]) / today_price - 1) * 100, 2) if today_price else None
+            },
+            "summary": {
+                "min": float(prices.min()),
+                "max": float(prices.max()),
+                "mean": round(float(prices.mean()), 2)
+            }
+        })
+
+        hot_log.info("📅 %d-day forecast for %s in %s: best ₹%s on %s", horizon, prepared['commodity'],
+                     prepared['district_info']['district_name'], prices[best], dates[best])
+        return jsonify(response)
+
+    except Exception as e:
+        logger.error(f"❌ Forecast error: {str(e)}")
+        return jsonify({"error": f"Forecast failed: {str(e)}"}), 500
+
+def compute_price_table(commodity, dates):
+    """Predict every district/market this commodity knows for `dates` in one pass
+
+    Markets only differ by name, so each district gets one row of prices
+    that all of its markets share. Each cell holds the price summary
+    (price, spread, quantile bands). Only an already loaded model is used,
+    so the precompute never loads or evicts models live traffic relies on.
+    """
+    district_index = DISTRICT_INDEX
+    model_data = COMMODITY_MODELS.peek(commodity)
+    if model_data is None:
+        return {}, np.empty((0, len(dates), PRICE_INTERVALS.width))
+
+    index = {}
+    features = []
+    district_rows = 0
+    for district in district_index.commodity_districts.get(commodity, []):
+        district_info = DISTRICT_TO_MARKETS.get(district['id'])
+        if not district_info:
+            continue
+        district_encoded = district_index.encode(commodity, district_info['district_name'])
+        if district_encoded is None:
+            continue
+        for market in district_index.markets[district['id']]:
+            index[(district_info['district_name'], market)] = district_rows
+        features.extend(build_feature_row(commodity, district_info, district_encoded, day) for day in dates)
+        district_rows += 1
+
+    if not features:
+        return index, np.empty((0, len(dates), PRICE_INTERVALS.width))
+    summaries = predict_summary(commodity, np.array(features), model_data, timed=False)
+    return index, summaries.reshape(district_rows, len(dates), PRICE_INTERVALS.width)
+
+
+# Today's and the next PRICE_TABLE_DAYS - 1 days' predictions, precomputed in
+# the background (PRICE_TABLE_DAYS=0 disables it) for the commodities whose
+# models are already resident; a newly loaded model joins at the next check
+PRICE_TABLE = DailyPriceTable(
+    COMMODITY_MODELS.resident,
+    compute_price_table,
+    days=int(os.environ.get('PRICE_TABLE_DAYS', 7)),
+    version=lambda: COMMODITY_MODELS.version
+)
+COMMODITY_MODELS.add_reload_listener(PRICE_TABLE.invalidate)
+
+
+@app.before_request
+def start_background_jobs():
+    PRICE_TABLE.start()
+    start_history_refresh()
+    start_profitability_build()
+    COMMODITY_MODELS.watch(BUNDLE_WATCH_INTERVAL)
+
+
+@app.before_request
+def begin_request_context():
+    g.request_start = time.perf_counter()
+    g.request_id = request_log.begin_request(request.endpoint or 'unmatched', request.headers.get('X-Request-ID'))
+
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        # Unrouted paths share one label so scanners can't blow up series cardinality
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, method=request.method)
+        REQUESTS_TOTAL.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    if 'request_id' in g:
+        response.headers['X-Request-ID'] = g.request_id
+    return response
+
+
+@app.after_request
+def compress_large_responses(response):
+    # Catalog responses arrive already encoded and are left alone
+    if COMPRESS_MIN_BYTES:
+        compress_response(response, request.accept_encodings, COMPRESS_MIN_BYTES)
+    return response
+
+
+@app.teardown_request
+def end_request_context(error):
+    request_log.end_request()
+
+
+MAX_BATCH_ITEMS = int(os.environ.get('MAX_BATCH_ITEMS', 1000))
+
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_batch():
+    """Predict prices for many commodity/district/market tuples at once
+
+    Items are grouped by commodity so every commodity costs one
+    preprocessor.transform and one walk over the forest, which also yields
+    each item's interval. Results and errors
+    are returned per item, in input order.
+    """
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data.get('items'), list):
+            return jsonify({"error": "JSON body with an 'items' list is required"}), 400
+
+        items = data['items']
+        if len(items) > MAX_BATCH_ITEMS:
+            return jsonify({"error": f"Too many items: {len(items)} (max {MAX_BATCH_ITEMS})"}), 400
+
+        hot_log.debug("🎯 Batch prediction request", items=len(items))
+
+        current_date = datetime.now()
+        generation = PREDICTION_CACHE.generation
+        results = [None] * len(items)
+        groups = {}
+
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                PREDICTION_ERRORS.inc(endpoint=request.endpoint, kind='invalid_request')
+                results[index] = {"index": index, "error": "Item must be a JSON object", "status": "error"}
+                continue
+            try:
+                prepared = prepare_prediction(item)
+            except PredictionError as e:
+                results[index] = {"index": index, "error": e.message, "status": "error"}
+                continue
+
+            cache_key = (prepared['commodity'], prepared['district_info']['district_name'], prepared['market'], current_date.date())
+            source = 'price_table'
+            cached = PRICE_TABLE.lookup(*cache_key)
+            if cached is None:
+                source = 'cache'
+                cached = PREDICTION_CACHE.get(*cache_key)
+            if cached is not None:
+                PREDICTIONS_TOTAL.inc(commodity=prepared['commodity'], source=source)
+                results[index] = {"index": index, **summary_response(prepared, cached, current_date)}
+                continue
+            groups.setdefault(prepared['commodity'], []).append((index, prepared))
+
+        for commodity, group in groups.items():
+            features = np.array([
+                build_feature_row(commodity, prepared['district_info'], prepared['district_encoded'], current_date)
+                for _, prepared in group
+            ])
+            try:
+                summaries = predict_summary(commodity, features)
+            except Exception as e:
+                logger.error(f"❌ Batch prediction error for {commodity}: {str(e)}")
+                PREDICTION_ERRORS.inc(len(group), endpoint=request.endpoint, kind='model_failure', commodity=commodity)
+                for index, _ in group:
+                    results[index] = {"index": index, "error": f"Prediction failed: {str(e)}", "status": "error"}
+                continue
+
+            PREDICTIONS_TOTAL.inc(len(group), commodity=commodity, source='model')
+            for (index, prepared), row in zip(group, summaries):
+                summary = tuple(float(value) for value in row)
+                PREDICTION_CACHE.put(
+                    commodity, prepared['district_info']['district_name'], prepared['market'],
+                    current_date.date(), summary, generation=generation
+                )
+                results[index] = {"index": index, **summary_response(prepared, summary, current_date)}
+
+        error_count = sum(1 for result in results if result['status'] == 'error')
+        hot_log.info("✅ Batch prediction done: %d ok, %d failed", len(items) - error_count, error_count,
+                     commodity_groups=len(groups))
+
+        return jsonify({
+            "results": results,
+            "total": len(items),
+            "succeeded": len(items) - error_count,
+            "failed": error_count,
+            "commodity_groups": len(groups)
+        })
+
+    except Exception as e:
+        logger.error(f"❌ Batch prediction error: {str(e)}")
+        return jsonify({"error": f"Batch prediction failed: {str(e)}"}), 500
+
+# Columnar price history ingested from backend/data (see ingest.py)
+HISTORY_STORE_PATH = os.environ.get('HISTORY_STORE_PATH', history_store.STORE_PATH)
+HISTORY_AUTO_BUILD = os.environ.get('HISTORY_AUTO_BUILD', '1') == '1'
+HISTORY_MAX_ROWS = int(os.environ.get('HISTORY_MAX_ROWS', 20000))
+HISTORY_REFRESH_INTERVAL = float(os.environ.get('HISTORY_REFRESH_INTERVAL', 0))
+# 7/30-day modal price, arrival and volatility aggregates behind /api/market-stats
+MARKET_AGGREGATES = RollingAggregates()
+# Per-market price spike/drop detection behind /api/demand-alerts, warmed up
+# from the last ANOMALY_WARMUP_DAYS of history
+ANOMALY_DETECTOR = AnomalyDetector(
+    threshold=float(os.environ.get('ANOMALY_Z_THRESHOLD', 3.0)),
+    max_alerts=int(os.environ.get('ANOMALY_MAX_ALERTS', 200))
+)
+ANOMALY_WARMUP_DAYS = int(os.environ.get('ANOMALY_WARMUP_DAYS', 180))
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_history_store():
+    """Open the history store on first use, building it if allowed"""
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                if not os.path.exists(os.path.join(HISTORY_STORE_PATH, history_store.MANIFEST)):
+                    if not HISTORY_AUTO_BUILD:
+                        raise FileNotFoundError(f"History store not built at {HISTORY_STORE_PATH}. Run: python ingest.py")
+                    ingest.ingest(HISTORY_STORE_PATH)
+                _history = history_store.HistoryStore(HISTORY_STORE_PATH)
+                warm_up_price_feed(_history)
+    return _history
+
+
+def warm_up_price_feed(store):
+    """Rebuild the streaming consumers' state from the tail of the history store"""
+    MARKET_AGGREGATES.update_frame(store.recent(WINDOW_DAYS))
+    ANOMALY_DETECTOR.update_frame(store.recent(ANOMALY_WARMUP_DAYS))
+
+
+def feed_price_chunk(frame):
+    """Ingest on_chunk callback: one tick of the live price feed"""
+    MARKET_AGGREGATES.update_frame(frame)
+    for alert in ANOMALY_DETECTOR.update_frame(frame):
+        logger.info(f"🚨 Price {alert['kind']} for {alert['commodity']} at {alert['market']}: ₹{alert['price']} vs ₹{alert['expected']} expected")
+
+
+def refresh_history():
+    """Ingest rows appended to the source CSVs and stream them through the aggregates and anomaly detector"""
+    global _history
+    get_history_store()
+    with _history_lock:
+        stats = ingest.ingest(HISTORY_STORE_PATH, on_chunk=feed_price_chunk)
+        if stats['rebuild']:
+            # Sources were rewritten; start the streaming state over from the new store
+            MARKET_AGGREGATES.clear()
+            ANOMALY_DETECTOR.clear()
+            _history = history_store.HistoryStore(HISTORY_STORE_PATH)
+            warm_up_price_feed(_history)
+        elif stats['segments']:
+            _history = history_store.HistoryStore(HISTORY_STORE_PATH)
+    return stats
+
+
+def history_refresh_loop():
+    while True:
+        time.sleep(HISTORY_REFRESH_INTERVAL)
+        try:
+            refresh_history()
+        except Exception as e:
+            logger.error(f"❌ History refresh failed: {str(e)}")
+
+
+_history_refresh_thread = None
+
+
+def start_history_refresh():
+    """Poll the source CSVs every HISTORY_REFRESH_INTERVAL seconds (0 disables it)"""
+    global _history_refresh_thread
+    if HISTORY_REFRESH_INTERVAL > 0 and _history_refresh_thread is None:
+        with _history_lock:
+            if _history_refresh_thread is None:
+                _history_refresh_thread = threading.Thread(target=history_refresh_loop, name='history-refresh', daemon=True)
+                _history_refresh_thread.start()
+
+
+def parse_date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise PredictionError(f"Invalid {name} date '{value}', expected YYYY-MM-DD")
+
+
+def history_district_name(district_input):
+    """Map API district ids and aliases onto the names used in the raw data"""
+    district_info = DISTRICT_INDEX.resolve(district_input)
+    return district_info['district_name'] if district_info else district_input
+
+
+@app.route('/api/history', methods=['GET'])
+def get_history():
+    """Historical mandi prices for a commodity/district (optionally one market) over a date range
+
+    Only markets with rows in the range are listed in `series`.
+    """
+    try:
+        commodity = request.args.get('commodity', '').lower()
+        district_input = request.args.get('district', '').lower()
+        market_input = request.args.get('market', '').lower() or None
         if not commodity:
             return jsonify({"error": "Commodity is required"}), 400
         if not district_input:
             return jsonify({"error": "District is required"}), 400
-        if not market_input:
-            return jsonify({"error": "Market is required"}), 400
-            
-        if commodity not in COMMODITY_MODELS:
+        try:
+            start_date = parse_date_arg('start')
+            end_date = parse_date_arg('end')
+        except PredictionError as e:
+            return jsonify({"error": e.message}), e.status_code
+
+        store = get_history_store()
+        if commodity not in store.commodities:
             return jsonify({
-                "error": f"Commodity '{commodity}' not available. Available: {', '.join(available_commodities)}"
-            }), 400
-            
-        # Get district info
-        district_info = DISTRICT_TO_MARKETS.get(district_input)
-        if not district_info:
-            # Try partial match
-            matching_districts = []
-            for dist_id, dist_info in DISTRICT_TO_MARKETS.items():
-                if (district_input in dist_id or 
-                    district_input in dist_info['district_name'].lower() or
-                    dist_info['district_name'].lower() in district_input):
-                    matching_districts.append((dist_id, dist_info))
-            
-            if matching_districts:
-                district_id, district_info = matching_districts[0]
-                logger.info(f"🔍 Using matching district: {district_info['district_name']}")
-            else:
-                return jsonify({
-                    "error": f"District '{district_input}' not found. Available districts: {list(DISTRICT_TO_MARKETS.keys())}"
-                }), 400
-        
-        # Verify market exists in district
-        market_names = [m.lower().replace(' ', '_') for m in district_info['markets']]
-        if market_input not in market_names:
+                "error": f"No history for commodity '{commodity}'. Available: {', '.join(store.commodities)}"
+            }), 404
+
+        district_name = history_district_name(district_input)
+        results = store.query(commodity, district_name, market_input, start_date, end_date)
+        if not results:
             return jsonify({
-                "error": f"Market '{market_input}' not found in {district_info['district_name']}. Available markets: {district_info['markets']}"
-            }), 400
-        
-        # Get model and encode district
-        model_data = COMMODITY_MODELS[commodity]
-        config = COMMODITY_CONFIG.get(commodity, COMMODITY_CONFIG['bajra'])  # Fallback to bajra config
-        
-        # Encode district
+                "error": f"No history for {commodity} in '{district_input}'" + (f" market '{market_input}'" if market_input else ""),
+                "available_districts": store.district_slugs(commodity)
+            }), 404
+
+        series = []
+        for result in results:
+            columns = result['columns']
+            count = len(columns['date'])
+            # Markets with no rows in the requested range are left out
+            if not count:
+                continue
+            # Keep the most recent rows when the range is larger than the cap
+            rows = slice(max(0, count - HISTORY_MAX_ROWS), count)
+            series.append({
+                "market": result['market'],
+                "market_name": result['market_name'],
+                "market_id": int(columns['market_id'][0]),
+                "count": count,
+                "truncated": count > HISTORY_MAX_ROWS,
+                "dates": [history_store.from_days(day).isoformat() for day in columns['date'][rows]],
+                "p_min": columns['p_min'][rows].tolist(),
+                "p_max": columns['p_max'][rows].tolist(),
+                "p_modal": columns['p_modal'][rows].tolist()
+            })
+
+        return jsonify({
+            "commodity": commodity,
+            "district": district_name,
+            "start": start_date.isoformat() if start_date else None,
+            "end": end_date.isoformat() if end_date else None,
+            "series": series
+        })
+
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logger.error(f"Error fetching history: {str(e)}")
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+MAX_TIMESERIES_POINTS = int(os.environ.get('MAX_TIMESERIES_POINTS', 2000))
+
+@app.route('/api/timeseries', methods=['GET'])
+def get_timeseries():
+    """Chart-ready price series for a commodity/district (optionally one market)
+
+    `interval` resamples to daily/weekly/monthly buckets; `points` caps the
+    result with LTTB downsampling of the modal price. `days` selects the
+    last N days of available history when `start` is not given. Without a
+    market, every market in the district is pooled into one series.
+    """
+    try:
+        commodity = request.args.get('commodity', '').lower()
+        district_input = request.args.get('district', '').lower()
+        market_input = request.args.get('market', '').lower() or None
+        interval = request.args.get('interval', 'daily').lower()
+        points = request.args.get('points', MAX_TIMESERIES_POINTS, type=int)
+        days = request.args.get('days', type=int)
+        if not commodity:
+            return jsonify({"error": "Commodity is required"}), 400
+        if not district_input:
+            return jsonify({"error": "District is required"}), 400
+        if interval not in timeseries.INTERVALS:
+            return jsonify({"error": f"Invalid interval '{interval}'. Use one of: {', '.join(timeseries.INTERVALS)}"}), 400
+        if points < timeseries.MIN_POINTS:
+            return jsonify({"error": f"points must be at least {timeseries.MIN_POINTS}"}), 400
+        points = min(points, MAX_TIMESERIES_POINTS)
         try:
-            district_encoded = model_data['district_encoder'].transform([district_info['district_name']])[0]
-            logger.info(f"🔢 District '{district_info['district_name']}' encoded as: {district_encoded}")
-        except Exception as e:
-            available_for_commodity = COMMODITY_DISTRICTS.get(commodity, [])
-            logger.error(f"District encoding failed: {str(e)}")
+            start_date = parse_date_arg('start')
+            end_date = parse_date_arg('end')
+        except PredictionError as e:
+            return jsonify({"error": e.message}), e.status_code
+
+        store = get_history_store()
+        if commodity not in store.commodities:
             return jsonify({
-                "error": f"District '{district_info['district_name']}' not available for {commodity}. Available districts: {available_for_commodity}"
-            }), 400
-        
-        # Prepare features
-        current_date = datetime.now()
-        features = np.array([[
-            district_info['market_id'],
-            STATE_ID,
-            district_info['district_id'],
-            config['default_p_min'],
-            config['default_p_max'],
-            current_date.year,
-            current_date.month,
-            current_date.day,
-            district_encoded
-        ]])
-        
-        # Predict
-        prepared_features = model_data['preprocessor'].transform(features)
-        prediction = model_data['model'].predict(prepared_features)
-        predicted_price = max(0, round(float(prediction[0]), 2))  # Ensure non-negative price
-        
-        logger.info(f"✅ Prediction successful: ₹{predicted_price} for {commodity} in {district_info['district_name']}")
-        
+                "error": f"No history for commodity '{commodity}'. Available: {', '.join(store.commodities)}"
+            }), 404
+
+        district_name = history_district_name(district_input)
+        results = store.query(commodity, district_name, market_input, start_date, end_date)
+        if not results or not any(len(result['columns']['date']) for result in results):
+            return jsonify({
+                "error": f"No history for {commodity} in '{district_input}'" + (f" market '{market_input}'" if market_input else ""),
+                "available_districts": store.district_slugs(commodity)
+            }), 404
+
+        columns = {name: np.concatenate([result['columns'][name] for result in results])
+                   for name in ('date', 'p_min', 'p_max', 'p_modal')}
+        if days and start_date is None:
+            recent = columns['date'] > columns['date'].max() - days
+            columns = {name: values[recent] for name, values in columns.items()}
+
+        buckets = timeseries.resample(columns['date'], columns['p_min'], columns['p_max'], columns['p_modal'], interval)
+        keep = timeseries.lttb(buckets['date'], buckets['p_modal'], points)
+
         return jsonify({
-            "predicted_price": predicted_price,
-            "commodity": config['name'],
-            "commodity_display": config['display_name'],
-            "commodity_icon": config['icon'],
-            "commodity_color": config['color'],
-            "district": district_info['district_name'],
-            "market": market_input.replace('_', ' ').title(),
-            "state": "Maharashtra",
-            "prediction_date": current_date.strftime("%Y-%m-%d"),
-            "prediction_time": current_date.strftime("%H:%M:%S"),
-            "status": "success"
+            "commodity": commodity,
+            "district": district_name,
+            "markets": [result['market_name'] for result in results],
+            "interval": interval,
+            "rows": int(len(columns['date'])),
+            "buckets": int(len(buckets['date'])),
+            "downsampled": len(keep) < len(buckets['date']),
+            "dates": [history_store.from_days(day).isoformat() for day in buckets['date'][keep]],
+            "p_min": np.round(buckets['p_min'][keep], 2).tolist(),
+            "p_max": np.round(buckets['p_max'][keep], 2).tolist(),
+            "p_modal": np.round(buckets['p_modal'][keep], 2).tolist(),
+            "count": buckets['count'][keep].tolist()
         })
-        
+
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
-        logger.error(f"❌ Prediction error: {str(e)}")
-        return jsonify({"error": f"Prediction failed: {str(e)}"}), 500
+        logger.error(f"Error fetching time series: {str(e)}")
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint; `?fields=status,total_commodities` trims the payload
+
+    Built on every probe and marked no-store, so no proxy or client keeps
+    reporting a stale status.
+    """
+    response = jsonify(project(health_payload(), parse_fields(request.args.get('fields'))))
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def health_payload():
     commodity_info = {}
     for commodity in available_commodities:
         commodity_info[commodity] = {
@@ -531,186 +931,484 @@ def health_check():
             'config': COMMODITY_CONFIG.get(commodity, {})
         }
     
-    return jsonify({
+    return {
         "status": "healthy",
         "available_commodities": available_commodities,
         "total_commodities": len(available_commodities),
         "commodity_info": commodity_info,
         "total_districts_available": len(DISTRICT_TO_MARKETS),
         "all_districts": list(DISTRICT_TO_MARKETS.keys())
+    }
+
+def admin_allowed():
+    if ADMIN_TOKEN:
+        return request.headers.get('X-Admin-Token') == ADMIN_TOKEN
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+@app.route('/api/admin/reload', methods=['POST'])
+def admin_reload():
+    """Swap in newly published model bundles without restarting
+
+    `?full=1` re-reads the whole catalog instead, dropping every loaded model.
+    """
+    if not admin_allowed():
+        return jsonify({"error": "Forbidden"}), 403
+    try:
+        if request.args.get('full') == '1':
+            swapped = {commodity: COMMODITY_MODELS.sources.get(commodity) for commodity in COMMODITY_MODELS.reload()}
+        else:
+            swapped = COMMODITY_MODELS.refresh()
+        return jsonify({
+            "swapped": swapped,
+            "bundles": COMMODITY_MODELS.stats()['bundles'],
+            "version": COMMODITY_MODELS.version,
+            "timestamp": datetime.now().isoformat()
+        })
+    except Exception as e:
+        logger.error(f"❌ Model reload failed: {str(e)}")
+        return jsonify({"error": f"Reload failed: {str(e)}"}), 500
+
+@app.route('/api/stats', methods=['GET'])
+def runtime_stats():
+    """Model registry, cache and precomputed table counters"""
+    return jsonify({
+        "model_registry": COMMODITY_MODELS.stats(),
+        "prediction_cache": PREDICTION_CACHE.stats(),
+        "prediction_intervals": PRICE_INTERVALS.stats(),
+        "prediction_flights": PREDICTION_FLIGHTS.stats(),
+        "price_table": PRICE_TABLE.stats(),
+        "catalog_responses": CATALOG_RESPONSES.stats(),
+        "market_aggregates": MARKET_AGGREGATES.stats(),
+        "anomaly_detector": ANOMALY_DETECTOR.stats(),
+        "logging": request_log.stats(),
+        "crop_health_jobs": CROP_HEALTH_JOBS.stats(),
+        "process": {"pid": os.getpid(), **process_memory()},
+        "timestamp": datetime.now().isoformat()
     })
 
+# Scrape-time views of the registry and cache counters
+METRICS.counter('model_registry_events_total', 'Model registry loads, hits, misses, evictions and swaps', ('event',),
+                collect=lambda: {(event,): value for event, value in COMMODITY_MODELS.stats().items()
+                                 if event in ('loads', 'hits', 'misses', 'evictions', 'load_errors', 'swaps', 'swap_errors')})
+METRICS.gauge('model_registry_loaded_bytes', 'Estimated bytes of resident models',
+              collect=lambda: {(): COMMODITY_MODELS.stats()['loaded_bytes']})
+METRICS.gauge('model_loaded', 'Whether a commodity model is resident', ('commodity',),
+              collect=lambda: {(commodity,): int(COMMODITY_MODELS.is_loaded(commodity)) for commodity in available_commodities})
+METRICS.counter('prediction_flights_total', 'Single-flight leaders, coalesced waiters, timeouts and shared errors',
+                ('event',), collect=lambda: {(event,): value for event, value in PREDICTION_FLIGHTS.stats().items()
+                                             if event in PREDICTION_FLIGHTS.counters})
+METRICS.gauge('prediction_cache_entries', 'Entries in the same-day prediction cache',
+              collect=lambda: {(): PREDICTION_CACHE.stats()['size']})
+METRICS.counter('log_records_dropped_total', 'Log records dropped because the log queue was full',
+                collect=lambda: {(): request_log.stats()['dropped']})
+METRICS.gauge('process_memory_bytes', 'Resident memory of this worker; file-backed pages include shared model weights',
+              ('kind',), collect=lambda: {(kind.replace('_bytes', ''),): value for kind, value in process_memory().items()})
+METRICS.gauge('crop_health_pending_jobs', 'Crop health jobs queued or running',
+              collect=lambda: {(): CROP_HEALTH_JOBS.stats()['pending']})
+
+@app.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request, per-stage prediction and model-load metrics in Prometheus text format"""
+    return Response(METRICS.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({"error": "Endpoint not found"}), 404
 
+@app.errorhandler(413)
+def request_too_large(error):
+    return jsonify({"error": "Request body too large"}), 413
+
 @app.errorhandler(500)
 def internal_error(error):
     return jsonify({"error": "Internal server error"}), 500
 
 # Add these endpoints to your existing Flask app
 
+# Seasonal profitability index written by profitability.py; reloaded when the file changes
+PROFITABILITY_INDEX = profitability.IndexLoader(os.environ.get('PROFITABILITY_INDEX_PATH', profitability.INDEX_PATH))
+# PROFITABILITY_AUTO_BUILD=1 builds a missing index once, in a background
+# thread at startup; requests never build it (default: off, run profitability.py)
+PROFITABILITY_AUTO_BUILD = os.environ.get('PROFITABILITY_AUTO_BUILD', '0') == '1'
+MAX_SUGGESTIONS = 10
+_profitability_build = None
+_profitability_build_lock = threading.Lock()
+
+
+def build_profitability_index():
+    try:
+        logger.info("📈 Building profitability index...")
+        columns, meta = profitability.build_index(get_history_store(), COMMODITY_MODELS)
+        # An empty store yields no rows; don't pin an empty index on disk
+        if not len(columns['score']):
+            logger.warning("⚠️ Profitability index not built: no price history for catalog commodities")
+            return
+        profitability.save_index(columns, meta, PROFITABILITY_INDEX.path)
+        logger.info(f"✅ Profitability index built: {len(columns['score'])} rows")
+    except Exception as e:
+        logger.error(f"❌ Profitability index build failed: {str(e)}")
+
+
+def start_profitability_build():
+    """Start the one-off background build if enabled and the index is missing; safe to call on every request"""
+    global _profitability_build
+    if not PROFITABILITY_AUTO_BUILD or _profitability_build is not None:
+        return
+    with _profitability_build_lock:
+        if _profitability_build is None:
+            _profitability_build = threading.Thread(target=build_profitability_index, name='profitability-build', daemon=True)
+            if PROFITABILITY_INDEX.get() is None:
+                _profitability_build.start()
+
+
+def get_profitability_index():
+    return PROFITABILITY_INDEX.get()
+
+
 @app.route('/api/crop-suggestions', methods=['POST'])
 def get_crop_suggestions():
-    """Get AI-powered crop suggestions based on season and region"""
+    """Crops ranked by the seasonal profitability index for a season and region
+
+    `region` may be a district (falls back to statewide rows) and
+    `soil_type` boosts crops suited to it; `limit` caps the list (default 3).
+    """
     try:
-        data = request.get_json()
-        season = data.get('season', 'kharif')
-        region = data.get('region', 'Maharashtra')
-        soil_type = data.get('soil_type', 'black_cotton')
-        
-        # This would typically call your ML model for crop suggestions
-        # For now, returning dynamic suggestions based on season
-        suggestions = generate_crop_suggestions(season, region, soil_type)
-        
-        return jsonify({
-            "suggestions": suggestions,
-            "season": season,
-            "region": region,
-            "timestamp": datetime.now().isoformat()
-        })
-        
+        data = request.get_json(silent=True) or {}
+        season = (data.get('season') or 'kharif').lower()
+        region = data.get('region') or 'Maharashtra'
+        soil_type = data.get('soil_type') or 'black_cotton'
+        try:
+            limit = min(max(int(data.get('limit', 3)), 1), MAX_SUGGESTIONS)
+        except (TypeError, ValueError):
+            return jsonify({"error": "limit must be a whole number"}), 400
+
+        return jsonify(crop_suggestions_payload(season, region, soil_type, limit))
+
+    except PredictionError as e:
+        return jsonify({"error": e.message}), e.status_code
     except Exception as e:
         logger.error(f"Error generating crop suggestions: {str(e)}")
         return jsonify({"error": "Failed to generate suggestions"}), 500
 
+def crop_suggestions_payload(season, region, soil_type, limit=3):
+    if season not in profitability.SEASONS:
+        raise PredictionError(f"Unknown season '{season}'. Use one of: {', '.join(profitability.SEASONS)}")
+    index = get_profitability_index()
+    if index is None:
+        if _profitability_build is not None and _profitability_build.is_alive():
+            raise PredictionError("Crop suggestions unavailable: profitability index is being built, retry shortly", 503)
+        raise PredictionError("Crop suggestions unavailable: profitability index not built. Run: python profitability.py", 503)
+
+    district_id = DISTRICT_INDEX.resolve_id(str(region).lower())
+    rows, district_key = index.top(season, district_id, limit, SOIL_AFFINITY.get(soil_type, ()))
+    place = DISTRICT_TO_MARKETS[district_key]['district_name'] if district_key in DISTRICT_TO_MARKETS else 'Maharashtra'
+
+    return {
+        "suggestions": [crop_suggestion(position, row, place, soil_type) for position, row in enumerate(rows, 1)],
+        "season": season,
+        "region": region,
+        "district": place,
+        "soil_type": soil_type,
+        "index_built_at": index.meta['built_at'],
+        "timestamp": datetime.now().isoformat()
+    }
+
+def crop_suggestion(position, row, place, soil_type):
+    """Dashboard card for one profitability index row"""
+    config = COMMODITY_CONFIG.get(row['commodity'], COMMODITY_CONFIG['bajra'])
+    premium = (row['level'] / row['baseline'] - 1) * 100 if row['baseline'] else 0.0
+    trend = 'high' if row['trend'] > 0.03 else 'low' if row['trend'] < -0.03 else 'medium'
+    risk = 'Low' if row['volatility'] < 0.15 else 'Medium' if row['volatility'] < 0.3 else 'High'
+    if row['soil_match']:
+        suitability = f"Suited to {soil_type.replace('_', ' ')} soil"
+    elif premium > 0:
+        suitability = "Ideal for current season"
+    else:
+        suitability = "Check soil suitability"
+    return {
+        "id": position,
+        "commodity": row['commodity'],
+        "name": config['name'],
+        "confidence": row['confidence'],
+        "priceTrend": trend,
+        "expectedIncome": f"₹{round(row['expected'])}/quintal",
+        "harvestTime": HARVEST_TIME.get(row['commodity'], "varies"),
+        "description": f"{row['season'].title()} prices in {place} average ₹{round(row['level'])}, "
+                       f"{premium:+.0f}% vs the rest of the year, trending {row['trend'] * 100:+.1f}%/yr",
+        "suitability": suitability,
+        "risk": risk,
+        "image": config['icon'],
+        "score": round(row['score'], 4),
+        "level": round(row['level'], 2),
+        "forecast": round(row['forecast'], 2) if row['forecast'] is not None else None,
+        "trend_pct": round(row['trend'] * 100, 2),
+        "volatility_pct": round(row['volatility'] * 100, 2),
+        "observations": row['observations']
+    }
+
 @app.route('/api/demand-alerts', methods=['GET'])
 def get_demand_alerts():
-    """Get real-time demand alerts for various crops"""
+    """Latest price spike/drop alerts from the streaming anomaly detector
+
+    Optional `commodity` and `district` filter the alerts; `limit` caps them (default 10).
+    """
     try:
-        # This would typically fetch from a real-time database or external API
-        alerts = generate_demand_alerts()
-        
-        return jsonify({
-            "alerts": alerts,
-            "last_updated": datetime.now().isoformat()
-        })
-        
+        limit = request.args.get('limit', 10, type=int)
+        return jsonify(demand_alerts_payload(limit, request.args.get('commodity'), request.args.get('district')))
+
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         logger.error(f"Error fetching demand alerts: {str(e)}")
         return jsonify({"error": "Failed to fetch demand alerts"}), 500
 
+def demand_alerts_payload(limit=10, commodity=None, district=None):
+    get_history_store()
+    if commodity:
+        commodity = commodity.lower()
+    if district:
+        district_info = DISTRICT_INDEX.resolve(district)
+        district = (district_info['district_name'] if district_info else district).strip().lower()
+
+    alerts = []
+    for alert in ANOMALY_DETECTOR.recent(limit, commodity, district):
+        alerts.append({
+            **alert,
+            "crop": alert['commodity'].title(),
+            "location": f"{alert['market']}, {alert['district']}",
+            "demand": "high" if alert['kind'] == 'spike' else "low",
+            "modal_price": alert['price'],
+            "price": f"₹{alert['price']:.0f}/quintal",
+            "trend": "up" if alert['kind'] == 'spike' else "down",
+            "date": history_store.from_days(alert['day']).isoformat()
+        })
+
+    return {
+        "alerts": alerts,
+        "ingest_tick": ANOMALY_DETECTOR.tick,
+        "last_updated": datetime.now().isoformat()
+    }
+
 @app.route('/api/market-stats', methods=['GET'])
 def get_market_stats():
-    """Get real-time market statistics"""
+    """Market statistics from rolling 7/30-day aggregates of the price history
+
+    Optional `commodity` and `district` narrow the stats to those series.
+    """
     try:
-        # Simulate real-time stats - replace with actual data source
-        stats = {
-            "priceRise": f"{random.randint(8, 15)}%",
-            "highDemand": f"{random.randint(40, 60)}%",
-            "bestSeason": "30d",
-            "activeFarmers": f"{random.randint(80, 95)}%",
-            "totalTransactions": f"{random.randint(1000, 5000)}",
-            "marketSentiment": "positive"
-        }
-        
-        return jsonify({
-            "stats": stats,
-            "timestamp": datetime.now().isoformat()
-        })
-        
+        return jsonify(market_stats_payload(request.args.get('commodity'), request.args.get('district')))
+
+    except PredictionError as e:
+        return jsonify({"error": e.message}), e.status_code
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         logger.error(f"Error fetching market stats: {str(e)}")
         return jsonify({"error": "Failed to fetch market stats"}), 500
 
+def percent(part, whole):
+    return f"{round(100 * part / whole)}%" if whole else "0%"
+
+def market_stats_payload(commodity=None, district=None):
+    get_history_store()
+    if commodity:
+        commodity = commodity.lower()
+    if district:
+        district_info = DISTRICT_INDEX.resolve(district)
+        district = (district_info['district_name'] if district_info else district).strip().lower()
+
+    details = MARKET_AGGREGATES.series_stats(commodity, district)
+    if details is None:
+        raise PredictionError("No price history for the requested commodity/district", 404)
+
+    change_30d = details['change_30d_pct'] or 0.0
+    change_7d = details['change_7d_pct'] or 0.0
+    sentiment = "positive" if change_7d > 2 else "negative" if change_7d < -2 else "neutral"
+    stats = {
+        "priceRise": f"{change_30d:.1f}%",
+        "highDemand": percent(details['rising_series_7d'], details['comparable_series_7d']),
+        "bestSeason": "30d",
+        "activeFarmers": percent(details['active_series_7d'], details['series']),
+        "totalTransactions": f"{details['arrivals_30d']}",
+        "marketSentiment": sentiment
+    }
+
+    return {
+        "stats": stats,
+        "details": details,
+        "commodity": commodity,
+        "district": district,
+        "as_of": history_store.from_days(details.pop('as_of_day')).isoformat(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+def districts_payload(commodity):
+    commodity_lower = commodity.lower()
+    if commodity_lower not in COMMODITY_MODELS:
+        raise ValueError(f"Commodity '{commodity}' not available. Available commodities: {', '.join(available_commodities)}")
+    return {"districts": DISTRICT_INDEX.commodity_districts.get(commodity_lower, []), "commodity": commodity_lower}
+
+# Sections /api/dashboard can compute; each builder takes the request parameters
+DASHBOARD_SECTIONS = {
+    'crop_suggestions': lambda params: crop_suggestions_payload(params['season'], params['region'], params['soil_type']),
+    'demand_alerts': lambda params: demand_alerts_payload(),
+    'market_stats': lambda params: market_stats_payload(),
+    'districts': lambda params: districts_payload(params['commodity'])
+}
+
+DASHBOARD_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('DASHBOARD_WORKERS', 4)),
+    thread_name_prefix='dashboard'
+)
+DASHBOARD_TIMEOUT = float(os.environ.get('DASHBOARD_TIMEOUT', 10))
+
+
+def timed_section(builder, params):
+    start = time.perf_counter()
+    try:
+        return builder(params), None, time.perf_counter() - start
+    except Exception as e:
+        return None, str(e), time.perf_counter() - start
+
+
+@app.route('/api/dashboard', methods=['GET'])
+def get_dashboard():
+    """Everything FarmersDashboard needs on mount, computed concurrently
+
+    `sections` is a comma-separated subset of DASHBOARD_SECTIONS (default all);
+    `season`, `region`, `soil_type` and `commodity` (default: the first
+    available commodity) are passed to the sections.
+    """
+    start = time.perf_counter()
+    requested = request.args.get('sections')
+    names = [name.strip() for name in requested.split(',') if name.strip()] if requested else list(DASHBOARD_SECTIONS)
+    unknown = [name for name in names if name not in DASHBOARD_SECTIONS]
+    if unknown:
+        return jsonify({
+            "error": f"Unknown sections: {', '.join(unknown)}. Available sections: {', '.join(DASHBOARD_SECTIONS)}"
+        }), 400
+
+    # The districts section defaults to the first commodity that has a model
+    commodity = request.args.get('commodity') or next(iter(available_commodities), None)
+    if commodity is None and 'districts' in names:
+        return jsonify({"error": "No commodity models are available; pass commodity or omit the districts section"}), 400
+
+    params = {
+        'season': request.args.get('season', 'kharif'),
+        'region': request.args.get('region', 'Maharashtra'),
+        'soil_type': request.args.get('soil_type', 'black_cotton'),
+        'commodity': commodity
+    }
+
+    futures = {name: DASHBOARD_EXECUTOR.submit(timed_section, DASHBOARD_SECTIONS[name], params)
+               for name in dict.fromkeys(names)}
+    sections, errors, timings = {}, {}, {}
+    for name, future in futures.items():
+        try:
+            payload, error, elapsed = future.result(timeout=max(0, DASHBOARD_TIMEOUT - (time.perf_counter() - start)))
+        except FutureTimeoutError:
+            payload, error, elapsed = None, "Timed out", time.perf_counter() - start
+        timings[name] = round(elapsed * 1000, 2)
+        if error is not None:
+            logger.error(f"Dashboard section {name} failed: {error}")
+            errors[name] = error
+        else:
+            sections[name] = payload
+
+    return jsonify({
+        "sections": sections,
+        "errors": errors,
+        "timings_ms": timings,
+        "total_ms": round((time.perf_counter() - start) * 1000, 2),
+        "timestamp": datetime.now().isoformat()
+    })
+
+# Crop photos are spooled to disk and analysed on a bounded background pool
+CROP_HEALTH_JOBS = CropHealthJobs(
+    spool_path=os.environ.get('CROP_HEALTH_SPOOL_PATH', crop_health.SPOOL_PATH),
+    max_bytes=int(float(os.environ.get('CROP_HEALTH_MAX_MB', 10)) * 1024 * 1024),
+    workers=int(os.environ.get('CROP_HEALTH_WORKERS', 2)),
+    # Jobs allowed to wait or run at once; further uploads get 503
+    max_pending=int(os.environ.get('CROP_HEALTH_MAX_PENDING', 16)),
+    # Finished results kept for polling and for deduplicating repeat photos
+    max_results=int(os.environ.get('CROP_HEALTH_MAX_RESULTS', 1000))
+)
+# Multipart overhead allowed on top of the image itself
+CROP_HEALTH_UPLOAD_SLACK = 64 * 1024
+# Werkzeug rejects larger bodies (including chunked ones) with 413 while reading,
+# before anything is buffered or spooled; it is the largest request the API accepts
+app.config['MAX_CONTENT_LENGTH'] = CROP_HEALTH_JOBS.max_bytes + CROP_HEALTH_UPLOAD_SLACK
+# Seconds a request waits for its job before answering 202 (override with ?wait=)
+CROP_HEALTH_WAIT = float(os.environ.get('CROP_HEALTH_WAIT', 5))
+MAX_CROP_HEALTH_WAIT = 30
+
+
+def crop_health_wait():
+    try:
+        return min(max(float(request.args.get('wait', CROP_HEALTH_WAIT)), 0), MAX_CROP_HEALTH_WAIT)
+    except ValueError:
+        raise PredictionError("wait must be a number of seconds")
+
+
+def crop_health_response(job, deduplicated=False):
+    status_url = f"/api/analyze-crop-health/{job['id']}"
+    body = {"job_id": job['id'], "status": job['status'], "status_url": status_url, "deduplicated": deduplicated}
+    if job['status'] == 'done':
+        body.update(job['result'])
+        body["timestamp"] = datetime.fromtimestamp(job['finished_at']).isoformat()
+        return jsonify(body)
+    if job['status'] == 'failed':
+        body["error"] = f"Failed to analyze crop image: {job['error']}"
+        return jsonify(body), 422
+    response = jsonify(body)
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
+
+
 @app.route('/api/analyze-crop-health', methods=['POST'])
 def analyze_crop_health():
-    """Analyze crop health from uploaded image"""
+    """Submit a crop photo for analysis
+
+    Waits up to `?wait=` seconds (default CROP_HEALTH_WAIT) and returns the
+    analysis if it finished, otherwise 202 with a job to poll. A photo that
+    was already analysed returns the cached result.
+    """
     try:
+        wait = crop_health_wait()
         if 'crop_image' not in request.files:
             return jsonify({"error": "No image file provided"}), 400
-            
-        image_file = request.files['crop_image']
-        
-        # Here you would integrate with your computer vision model
-        # For now, returning mock analysis
-        analysis = {
-            "health_score": random.randint(75, 95),
-            "disease_detected": random.choice([None, "leaf_rust", "powdery_mildew"]),
-            "nutrient_deficiency": random.choice([None, "nitrogen", "potassium"]),
-            "recommendations": [
-                "Crop is in good health",
-                "Consider adding organic fertilizer",
-                "Monitor for pest activity"
-            ]
-        }
-        
-        return jsonify({
-            "analysis": analysis,
-            "timestamp": datetime.now().isoformat()
-        })
-        
+
+        job, deduplicated = CROP_HEALTH_JOBS.submit(request.files['crop_image'].stream)
+        hot_log.info("🌿 Crop health job %s %s", job['id'], 'deduplicated' if deduplicated else 'queued', bytes=job['bytes'])
+        CROP_HEALTH_JOBS.wait(job['id'], wait)
+        return crop_health_response(job, deduplicated)
+
+    except PredictionError as e:
+        return jsonify({"error": e.message}), e.status_code
+    except UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except RequestEntityTooLarge:
+        return jsonify({"error": f"Image larger than {CROP_HEALTH_JOBS.max_bytes // (1024 * 1024)} MB"}), 413
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 503, {'Retry-After': '2'}
     except Exception as e:
         logger.error(f"Error analyzing crop health: {str(e)}")
         return jsonify({"error": "Failed to analyze crop image"}), 500
 
-def generate_crop_suggestions(season, region, soil_type):
-    """Generate crop suggestions based on parameters"""
-    base_suggestions = [
-        {
-            "id": 1,
-            "name": "Moong Dal (Green Gram)",
-            "confidence": random.randint(85, 96),
-            "priceTrend": "high",
-            "expectedIncome": f"₹{random.randint(6000, 7000)}/quintal",
-            "harvestTime": "60 days",
-            "description": "High demand in urban markets, low water requirement",
-            "suitability": "Perfect for your region's soil type",
-            "risk": "Low",
-            "image": "🌱"
-        },
-        {
-            "id": 2,
-            "name": "Mustard",
-            "confidence": random.randint(80, 92),
-            "priceTrend": "medium",
-            "expectedIncome": f"₹{random.randint(4000, 5000)}/quintal",
-            "harvestTime": "120 days",
-            "description": "Low rainfall crop, good for oil production",
-            "suitability": "Ideal for current season",
-            "risk": "Medium",
-            "image": "🟡"
-        },
-        {
-            "id": 3,
-            "name": "Chickpea",
-            "confidence": random.randint(82, 90),
-            "priceTrend": "high",
-            "expectedIncome": f"₹{random.randint(5000, 6000)}/quintal",
-            "harvestTime": "90 days",
-            "description": "Fast harvesting, high nutritional value",
-            "suitability": "Matches your farm size",
-            "risk": "Low",
-            "image": "🟤"
-        }
-    ]
-    
-    # Adjust based on season
-    if season == 'kharif':
-        base_suggestions[0]['confidence'] += 5
-    elif season == 'rabi':
-        base_suggestions[1]['confidence'] += 5
-        
-    return base_suggestions
+@app.route('/api/analyze-crop-health/<job_id>', methods=['GET'])
+def crop_health_job(job_id):
+    """Status, and once done the analysis, of a crop health job; `?wait=` long-polls"""
+    try:
+        wait = crop_health_wait() if 'wait' in request.args else 0
+    except PredictionError as e:
+        return jsonify({"error": e.message}), e.status_code
+    job = CROP_HEALTH_JOBS.wait(job_id, wait)
+    if job is None:
+        return jsonify({"error": f"Unknown or expired crop health job '{job_id}'"}), 404
+    return crop_health_response(job)
 
-def generate_demand_alerts():
-    """Generate realistic demand alerts"""
-    crops = ["Tomato", "Onion", "Wheat", "Rice", "Cotton", "Sugarcane"]
-    locations = ["Pune", "Nashik", "Aurangabad", "Nagpur", "Kolhapur"]
-    
-    alerts = []
-    for i in range(4):
-        crop = random.choice(crops)
-        alerts.append({
-            "id": i + 1,
-            "crop": crop,
-            "location": random.choice(locations),
-            "demand": random.choice(["high", "medium", "low"]),
-            "price": f"₹{random.randint(20, 50)}/kg" if crop in ['Tomato', 'Onion'] else f"₹{random.randint(2000, 5000)}/quintal",
-            "trend": random.choice(["up", "stable", "up"])
-        })
-    
-    return alerts
+STARTUP_SECONDS.set(time.perf_counter() - startup_start, phase='app_init')
 
 if __name__ == '__main__':
     print(f"\n🎯 Multi-Commodity Price Prediction API Ready!")
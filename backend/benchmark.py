@@ -0,0 +1,351 @@
+"""Endpoint benchmarks and load tests with latency percentiles
+
+Every route in app.py is driven with a realistic request mix drawn from
+DISTRICT_TO_MARKETS, the commodities that have models and the districts
+that have price history. About one request in ten is deliberately invalid
+(unknown district or market), so error paths are measured too. Each mix
+runs in-process through Flask's test client and over a local socket
+against a threaded werkzeug server, with concurrent clients.
+
+Results (throughput, p50/p95/p99/max latency, status counts per endpoint,
+plus startup and cold model load timings) are written as JSON. Comparing
+against a saved baseline flags any endpoint whose p95 regressed:
+
+    python benchmark.py --save benchmarks/baseline.json
+    python benchmark.py --compare benchmarks/baseline.json   # exit code 1 on regression
+    python benchmark.py --only predict predict_batch --requests 2000 --modes socket
+
+benchmarks/baseline.json must be regenerated with --save in any change that
+alters a benchmarked route's behaviour or payload, on a machine where
+ingest.py and profitability.py have built the store and index; otherwise
+--compare measures against routes that no longer exist in that form.
+"""
+import argparse
+import hashlib
+import http.client
+import io
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+REQUESTS_PER_ENDPOINT = 300
+WARMUP_REQUESTS = 20
+CONCURRENCY = 8
+INVALID_FRACTION = 0.1
+# A p95 this much slower than the baseline counts as a regression
+REGRESSION_TOLERANCE = 0.25
+# ...unless it is still below this many milliseconds (timer noise)
+REGRESSION_FLOOR_MS = 1.0
+MODES = ('client', 'socket')
+
+
+def json_request(method, path, payload=None):
+    if payload is None:
+        return method, path, {}, None
+    return method, path, {'Content-Type': 'application/json'}, json.dumps(payload).encode('utf-8')
+
+
+def multipart_request(path, field, file_name, content, content_type='image/jpeg'):
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    body.write(f"--{boundary}\r\nContent-Disposition: form-data; name=\"{field}\"; filename=\"{file_name}\"\r\n"
+               f"Content-Type: {content_type}\r\n\r\n".encode('utf-8'))
+    body.write(content)
+    body.write(f"\r\n--{boundary}--\r\n".encode('utf-8'))
+    return 'POST', path, {'Content-Type': f"multipart/form-data; boundary={boundary}"}, body.getvalue()
+
+
+class RequestMix:
+    """Random, valid-by-default request parameters drawn from the app's catalog"""
+
+    def __init__(self, api, seed=0):
+        self.api = api
+        self.rng = random.Random(seed)
+        self.combos = []
+        for commodity in api.available_commodities:
+            for district in api.DISTRICT_INDEX.commodity_districts.get(commodity, []):
+                info = api.DISTRICT_TO_MARKETS.get(district['id'])
+                if info:
+                    self.combos.extend((commodity, district['id'], market) for market in info['markets'])
+        try:
+            store = api.get_history_store()
+            self.history = sorted(store.index)
+        except Exception:
+            self.history = []
+
+    def invalid(self):
+        return self.rng.random() < INVALID_FRACTION
+
+    def prediction(self):
+        if not self.combos:
+            return {'commodity': 'bajra', 'district': 'pune', 'market': 'pune'}
+        commodity, district, market = self.rng.choice(self.combos)
+        if self.invalid():
+            district = self.rng.choice(['atlantis', 'nowhere', 'xyz'])
+        return {'commodity': commodity, 'district': district, 'market': market.lower().replace(' ', '_')}
+
+    def district(self):
+        return self.rng.choice(list(self.api.DISTRICT_TO_MARKETS)) if not self.invalid() else 'atlantis'
+
+    def commodity(self):
+        return self.rng.choice(self.api.available_commodities or ['bajra'])
+
+    def history_key(self):
+        if not self.history or self.invalid():
+            return self.commodity(), 'atlantis'
+        return self.rng.choice(self.history)
+
+    def dates(self):
+        year = self.rng.randint(2019, 2025)
+        return f"{year}-01-01", f"{year}-12-31"
+
+
+def scenarios(mix):
+    """Endpoint name -> (route rule, function returning one request)"""
+    def history():
+        commodity, district = mix.history_key()
+        start, end = mix.dates()
+        return json_request('GET', f"/api/history?commodity={commodity}&district={district}&start={start}&end={end}")
+
+    def timeseries():
+        commodity, district = mix.history_key()
+        interval = mix.rng.choice(['daily', 'weekly', 'monthly'])
+        return json_request('GET', f"/api/timeseries?commodity={commodity}&district={district}&interval={interval}&points=300")
+
+    image = bytes(mix.rng.getrandbits(8) for _ in range(4096))
+    return {
+        'home': ('/', lambda: json_request('GET', '/')),
+        'commodities': ('/api/commodities', lambda: json_request('GET', '/api/commodities')),
+        'districts': ('/api/districts/<commodity>', lambda: json_request('GET', f"/api/districts/{mix.commodity()}")),
+        'markets': ('/api/markets/<district>', lambda: json_request('GET', f"/api/markets/{mix.district()}")),
+        'predict': ('/api/predict', lambda: json_request('POST', '/api/predict', mix.prediction())),
+        'predict_batch': ('/api/predict/batch', lambda: json_request(
+            'POST', '/api/predict/batch', {'items': [mix.prediction() for _ in range(50)]})),
+        'forecast': ('/api/forecast', lambda: json_request(
+            'POST', '/api/forecast', {**mix.prediction(), 'horizon': mix.rng.choice([7, 30, 90])})),
+        'history': ('/api/history', history),
+        'timeseries': ('/api/timeseries', timeseries),
+        'health': ('/api/health', lambda: json_request('GET', '/api/health')),
+        'admin_reload': ('/api/admin/reload', lambda: json_request('POST', '/api/admin/reload')),
+        'stats': ('/api/stats', lambda: json_request('GET', '/api/stats')),
+        'metrics': ('/api/metrics', lambda: json_request('GET', '/api/metrics')),
+        'crop_suggestions': ('/api/crop-suggestions', lambda: json_request('POST', '/api/crop-suggestions', {
+            'season': mix.rng.choice(['kharif', 'rabi', 'zaid']),
+            'region': 'Maharashtra',
+            'soil_type': mix.rng.choice(['black_cotton', 'red', 'alluvial'])})),
+        'demand_alerts': ('/api/demand-alerts', lambda: json_request('GET', f"/api/demand-alerts?commodity={mix.commodity()}")),
+        'market_stats': ('/api/market-stats', lambda: json_request('GET', f"/api/market-stats?commodity={mix.commodity()}")),
+        'dashboard': ('/api/dashboard', lambda: json_request('GET', f"/api/dashboard?commodity={mix.commodity()}")),
+        'analyze_crop_health': ('/api/analyze-crop-health', lambda: multipart_request(
+            '/api/analyze-crop-health', 'crop_image', 'leaf.jpg', image)),
+        # The upload above always hashes to the same job, so this polls a finished one
+        'crop_health_job': ('/api/analyze-crop-health/<job_id>', lambda: json_request(
+            'GET', f"/api/analyze-crop-health/{hashlib.sha256(image).hexdigest()[:32]}"))
+    }
+
+
+def summarize(latencies, statuses, elapsed):
+    latencies_ms = np.asarray(latencies) * 1000
+    counts = {}
+    for status in statuses:
+        counts[str(status)] = counts.get(str(status), 0) + 1
+    return {
+        'requests': len(latencies),
+        'errors': sum(1 for status in statuses if status >= 500),
+        'status_counts': counts,
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'mean_ms': round(float(latencies_ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(latencies_ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(latencies_ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(latencies_ms, 99)), 3),
+        'max_ms': round(float(latencies_ms.max()), 3)
+    }
+
+
+def run_client(api, build, requests, warmup):
+    """Sequential requests through Flask's test client (no network, no threads)"""
+    client = api.app.test_client()
+    for _ in range(warmup):
+        method, path, headers, body = build()
+        client.open(path, method=method, headers=headers, data=body)
+    latencies, statuses = [], []
+    start = time.perf_counter()
+    for _ in range(requests):
+        method, path, headers, body = build()
+        began = time.perf_counter()
+        response = client.open(path, method=method, headers=headers, data=body)
+        response.get_data()
+        latencies.append(time.perf_counter() - began)
+        statuses.append(response.status_code)
+    return summarize(latencies, statuses, time.perf_counter() - start)
+
+
+def run_socket(port, build, requests, warmup, concurrency):
+    """Requests over keep-alive HTTP connections from `concurrency` threads"""
+    prepared = [build() for _ in range(warmup + requests)]
+    latencies, statuses = [], []
+    lock = threading.Lock()
+
+    def worker(batch):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        local_latencies, local_statuses = [], []
+        for index, (method, path, headers, body) in batch:
+            began = time.perf_counter()
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            if index >= warmup:
+                local_latencies.append(time.perf_counter() - began)
+                local_statuses.append(response.status)
+        connection.close()
+        with lock:
+            latencies.extend(local_latencies)
+            statuses.extend(local_statuses)
+
+    indexed = list(enumerate(prepared))
+    for index in range(warmup):
+        worker([indexed[index]])
+    threads = [threading.Thread(target=worker, args=(indexed[warmup + offset::concurrency],))
+               for offset in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, statuses, time.perf_counter() - start)
+
+
+def start_server(api):
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, api.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name='benchmark-server', daemon=True)
+    thread.start()
+    return server
+
+
+def measure_model_loads(api):
+    """Seconds to load each commodity cold (registry emptied first)"""
+    timings = {}
+    api.COMMODITY_MODELS.reload()
+    for commodity in list(api.available_commodities):
+        start = time.perf_counter()
+        api.COMMODITY_MODELS[commodity]
+        timings[commodity] = round(time.perf_counter() - start, 4)
+    return timings
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Endpoints whose p95 regressed beyond `tolerance` relative to the baseline"""
+    regressions = []
+    for mode, endpoints in results['endpoints'].items():
+        for name, current in endpoints.items():
+            previous = baseline.get('endpoints', {}).get(mode, {}).get(name)
+            if not previous:
+                continue
+            limit = max(previous['p95_ms'] * (1 + tolerance), REGRESSION_FLOOR_MS)
+            if current['p95_ms'] > limit:
+                regressions.append(f"{mode}/{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+    for commodity, seconds in results['startup']['model_load_seconds'].items():
+        previous = baseline.get('startup', {}).get('model_load_seconds', {}).get(commodity)
+        if previous and seconds > max(previous * (1 + tolerance), 0.05):
+            regressions.append(f"model load {commodity}: {previous}s -> {seconds}s")
+    return regressions
+
+
+def run(only=None, modes=MODES, requests=REQUESTS_PER_ENDPOINT, warmup=WARMUP_REQUESTS, concurrency=CONCURRENCY, seed=0):
+    start = time.perf_counter()
+    import app as api
+    import_seconds = time.perf_counter() - start
+    # Expected failures (invalid mix entries) would otherwise flood the output
+    logging.disable(logging.ERROR)
+
+    mix = RequestMix(api, seed)
+    routes = scenarios(mix)
+    uncovered = sorted({rule.rule for rule in api.app.url_map.iter_rules() if rule.endpoint != 'static'} -
+                       {rule for rule, _ in routes.values()})
+    if uncovered:
+        print(f"⚠️ Routes without a benchmark scenario: {', '.join(uncovered)}", file=sys.stderr)
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'requests_per_endpoint': requests,
+            'concurrency': concurrency,
+            'seed': seed
+        },
+        'startup': {
+            'import_seconds': round(import_seconds, 3),
+            'model_load_seconds': measure_model_loads(api)
+        },
+        'endpoints': {},
+        'uncovered_routes': uncovered
+    }
+
+    server = start_server(api) if 'socket' in modes else None
+    try:
+        for mode in modes:
+            results['endpoints'][mode] = {}
+            for name, (_, build) in routes.items():
+                if only and name not in only:
+                    continue
+                if mode == 'client':
+                    summary = run_client(api, build, requests, warmup)
+                else:
+                    summary = run_socket(server.server_port, build, requests, warmup, concurrency)
+                results['endpoints'][mode][name] = summary
+                print(f"{mode:6} {name:20} {summary['throughput_rps']:>9} req/s  "
+                      f"p50 {summary['p50_ms']:>8.2f}ms  p95 {summary['p95_ms']:>8.2f}ms  p99 {summary['p99_ms']:>8.2f}ms  "
+                      f"{summary['status_counts']}")
+    finally:
+        if server is not None:
+            server.shutdown()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', nargs='*', help='endpoint names to run (default: all)')
+    parser.add_argument('--modes', nargs='*', default=list(MODES), choices=MODES)
+    parser.add_argument('--requests', type=int, default=REQUESTS_PER_ENDPOINT, help='measured requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=WARMUP_REQUESTS)
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY, help='client threads in socket mode')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', metavar='PATH', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='fail if p95 latency regressed against this baseline')
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args()
+
+    results = run(args.only, args.modes, args.requests, args.warmup, args.concurrency, args.seed)
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or '.', exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Saved results to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"❌ {regression}")
+        if regressions:
+            sys.exit(1)
+        print("✅ No regressions against the baseline")
@@ -0,0 +1,208 @@
+"""Versioned, memory-mappable model bundles
+
+A bundle holds everything needed to serve one commodity in one directory:
+
+    models/bundles/<commodity>/
+        CURRENT                  name of the live version
+        <version>/manifest.json  format, version, feature order, districts,
+                                 training window, metrics, sha256 checksums
+        <version>/*.npy          flat forest arrays (see inference.CompiledForest)
+
+The weights are the compiled forest arrays, saved as .npy and opened with
+mmap_mode='r'. Loading therefore costs a few page faults instead of an
+unpickle, and worker processes share the pages through the OS cache. A
+version directory is written in full and renamed into place before CURRENT
+is atomically replaced, so a reader never sees a half-written bundle.
+
+    python bundle.py --migrate      # convert the legacy pickles in models/
+    python bundle.py --list
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+from datetime import datetime
+
+import numpy as np
+
+from catalog import COMMODITY_FILES, FEATURES
+from inference import CompiledForest, check_parity, compile_forest
+
+logger = logging.getLogger(__name__)
+
+BUNDLES_PATH = './models/bundles'
+BUNDLE_FORMAT = 1
+MANIFEST = 'manifest.json'
+CURRENT = 'CURRENT'
+ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'roots', 'fill_values')
+
+
+class BundleError(Exception):
+    pass
+
+
+class DistrictClasses:
+    """The part of a LabelEncoder the API uses: `classes_` in code order"""
+
+    def __init__(self, classes):
+        self.classes_ = np.asarray(classes, dtype=object)
+        self._codes = {name: code for code, name in enumerate(classes)}
+
+    def transform(self, names):
+        return np.array([self._codes[name] for name in names])
+
+
+def sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def current_version(commodity, bundles_path=BUNDLES_PATH):
+    """Live version of a commodity's bundle, or None if it has none"""
+    try:
+        with open(os.path.join(bundles_path, commodity, CURRENT)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def read_manifest(commodity, version=None, bundles_path=BUNDLES_PATH):
+    version = version or current_version(commodity, bundles_path)
+    if version is None:
+        raise BundleError(f"No bundle for {commodity}")
+    with open(os.path.join(bundles_path, commodity, version, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != BUNDLE_FORMAT:
+        raise BundleError(f"Unsupported bundle format {manifest.get('format')} for {commodity} {version}")
+    return manifest
+
+
+def write_bundle(commodity, engine, districts, metadata=None, bundles_path=BUNDLES_PATH, activate=True):
+    """Write a compiled forest as a new bundle version; returns the version"""
+    commodity_path = os.path.join(bundles_path, commodity)
+    version = datetime.now().strftime('%Y%m%dT%H%M%S')
+    suffix = 1
+    while os.path.exists(os.path.join(commodity_path, version)):
+        suffix += 1
+        version = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{suffix}"
+
+    tmp_path = os.path.join(commodity_path, f".{version}.tmp")
+    os.makedirs(tmp_path)
+    checksums = {}
+    for name in ARRAYS:
+        file_name = f"{name}.npy"
+        np.save(os.path.join(tmp_path, file_name), np.ascontiguousarray(getattr(engine, name)))
+        checksums[file_name] = sha256(os.path.join(tmp_path, file_name))
+
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'commodity': commodity,
+        'version': version,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'feature_order': FEATURES,
+        'districts': [str(name) for name in districts],
+        'max_depth': int(engine.max_depth),
+        'n_trees': int(engine.n_trees),
+        'node_count': int(engine.node_count),
+        'checksum': {'algorithm': 'sha256', 'files': checksums},
+        **(metadata or {})
+    }
+    with open(os.path.join(tmp_path, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.rename(tmp_path, os.path.join(commodity_path, version))
+
+    if activate:
+        activate_version(commodity, version, bundles_path)
+    return version
+
+
+def activate_version(commodity, version, bundles_path=BUNDLES_PATH):
+    """Point CURRENT at a version with an atomic rename"""
+    read_manifest(commodity, version, bundles_path)
+    pointer = os.path.join(bundles_path, commodity, CURRENT)
+    with open(pointer + '.tmp', 'w') as f:
+        f.write(version + '\n')
+    os.replace(pointer + '.tmp', pointer)
+
+
+def export_bundle(commodity, model, preprocessor, district_encoder, metadata=None, bundles_path=BUNDLES_PATH):
+    """Compile a fitted model + preprocessor, verify parity and write it as a bundle"""
+    engine = compile_forest(model, preprocessor)
+    max_diff = check_parity(engine, model, preprocessor)
+    metadata = {'parity_max_diff': max_diff, **(metadata or {})}
+    return write_bundle(commodity, engine, district_encoder.classes_, metadata, bundles_path)
+
+
+def load_bundle(commodity, version=None, bundles_path=BUNDLES_PATH, verify=True):
+    """(CompiledForest over memory-mapped arrays, manifest) for a bundle version"""
+    manifest = read_manifest(commodity, version, bundles_path)
+    if manifest['feature_order'] != FEATURES:
+        raise BundleError(f"{commodity} {manifest['version']} was trained on {manifest['feature_order']}, API builds {FEATURES}")
+    version_path = os.path.join(bundles_path, commodity, manifest['version'])
+    if verify:
+        for file_name, expected in manifest['checksum']['files'].items():
+            if sha256(os.path.join(version_path, file_name)) != expected:
+                raise BundleError(f"Checksum mismatch for {commodity} {manifest['version']}/{file_name}")
+
+    arrays = {name: np.load(os.path.join(version_path, f"{name}.npy"), mmap_mode='r') for name in ARRAYS}
+    engine = CompiledForest(max_depth=manifest['max_depth'], **arrays)
+    return engine, manifest
+
+
+def prune(commodity, keep=3, bundles_path=BUNDLES_PATH):
+    """Delete all but the newest `keep` versions, never the live one"""
+    commodity_path = os.path.join(bundles_path, commodity)
+    live = current_version(commodity, bundles_path)
+    versions = sorted(name for name in os.listdir(commodity_path)
+                      if not name.startswith('.') and os.path.isdir(os.path.join(commodity_path, name)))
+    removed = [version for version in versions[:-keep] if version != live] if keep else []
+    for version in removed:
+        shutil.rmtree(os.path.join(commodity_path, version))
+    return removed
+
+
+def migrate(files=None, bundles_path=BUNDLES_PATH):
+    """Convert legacy model/preprocessor/encoder pickles into bundles"""
+    migrated = {}
+    for commodity, paths in (files or COMMODITY_FILES).items():
+        if not all(os.path.exists(path) for path in paths.values()):
+            continue
+        artefacts = {}
+        for key, path in paths.items():
+            with open(path, 'rb') as f:
+                artefacts[key] = pickle.load(f)
+        version = export_bundle(commodity, artefacts['model'], artefacts['preprocessor'], artefacts['district_encoder'],
+                                {'source': {key: os.path.basename(path) for key, path in paths.items()}}, bundles_path)
+        logger.info(f"📦 {commodity}: legacy pickles -> bundle {version}")
+        migrated[commodity] = version
+    return migrated
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bundles', default=BUNDLES_PATH)
+    parser.add_argument('--migrate', action='store_true', help='convert the legacy pickles into bundles')
+    parser.add_argument('--list', action='store_true', help='show the live version of every commodity')
+    parser.add_argument('--prune', type=int, metavar='KEEP', help='delete all but the newest KEEP versions')
+    args = parser.parse_args()
+    if args.migrate:
+        migrate(bundles_path=args.bundles)
+    if args.prune is not None:
+        for commodity in COMMODITY_FILES:
+            if current_version(commodity, args.bundles):
+                prune(commodity, args.prune, args.bundles)
+    if args.list or not (args.migrate or args.prune is not None):
+        for commodity in COMMODITY_FILES:
+            version = current_version(commodity, args.bundles)
+            if version:
+                manifest = read_manifest(commodity, version, args.bundles)
+                window = manifest.get('training_window', {})
+                print(f"{commodity:8} {version}  {manifest['n_trees']} trees  "
+                      f"{window.get('start', '?')}..{window.get('end', '?')}")
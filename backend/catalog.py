@@ -0,0 +1,302 @@
+"""Commodities, their model artefacts and the districts/markets we serve
+
+Shared by the API (app.py) and the offline CLIs (train.py, profitability.py).
+"""
+import numpy as np
+
+# Commodity configuration
+COMMODITY_CONFIG = {
+    'bajra': {
+        'name': 'Bajra',
+        'display_name': '🌾 Bajra',
+        'default_p_min': 1800,
+        'default_p_max': 2500,
+        'color': 'green',
+        'icon': '🌾'
+    },
+    'wheat': {
+        'name': 'Wheat',
+        'display_name': '🌾 Wheat', 
+        'default_p_min': 2000,
+        'default_p_max': 2800,
+        'color': 'amber',
+        'icon': '🌾'
+    },
+    'cotton': {
+        'name': 'Cotton',
+        'display_name': '🧵 Cotton',
+        'default_p_min': 5000, 
+        'default_p_max': 8000,
+        'color': 'blue',
+        'icon': '🧵'
+    },
+    'jowar': {
+        'name': 'Jowar',
+        'display_name': '🌾 Jowar',
+        'default_p_min': 1900,
+        'default_p_max': 2600, 
+        'color': 'purple',
+        'icon': '🌾'
+    },
+    'rice': {
+        'name': 'Rice',
+        'display_name': '🍚 Rice',
+        'default_p_min': 2500,
+        'default_p_max': 5000,
+        'color': 'red',
+        'icon': '🍚'
+    },
+    'chikoo': {
+        'name': 'Chikoo',
+        'display_name': '🥭 Chikoo',
+        'default_p_min': 3000,
+        'default_p_max': 6000,
+        'color': 'green',
+        'icon': '🥭'
+    },
+    'grapes': {
+        'name': 'Grapes',
+        'display_name': '🍇 Grapes',
+        'default_p_min': 4000,
+        'default_p_max': 8000,
+        'color': 'purple',
+        'icon': '🍇'
+    },
+    'mangos': {
+        'name': 'Mangoes',
+        'display_name': '🥭 Mangoes',
+        'default_p_min': 2000,
+        'default_p_max': 5000,
+        'color': 'orange',
+        'icon': '🥭'
+    },
+    'orange': {
+        'name': 'Orange',
+        'display_name': '🍊 Orange',
+        'default_p_min': 2500,
+        'default_p_max': 4500,
+        'color': 'orange',
+        'icon': '🍊'
+    },
+    'papaya': {
+        'name': 'Papaya',
+        'display_name': '🍈 Papaya',
+        'default_p_min': 1500,
+        'default_p_max': 3000,
+        'color': 'yellow',
+        'icon': '🍈'
+    }
+}
+
+# File name patterns for each commodity
+COMMODITY_FILES = {
+    'bajra': {
+        'model': './models/bajra_model.pkl',
+        'preprocessor': './models/bajra_preprocessor.pkl',
+        'district_encoder': './models/Bajradistrict_encoder.pkl'
+    },
+    'wheat': {
+        'model': './models/wheat_model.pkl',
+        'preprocessor': './models/wheat_preprocessor.pkl',
+        'district_encoder': './models/Wheatdistrict_encoder.pkl'
+    },
+    'cotton': {
+        'model': './models/cotton_model.pkl',
+        'preprocessor': './models/cotton_preprocessor.pkl',
+        'district_encoder': './models/Cottondistrict_encoder.pkl'
+    },
+    'jowar': {
+        'model': './models/jowar_model.pkl',
+        'preprocessor': './models/jowar_preprocessor.pkl',
+        'district_encoder': './models/Jowardistrict_encoder.pkl'
+    },
+    'rice': {
+        'model': './models/rice_model.pkl',
+        'preprocessor': './models/rice_preprocessor.pkl',
+        'district_encoder': './models/Ricedistrict_encoder.pkl'
+    },
+    'chikoo': {
+        'model': './models/chikoo_model.pkl',
+        'preprocessor': './models/chikoo_preprocessor.pkl',
+        'district_encoder': './models/chikoodistrict_encoder.pkl'
+    },
+    'grapes': {
+        'model': './models/grapes_model.pkl',
+        'preprocessor': './models/grapes_preprocessor.pkl',
+        'district_encoder': './models/grapesdistrict_encoder.pkl'
+    },
+    'mangos': {
+        'model': './models/mangos_model.pkl',
+        'preprocessor': './models/mangos_preprocessor.pkl',
+        'district_encoder': './models/mangosdistrict_encoder.pkl'
+    },
+    'orange': {
+        'model': './models/orange_model.pkl',
+        'preprocessor': './models/orange_preprocessor.pkl',
+        'district_encoder': './models/orangedistrict_encoder.pkl'
+    },
+    'papaya': {
+        'model': './models/papaya_model.pkl',
+        'preprocessor': './models/papaya_preprocessor.pkl',
+        'district_encoder': './models/papayadistrict_encoder.pkl'
+    }
+}
+
+# Maharashtra districts and markets - EXPANDED WITH NAGPUR
+DISTRICT_TO_MARKETS = {
+    'ahmadnagar': {
+        'district_name': 'Ahmadnagar',
+        'markets': ['Ahmednagar', 'Ahmedpur', 'Akhadabalapur'],
+        'district_id': 501,
+        'market_id': 1101
+    },
+    'akola': {
+        'district_name': 'Akola',
+        'markets': ['Akola', 'Akot', 'Achalpur'],
+        'district_id': 502,
+        'market_id': 1102
+    },
+    'amravati': {
+        'district_name': 'Amravati',
+        'markets': ['Amravati', 'Achalpur'],
+        'district_id': 503,
+        'market_id': 1103
+    },
+    'aurangabad': {
+        'district_name': 'Aurangabad',
+        'markets': ['Aurangabad'],
+        'district_id': 504,
+        'market_id': 1104
+    },
+    'bid': {
+        'district_name': 'Bid',
+        'markets': ['Ahmedpur'],
+        'district_id': 505,
+        'market_id': 1105
+    },
+    'bhandara': {
+        'district_name': 'Bhandara',
+        'markets': ['Bhandara', 'Tumsar'],
+        'district_id': 506,
+        'market_id': 1106
+    },
+    'nandurbar': {
+        'district_name': 'Nandurbar',
+        'markets': ['Nandurbar'],
+        'district_id': 497,
+        'market_id': 165
+    },
+    'nashik': {
+        'district_name': 'Nashik',
+        'markets': ['Nashik', 'Malegaon'],
+        'district_id': 507,
+        'market_id': 1107
+    },
+    'pune': {
+        'district_name': 'Pune',
+        'markets': ['Pune', 'Baramati'],
+        'district_id': 508,
+        'market_id': 1108
+    },
+    'kolhapur': {
+        'district_name': 'Kolhapur',
+        'markets': ['Kolhapur'],
+        'district_id': 509,
+        'market_id': 1109
+    },
+    'nagpur': {
+        'district_name': 'Nagpur',
+        'markets': ['Nagpur', 'Katol', 'Kalmeshwar', 'Umred'],
+        'district_id': 510,
+        'market_id': 1110
+    },
+    'yavatmal': {
+        'district_name': 'Yavatmal',
+        'markets': ['Yavatmal', 'Wani'],
+        'district_id': 511,
+        'market_id': 1111
+    },
+    'latur': {
+        'district_name': 'Latur',
+        'markets': ['Latur'],
+        'district_id': 512,
+        'market_id': 1112
+    },
+    'jalna': {
+        'district_name': 'Jalna',
+        'markets': ['Jalna'],
+        'district_id': 513,
+        'market_id': 1113
+    },
+    'thane': {
+        'district_name': 'Thane',
+        'markets': ['Thane', 'Kalyan'],
+        'district_id': 514,
+        'market_id': 1114
+    }
+}
+
+# Alternate spellings users and the raw mandi feeds use for our districts
+DISTRICT_ALIASES = {
+    'ahmadnagar': ['Ahmednagar', 'Ahilyanagar'],
+    'amravati': ['Amrawati', 'Amaravati'],
+    'aurangabad': ['Chhatrapati Sambhajinagar', 'Chattrapati Sambhajinagar', 'Sambhajinagar'],
+    'bid': ['Beed'],
+    'nashik': ['Nasik'],
+    'pune': ['Poona'],
+    'thane': ['Thana']
+}
+
+# Typical time from sowing (or, for orchards, from flowering) to harvest
+HARVEST_TIME = {
+    'bajra': '75-90 days',
+    'wheat': '110-130 days',
+    'cotton': '150-180 days',
+    'jowar': '100-120 days',
+    'rice': '110-150 days',
+    'chikoo': '7-10 months from flowering',
+    'grapes': '120-150 days from pruning',
+    'mangos': '4-5 months from flowering',
+    'orange': '8-10 months from flowering',
+    'papaya': '9-11 months'
+}
+
+# Commodities that do well on each soil type the dashboard can send
+SOIL_AFFINITY = {
+    'black_cotton': {'cotton', 'jowar', 'wheat', 'orange', 'grapes', 'chikoo'},
+    'alluvial': {'rice', 'wheat', 'papaya', 'mangos', 'grapes'},
+    'red': {'bajra', 'jowar', 'mangos', 'chikoo'},
+    'laterite': {'rice', 'mangos', 'chikoo'},
+    'sandy': {'bajra', 'papaya'}
+}
+
+STATE_ID = 27
+
+# Column order of the feature rows predict() builds and the models are trained on
+FEATURES = ['market_id', 'state_id', 'district_id', 'p_min', 'p_max', 'Year', 'Month', 'Day', 'district_encoded']
+
+
+def build_feature_row(commodity, district_info, district_encoded, date):
+    """Build the 9-feature row the commodity models were trained on"""
+    config = COMMODITY_CONFIG.get(commodity, COMMODITY_CONFIG['bajra'])  # Fallback to bajra config
+    return [
+        district_info['market_id'],
+        STATE_ID,
+        district_info['district_id'],
+        config['default_p_min'],
+        config['default_p_max'],
+        date.year,
+        date.month,
+        date.day,
+        district_encoded
+    ]
+
+
+def build_feature_grid(commodity, district_info, district_encoded, dates):
+    """Feature matrix with one row per date, built column-wise"""
+    grid = np.tile(np.array(build_feature_row(commodity, district_info, district_encoded, dates[0]), dtype=np.float64),
+                   (len(dates), 1))
+    grid[:, 5] = [day.year for day in dates]
+    grid[:, 6] = [day.month for day in dates]
+    grid[:, 7] = [day.day for day in dates]
+    return grid
@@ -0,0 +1,230 @@
+"""Background crop-health analysis jobs
+
+Uploads are streamed to a spool directory while being hashed and size
+checked, so the request thread never decodes an image. Decoding,
+downscaling and analysis run on a bounded thread pool. Jobs are keyed by the
+SHA-256 of the upload:
+
+- A photo that is already queued, running or analysed returns the existing
+  job and its cached result.
+- When `max_pending` jobs are waiting, `submit` raises QueueFull so the API
+  can answer 503 instead of queueing without bound.
+
+Pillow is optional. Without it, images are sniffed by their magic bytes
+instead of being decoded and downscaled.
+"""
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+SPOOL_PATH = './data/uploads'
+# Longest side the analyzer sees; larger photos are downscaled first
+MAX_IMAGE_SIDE = 512
+CHUNK_SIZE = 64 * 1024
+
+MAGIC_NUMBERS = {
+    b'\xff\xd8\xff': 'JPEG',
+    b'\x89PNG\r\n\x1a\n': 'PNG',
+    b'GIF8': 'GIF',
+    b'BM': 'BMP',
+}
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class QueueFull(Exception):
+    pass
+
+
+def sniff_format(header):
+    for magic, image_format in MAGIC_NUMBERS.items():
+        if header.startswith(magic):
+            return image_format
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+
+def load_image(path, max_side=MAX_IMAGE_SIDE):
+    """Decode and downscale an image with Pillow; returns (image or None, info)"""
+    if Image is None:
+        with open(path, 'rb') as f:
+            return None, {'format': sniff_format(f.read(16)), 'decoded': False}
+    with Image.open(path) as image:
+        image_format = image.format
+        original_size = image.size
+        image = image.convert('RGB')
+    image.thumbnail((max_side, max_side))
+    return image, {'format': image_format, 'decoded': True, 'original_size': list(original_size),
+                   'analyzed_size': list(image.size)}
+
+
+def mock_analysis(image, info, digest):
+    """Placeholder for the vision model, seeded by content so a photo always gets the same answer"""
+    rng = random.Random(digest)
+    return {
+        "health_score": rng.randint(75, 95),
+        "disease_detected": rng.choice([None, "leaf_rust", "powdery_mildew"]),
+        "nutrient_deficiency": rng.choice([None, "nitrogen", "potassium"]),
+        "recommendations": [
+            "Crop is in good health",
+            "Consider adding organic fertilizer",
+            "Monitor for pest activity"
+        ]
+    }
+
+
+class CropHealthJobs:
+    """Spool, deduplicate and analyse crop photos on a bounded worker pool"""
+
+    def __init__(self, spool_path=SPOOL_PATH, max_bytes=10 * 1024 * 1024, workers=2, max_pending=16,
+                 max_results=1000, analyzer=mock_analysis, max_side=MAX_IMAGE_SIDE):
+        self.spool_path = spool_path
+        self.max_bytes = max_bytes
+        self.max_pending = max_pending
+        self.max_results = max_results
+        self.analyzer = analyzer
+        self.max_side = max_side
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='crop-health')
+        self.workers = workers
+        # job id (content hash) -> job dict, oldest first; finished jobs are evicted LRU
+        self._jobs = OrderedDict()
+        self._done = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.counters = {'submitted': 0, 'deduplicated': 0, 'rejected_full': 0, 'rejected_size': 0,
+                         'completed': 0, 'failed': 0}
+
+    def spool(self, stream):
+        """Copy an upload to the spool directory, hashing as it goes; returns (path, digest, size)"""
+        os.makedirs(self.spool_path, exist_ok=True)
+        path = os.path.join(self.spool_path, f"{uuid.uuid4().hex}.upload")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(path, 'wb') as f:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise UploadTooLarge(f"Image larger than {self.max_bytes // (1024 * 1024)} MB")
+                    digest.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            os.remove(path)
+            raise
+        return path, digest.hexdigest()[:32], size
+
+    def submit(self, stream):
+        """Queue an upload for analysis; returns (job, deduplicated)"""
+        try:
+            path, job_id, size = self.spool(stream)
+        except UploadTooLarge:
+            with self._lock:
+                self.counters['rejected_size'] += 1
+            raise
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+            # Failed jobs are retried; anything else is the same photo again
+            duplicate = job is not None and job['status'] != 'failed'
+            full = not duplicate and self._pending >= self.max_pending
+            if duplicate:
+                self._jobs.move_to_end(job_id)
+                self.counters['deduplicated'] += 1
+            elif full:
+                self.counters['rejected_full'] += 1
+            else:
+                job = {'id': job_id, 'status': 'queued', 'bytes': size, 'submitted_at': time.time(),
+                       'started_at': None, 'finished_at': None, 'result': None, 'error': None}
+                self._jobs[job_id] = job
+                self._jobs.move_to_end(job_id)
+                self._done[job_id] = threading.Event()
+                self._pending += 1
+                self.counters['submitted'] += 1
+
+            snapshot = dict(job) if job is not None else None
+
+        if duplicate or full:
+            os.remove(path)
+            if full:
+                raise QueueFull(f"{self.max_pending} crop images are already waiting for analysis")
+            return snapshot, True
+        self._executor.submit(self._run, job, path)
+        return snapshot, False
+
+    def _run(self, job, path):
+        with self._lock:
+            done = self._done[job['id']]
+            job['status'] = 'running'
+            job['started_at'] = time.time()
+        result, error = None, None
+        try:
+            image, info = load_image(path, self.max_side)
+            result = {'analysis': self.analyzer(image, info, job['id']), 'image': info}
+        except Exception as e:
+            logger.error(f"❌ Crop health job {job['id']} failed: {str(e)}")
+            error = str(e)
+        finally:
+            os.remove(path)
+        outcome = 'failed' if error is not None else 'completed'
+        # Readers only see a finished job with its result and finish time in place
+        with self._lock:
+            job.update(result=result, error=error, finished_at=time.time(),
+                       status='failed' if error is not None else 'done')
+            self._pending -= 1
+            self.counters[outcome] += 1
+            self._evict()
+        done.set()
+
+    def _evict(self):
+        """Drop the least recently used finished jobs beyond max_results; caller holds the lock"""
+        excess = len(self._jobs) - self.max_results
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[job_id]['status'] in ('done', 'failed'):
+                del self._jobs[job_id]
+                del self._done[job_id]
+                excess -= 1
+
+    def get(self, job_id):
+        """Snapshot of a job, consistent even while a worker is finishing it"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def wait(self, job_id, timeout):
+        """The job once finished, or as it stands after `timeout` seconds"""
+        with self._lock:
+            done = self._done.get(job_id)
+        if done is not None and timeout > 0:
+            done.wait(timeout)
+        return self.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self.counters,
+                'pending': self._pending,
+                'max_pending': self.max_pending,
+                'workers': self.workers,
+                'jobs': len(self._jobs),
+                'max_results': self.max_results,
+                'max_bytes': self.max_bytes,
+                'image_decoder': 'pillow' if Image is not None else 'none'
+            }
@@ -0,0 +1,111 @@
+"""Precomputed district/market resolution index
+
+Built once from DISTRICT_TO_MARKETS and the commodity district encoders so
+request handlers resolve a district, validate a market and encode the
+district with dict lookups instead of scanning the catalog on every call.
+"""
+import re
+from bisect import bisect_left
+
+# Shortest input that may be resolved by prefix
+MIN_PREFIX = 3
+MAX_MEMO_ENTRIES = 4096
+
+_PARENTHETICAL = re.compile(r'\(.*?\)')
+_SEPARATORS = re.compile(r'[\s_\-./,]+')
+
+
+def normalize_words(name):
+    """Lowercase words of a district name with separators and (notes) removed"""
+    name = _PARENTHETICAL.sub(' ', str(name).lower())
+    return [word for word in _SEPARATORS.split(name) if word]
+
+
+def normalize(name):
+    """Canonical lookup key: 'Chhatrapati-Sambhajinagar (APMC)' -> 'chhatrapatisambhajinagar'"""
+    return ''.join(normalize_words(name))
+
+
+def market_key(market):
+    """Market id as exposed by the API: 'Kalmeshwar Road' -> 'kalmeshwar_road'"""
+    return market.lower().replace(' ', '_')
+
+
+class DistrictIndex:
+    """Immutable lookup tables for districts, markets and encoder codes"""
+
+    def __init__(self, district_to_markets, aliases=None, commodity_districts=None, encoders=None):
+        self.districts = district_to_markets
+        self.by_name = {}
+        self.markets = {}
+
+        for district_id, info in district_to_markets.items():
+            names = [district_id, info['district_name']] + list((aliases or {}).get(district_id, []))
+            for name in names:
+                self.by_name.setdefault(normalize(name), district_id)
+            self.markets[district_id] = {market_key(market): market for market in info['markets']}
+
+        self._prefixes = sorted(self.by_name.items())
+        self._prefix_keys = [name for name, _ in self._prefixes]
+        self._memo = {}
+
+        # Per-commodity encoder codes and the /api/districts payloads
+        self.codes = {}
+        self.commodity_districts = {}
+        by_district_name = {info['district_name'].lower(): district_id
+                            for district_id, info in district_to_markets.items()}
+        for commodity, encoder in (encoders or {}).items():
+            classes = list(getattr(encoder, 'classes_', []))
+            self.codes[commodity] = {}
+            for code, district_name in enumerate(classes):
+                self.codes[commodity].setdefault(district_name, code)
+                self.codes[commodity].setdefault(district_name.strip(), code)
+
+            districts = []
+            for district_name in (commodity_districts or {}).get(commodity, []):
+                clean_district_name = district_name.strip().lower()
+                district_id = by_district_name.get(clean_district_name)
+                if district_id:
+                    districts.append({"id": district_id, "name": district_to_markets[district_id]['district_name']})
+                else:
+                    # Not in DISTRICT_TO_MARKETS, still include it
+                    districts.append({"id": clean_district_name.replace(' ', '_'), "name": district_name.strip()})
+            self.commodity_districts[commodity] = districts
+
+    def resolve_id(self, text):
+        """District key for free-text input, or None
+
+        Tries the exact key/name/alias, then a unique-or-first prefix match in
+        sorted order, then any single word of the input that names a district.
+        """
+        if text in self.districts:
+            return text
+        if text in self._memo:
+            return self._memo[text]
+
+        words = normalize_words(text)
+        key = ''.join(words)
+        district_id = self.by_name.get(key)
+        if district_id is None and len(key) >= MIN_PREFIX:
+            position = bisect_left(self._prefix_keys, key)
+            if position < len(self._prefix_keys) and self._prefix_keys[position].startswith(key):
+                district_id = self._prefixes[position][1]
+        if district_id is None:
+            district_id = next((self.by_name[word] for word in words if word in self.by_name), None)
+
+        if len(self._memo) < MAX_MEMO_ENTRIES:
+            self._memo[text] = district_id
+        return district_id
+
+    def resolve(self, text):
+        """District info dict for free-text input, or None"""
+        district_id = self.resolve_id(text)
+        return self.districts[district_id] if district_id else None
+
+    def market_name(self, district_id, market_input):
+        """Display name of a market in the district, or None"""
+        return self.markets.get(district_id, {}).get(market_input)
+
+    def encode(self, commodity, district_name):
+        """Encoder code of the district for a commodity, or None if unknown"""
+        return self.codes.get(commodity, {}).get(district_name)
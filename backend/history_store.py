@@ -0,0 +1,283 @@
+"""Columnar, indexed store of historical mandi prices
+
+The store is a directory of append-only segments. Each segment holds one
+typed .npy file per column, sorted by (commodity, district, market, date),
+plus a series.json of row offsets. A manifest.json lists the segments, the
+global string dictionaries (so codes are stable across segments) and the
+per-source ingestion watermarks. `HistoryStore` memory-maps the columns and
+answers range queries with binary searches inside each matching series.
+
+Segments are written by ingest.py:
+
+    python ingest.py               # append rows added since the last run
+    python ingest.py --rebuild     # re-ingest every CSV from scratch
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import uuid
+from datetime import date, datetime
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+STORE_PATH = './data/store'
+MANIFEST = 'manifest.json'
+
+EPOCH = date(1970, 1, 1)
+
+# Column name -> dtype of the on-disk arrays
+COLUMNS = {
+    'commodity': np.int16,
+    'district': np.int16,
+    'market': np.int32,
+    'date': np.int32,
+    'market_id': np.int32,
+    'district_id': np.int32,
+    'p_min': np.float32,
+    'p_max': np.float32,
+    'p_modal': np.float32
+}
+PRICE_COLUMNS = ['p_min', 'p_max', 'p_modal']
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+_PARENTHETICAL = re.compile(r'\(.*?\)')
+
+
+def slug(name):
+    """'Mumbai- Fruit Market' -> 'mumbai_fruit_market'"""
+    return _NON_ALNUM.sub('_', str(name).lower()).strip('_')
+
+
+def base_slug(name):
+    """Market slug without its parenthetical qualifier: 'Pune(Moshi)' -> 'pune'"""
+    return slug(_PARENTHETICAL.sub(' ', str(name)))
+
+
+def to_days(day):
+    return (day - EPOCH).days
+
+
+def from_days(days):
+    return date.fromordinal(EPOCH.toordinal() + int(days))
+
+
+def empty_manifest():
+    return {
+        # Fresh for every new or rebuilt store, so caches keyed on segment
+        # names can tell a rebuilt seg-000001 from the old one
+        'store_id': uuid.uuid4().hex,
+        'commodities': [],
+        'districts': [],
+        'markets': [],
+        'segments': [],
+        'next_segment': 1,
+        'watermarks': {},
+        'rows': 0,
+        'updated_at': None
+    }
+
+
+def read_manifest(store_path=STORE_PATH):
+    path = os.path.join(store_path, MANIFEST)
+    if not os.path.exists(path):
+        return empty_manifest()
+    with open(path) as f:
+        return json.load(f)
+
+
+class StoreWriter:
+    """Appends sorted segments to a store and publishes them atomically
+
+    Segments are written first and only become visible once `commit()`
+    replaces manifest.json, so readers never see a partial ingest.
+
+    A rebuild starts from an empty manifest but keeps the live one (and its
+    segments) in place until `commit()` swaps the manifest; the replaced
+    segments are deleted afterwards. New segment names continue the live
+    numbering, so they never collide with the segments being replaced.
+    """
+
+    def __init__(self, store_path=STORE_PATH, rebuild=False):
+        self.store_path = store_path
+        os.makedirs(store_path, exist_ok=True)
+        self.manifest = read_manifest(store_path)
+        self._replaced = []
+        if rebuild:
+            self._replaced = self.manifest['segments']
+            next_segment = self.manifest['next_segment']
+            self.manifest = empty_manifest()
+            self.manifest['next_segment'] = next_segment
+        self._codes = {
+            kind: {name: code for code, name in enumerate(self.manifest[kind])}
+            for kind in ('commodities', 'districts', 'markets')
+        }
+
+    def code(self, kind, name):
+        """Stable integer code for a string, extending the dictionary if new"""
+        codes = self._codes[kind]
+        if name not in codes:
+            codes[name] = len(self.manifest[kind])
+            self.manifest[kind].append(name)
+        return codes[name]
+
+    def _next_segment(self):
+        number = self.manifest['next_segment']
+        self.manifest['next_segment'] = number + 1
+        return f"seg-{number:06d}"
+
+    def write_segment(self, columns):
+        """Sort one batch of encoded columns and write it as a new segment"""
+        rows = len(columns['date'])
+        if not rows:
+            return None
+        columns = {name: np.asarray(columns[name]).astype(dtype) for name, dtype in COLUMNS.items()}
+        order = np.lexsort((columns['date'], columns['market'], columns['district'], columns['commodity']))
+        columns = {name: values[order] for name, values in columns.items()}
+
+        # One entry per (commodity, district, market) run of rows
+        keys = np.stack([columns['commodity'], columns['district'], columns['market']], axis=1)
+        boundaries = np.flatnonzero(np.any(keys[1:] != keys[:-1], axis=1)) + 1
+        starts = np.concatenate([[0], boundaries])
+        ends = np.concatenate([boundaries, [rows]])
+        series = [[int(keys[s, 0]), int(keys[s, 1]), int(keys[s, 2]), int(s), int(e)] for s, e in zip(starts, ends)]
+
+        name = self._next_segment()
+        segment_path = os.path.join(self.store_path, name)
+        os.makedirs(segment_path, exist_ok=True)
+        for column, values in columns.items():
+            np.save(os.path.join(segment_path, f"{column}.npy"), values)
+        with open(os.path.join(segment_path, 'series.json'), 'w') as f:
+            json.dump(series, f)
+
+        self.manifest['segments'].append(name)
+        self.manifest['rows'] += rows
+        return name
+
+    def commit(self):
+        """Publish the manifest (dictionaries, segments, watermarks)"""
+        self.manifest['updated_at'] = datetime.now().isoformat(timespec='seconds')
+        tmp_path = os.path.join(self.store_path, MANIFEST + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_path, os.path.join(self.store_path, MANIFEST))
+
+        # Readers that opened the old manifest keep their memory maps
+        for segment in self._replaced:
+            shutil.rmtree(os.path.join(self.store_path, segment), ignore_errors=True)
+        self._replaced = []
+
+
+class HistoryStore:
+    """Read-only view over a store with memory-mapped columns"""
+
+    def __init__(self, store_path=STORE_PATH):
+        self.store_path = store_path
+        manifest = read_manifest(store_path)
+        self.commodities = manifest['commodities']
+        self.districts = manifest['districts']
+        self.markets = manifest['markets']
+        self.rows = manifest['rows']
+        self.updated_at = manifest['updated_at']
+        self.segments = []
+
+        # (commodity, district slug) -> {market slug: (market name, [(segment, start, end)])}
+        self.index = {}
+        self.base_names = {}
+        for segment_name in manifest['segments']:
+            segment_path = os.path.join(store_path, segment_name)
+            columns = {name: np.load(os.path.join(segment_path, f"{name}.npy"), mmap_mode='r') for name in COLUMNS}
+            segment = len(self.segments)
+            self.segments.append(columns)
+            with open(os.path.join(segment_path, 'series.json')) as f:
+                series = json.load(f)
+            for commodity, district, market, start, end in series:
+                key = (self.commodities[commodity], slug(self.districts[district]))
+                market_name = self.markets[market]
+                markets = self.index.setdefault(key, {})
+                if slug(market_name) not in markets:
+                    markets[slug(market_name)] = (market_name, [])
+                    self.base_names.setdefault(key, {}).setdefault(base_slug(market_name), []).append(slug(market_name))
+                markets[slug(market_name)][1].append((segment, start, end))
+
+    @property
+    def commodity_names(self):
+        return sorted({commodity for commodity, _ in self.index})
+
+    def district_slugs(self, commodity):
+        """Districts with history for a commodity"""
+        return sorted({district for c, district in self.index if c == commodity})
+
+    def market_series(self, commodity, district, market=None):
+        """[(market slug, market name, parts)] for one market or all of a district"""
+        markets = self.index.get((commodity, slug(district)), {})
+        if market is None:
+            return [(key, name, parts) for key, (name, parts) in sorted(markets.items())]
+
+        market = slug(market)
+        if market not in markets:
+            # Allow 'amrawati' for 'Amrawati (Frui & Veg. Market)' when unambiguous
+            candidates = self.base_names.get((commodity, slug(district)), {}).get(market, [])
+            if len(candidates) != 1:
+                return []
+            market = candidates[0]
+        name, parts = markets[market]
+        return [(market, name, parts)]
+
+    def recent(self, days):
+        """Every row in each commodity's last `days` days of history, in date order
+
+        Returns decoded columns (commodity, district_name, market_name, date,
+        p_modal), the same shape ingest passes to its on_chunk callback, so
+        streaming consumers can be warmed up from the store.
+        """
+        latest = np.full(len(self.commodities), np.iinfo(np.int32).min, dtype=np.int64)
+        for segment in self.segments:
+            np.maximum.at(latest, segment['commodity'], segment['date'])
+        parts = []
+        for segment in self.segments:
+            rows = np.flatnonzero(segment['date'] > latest[segment['commodity']] - days)
+            parts.append({name: np.asarray(segment[name][rows]) for name in ('commodity', 'district', 'market', 'date', 'p_modal')})
+        if not parts:
+            return {'commodity': [], 'district_name': [], 'market_name': [], 'date': [], 'p_modal': []}
+        columns = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+        order = np.argsort(columns['date'], kind='stable')
+        return {
+            'commodity': [self.commodities[code] for code in columns['commodity'][order]],
+            'district_name': [self.districts[code] for code in columns['district'][order]],
+            'market_name': [self.markets[code] for code in columns['market'][order]],
+            'date': columns['date'][order],
+            'p_modal': columns['p_modal'][order]
+        }
+
+    def _slice(self, segment, start, end, start_date, end_date):
+        columns = self.segments[segment]
+        dates = columns['date']
+        lo, hi = start, end
+        if start_date is not None:
+            lo = start + int(np.searchsorted(dates[start:end], to_days(start_date), side='left'))
+        if end_date is not None:
+            hi = start + int(np.searchsorted(dates[start:end], to_days(end_date), side='right'))
+        return {name: values[lo:hi] for name, values in columns.items()}
+
+    def query(self, commodity, district, market=None, start_date=None, end_date=None):
+        """Rows of each matching series with start_date <= date <= end_date
+
+        Returns a list of dicts with the market and its columns, sorted by
+        date. A series that lives in a single segment is returned as views
+        into the memory-mapped arrays.
+        """
+        results = []
+        for market_slug, market_name, parts in self.market_series(commodity, district, market):
+            slices = [self._slice(segment, start, end, start_date, end_date) for segment, start, end in parts]
+            if len(slices) == 1:
+                columns = slices[0]
+            else:
+                columns = {name: np.concatenate([part[name] for part in slices]) for name in COLUMNS}
+                order = np.argsort(columns['date'], kind='stable')
+                columns = {name: values[order] for name, values in columns.items()}
+            results.append({'market': market_slug, 'market_name': market_name, 'columns': columns})
+        return results
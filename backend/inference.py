@@ -0,0 +1,200 @@
+"""Compiled flat-array inference for the commodity price forests
+
+The notebooks save every commodity as a RandomForestRegressor behind a
+SimpleImputer + StandardScaler pipeline. CompiledForest flattens all trees
+into contiguous NumPy node arrays and folds the scaler into the split
+thresholds, so a prediction is a handful of array gathers instead of a
+preprocessor.transform plus 100 sklearn tree calls.
+"""
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Parity tolerance against sklearn, in rupees
+PARITY_TOLERANCE = 1e-6
+
+
+class CompiledForest:
+    """A RandomForestRegressor compiled into flat node arrays
+
+    Every tree is stored in the same arrays; leaves point at themselves so a
+    batch can be walked for exactly `max_depth` steps without branching.
+    Thresholds are expressed in raw (unscaled) feature space and a row goes
+    left when `x < threshold`.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, fill_values):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.fill_values = fill_values
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_features(self):
+        return len(self.fill_values)
+
+    @property
+    def node_count(self):
+        return len(self.feature)
+
+    @property
+    def nbytes(self):
+        arrays = (self.feature, self.threshold, self.left, self.right, self.value, self.roots, self.fill_values)
+        return sum(array.nbytes for array in arrays)
+
+    def _prepare(self, features):
+        X = np.asarray(features, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {X.shape[1]}")
+        missing = np.isnan(X)
+        if missing.any():
+            X = np.where(missing, self.fill_values, X)
+        return X
+
+    def predict_trees(self, features):
+        """Return the per-tree predictions, shape (n_rows, n_trees)"""
+        X = self._prepare(features)
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], self.n_trees))
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[node]] < self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return self.value[node]
+
+    def predict(self, features):
+        """Mean over trees, equivalent to preprocessor.transform + model.predict"""
+        return self.predict_trees(features).mean(axis=1)
+
+
+def _scaler_params(preprocessor, n_features):
+    """Extract (fill_values, mean, scale) from an imputer + scaler pipeline"""
+    steps = getattr(preprocessor, 'named_steps', None)
+    if steps is None:
+        raise ValueError(f"Unsupported preprocessor: {type(preprocessor).__name__}")
+
+    fill_values = np.full(n_features, np.nan)
+    mean = np.zeros(n_features)
+    scale = np.ones(n_features)
+    for name, step in steps.items():
+        kind = type(step).__name__
+        if kind == 'SimpleImputer':
+            fill_values = np.asarray(step.statistics_, dtype=np.float64)
+        elif kind == 'StandardScaler':
+            if step.with_mean:
+                mean = np.asarray(step.mean_, dtype=np.float64)
+            if step.with_std:
+                scale = np.asarray(step.scale_, dtype=np.float64)
+        else:
+            raise ValueError(f"Unsupported preprocessing step '{name}' ({kind})")
+
+    if len(fill_values) != n_features or np.isnan(fill_values).any():
+        raise ValueError("Imputer statistics do not cover every feature")
+    if (scale <= 0).any():
+        raise ValueError("Scaler has non-positive scale")
+    # The imputer runs before the scaler, so missing values go through the
+    # folded thresholds as their raw median.
+    return fill_values, mean, scale
+
+
+def _float32_boundary(threshold):
+    """Smallest float64 y for which float32(y) <= threshold no longer holds
+
+    sklearn casts the scaled features to float32 before walking the trees, so
+    the split `float32(y) <= t` flips at the midpoint between the largest
+    float32 not above t and its float32 successor.
+    """
+    below = threshold.astype(np.float32)
+    below = np.where(below.astype(np.float64) > threshold, np.nextafter(below, np.float32(-np.inf)), below)
+    above = np.nextafter(below, np.float32(np.inf))
+    return (below.astype(np.float64) + above.astype(np.float64)) / 2
+
+
+def compile_forest(model, preprocessor):
+    """Compile a fitted RandomForestRegressor and its preprocessor"""
+    estimators = getattr(model, 'estimators_', None)
+    if not estimators:
+        raise ValueError(f"Unsupported model: {type(model).__name__}")
+
+    n_features = model.n_features_in_
+    fill_values, mean, scale = _scaler_params(preprocessor, n_features)
+
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in estimators:
+        tree = estimator.tree_
+        if tree.n_outputs != 1:
+            raise ValueError("Only single-output trees are supported")
+
+        is_leaf = tree.children_left == -1
+        node_ids = np.arange(tree.node_count) + offset
+        feature = np.where(is_leaf, 0, tree.feature)
+        # Fold StandardScaler: (x - mean) / scale < b  <=>  x < b * scale + mean
+        boundary = _float32_boundary(tree.threshold)
+        threshold = np.where(is_leaf, np.inf, boundary * scale[feature] + mean[feature])
+
+        features.append(feature)
+        thresholds.append(threshold)
+        lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+        rights.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+        values.append(tree.value.reshape(tree.node_count))
+        roots.append(offset)
+
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+
+    return CompiledForest(
+        feature=np.concatenate(features).astype(np.intp),
+        threshold=np.concatenate(thresholds).astype(np.float64),
+        left=np.concatenate(lefts).astype(np.intp),
+        right=np.concatenate(rights).astype(np.intp),
+        value=np.concatenate(values).astype(np.float64),
+        roots=np.asarray(roots, dtype=np.intp),
+        max_depth=max_depth,
+        fill_values=fill_values
+    )
+
+
+def parity_sample(preprocessor, n_rows=512, seed=0):
+    """Draw integer-valued rows around the scaler's training distribution"""
+    steps = preprocessor.named_steps
+    scaler = next(step for step in steps.values() if type(step).__name__ == 'StandardScaler')
+    rng = np.random.default_rng(seed)
+    sample = scaler.mean_ + scaler.scale_ * rng.standard_normal((n_rows, len(scaler.mean_))) * 1.5
+    return np.round(sample)
+
+
+def check_parity(engine, model, preprocessor, sample=None, tolerance=PARITY_TOLERANCE):
+    """Compare the compiled engine with sklearn; returns the max abs difference"""
+    if sample is None:
+        sample = parity_sample(preprocessor)
+    expected = model.predict(preprocessor.transform(sample))
+    actual = engine.predict(sample)
+    max_diff = float(np.max(np.abs(expected - actual))) if len(sample) else 0.0
+    if max_diff > tolerance:
+        raise ValueError(f"Compiled forest differs from sklearn by {max_diff:.6g}")
+    return max_diff
+
+
+def compile_checked(model, preprocessor, sample=None):
+    """Compile a model and verify it against sklearn; returns None on failure"""
+    try:
+        engine = compile_forest(model, preprocessor)
+        max_diff = check_parity(engine, model, preprocessor, sample)
+    except Exception as e:
+        logger.warning(f"⚠️ Compiled inference disabled: {str(e)}")
+        return None
+    logger.info(f"⚡ Compiled {engine.n_trees} trees ({engine.node_count} nodes), parity diff {max_diff:.2e}")
+    return engine
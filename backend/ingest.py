@@ -0,0 +1,233 @@
+"""Chunked, incremental ingestion of mandi price CSVs into the history store
+
+Source files are read line by line from the byte offset recorded at the
+last run (the watermark), in chunks of CHUNK_ROWS rows, so memory stays
+flat however large Cotton.csv and the appended daily feeds grow. Each chunk
+is normalized with the notebook cleaning rules and written as its own
+sorted segment. Only complete lines are consumed; a partially written last
+line is picked up on the next run.
+
+    python ingest.py               # append rows added since the last run
+    python ingest.py --rebuild     # re-ingest every CSV from scratch
+    python ingest.py --compact     # merge all segments into one
+"""
+import argparse
+import csv
+import glob
+import logging
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from history_store import COLUMNS, EPOCH, STORE_PATH, HistoryStore, StoreWriter, read_manifest
+
+logger = logging.getLogger(__name__)
+
+DATA_DIRS = ['./data/foods_grains', './data/fruits']
+CHUNK_ROWS = 20000
+REQUIRED_COLUMNS = ['t', 'market_id', 'market_name', 'district_id', 'district_name', 'p_min', 'p_max', 'p_modal']
+
+# Cleaning rules from the training notebooks
+P_MODAL_BOUNDS = (500, 10000)
+P_RANGE_MAX = 10000
+P_MIN_FILL = 0.9
+P_MAX_FILL = 1.1
+
+_SPACES = re.compile(r'\s+')
+
+
+def clean_name(name):
+    """'Amrawati(Frui & Veg. Market)' -> 'Amrawati (Frui & Veg. Market)'"""
+    name = re.sub(r'\s*\(\s*', ' (', str(name))
+    name = re.sub(r'\s*\)', ')', name)
+    name = re.sub(r'\s*-\s*', ' - ', name)
+    return _SPACES.sub(' ', name).strip()
+
+
+def parse_dates(values):
+    """Parse a column mixing m/d/Y and d-m-Y dates into days since epoch (NaN if invalid)"""
+    values = values.astype(str).str.strip()
+    slashed = values.str.contains('/', regex=False)
+    parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    if slashed.any():
+        parsed[slashed] = pd.to_datetime(values[slashed], format='%m/%d/%Y', errors='coerce')
+    if (~slashed).any():
+        parsed[~slashed] = pd.to_datetime(values[~slashed], format='%d-%m-%Y', errors='coerce')
+    return (parsed - pd.Timestamp(EPOCH)).dt.days
+
+
+def read_header(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return next(csv.reader(f), [])
+
+
+def source_files(data_dirs=None):
+    """CSV files with the mandi price schema; commodity is the file stem"""
+    files = []
+    for data_dir in data_dirs or DATA_DIRS:
+        for path in sorted(glob.glob(os.path.join(data_dir, '*.csv'))):
+            header = read_header(path)
+            if all(column in header for column in REQUIRED_COLUMNS):
+                files.append((os.path.splitext(os.path.basename(path))[0].lower(), path))
+            else:
+                logger.info(f"⏭️ Skipping {path}: not a mandi price file")
+    return files
+
+
+def iter_line_chunks(path, offset=0, chunk_rows=CHUNK_ROWS):
+    """Yield (rows, end_offset) for complete CSV lines after `offset`
+
+    The header line is skipped when starting from the top of the file.
+    """
+    with open(path, 'rb') as f:
+        if offset == 0:
+            header_line = f.readline()
+            offset = len(header_line)
+        else:
+            f.seek(offset)
+        lines = []
+        for line in f:
+            if not line.endswith(b'\n'):
+                # Partially written last line; leave it for the next run
+                break
+            lines.append(line.decode('utf-8'))
+            offset += len(line)
+            if len(lines) >= chunk_rows:
+                yield list(csv.reader(lines)), offset
+                lines = []
+        if lines:
+            yield list(csv.reader(lines)), offset
+
+
+def clean_chunk(commodity, header, rows):
+    """Normalize raw CSV rows and apply the notebook cleaning rules"""
+    df = pd.DataFrame([row for row in rows if len(row) == len(header)], columns=header)
+    if df.empty:
+        return pd.DataFrame(columns=['commodity', 'district_name', 'market_name', 'date', 'market_id',
+                                     'district_id', 'p_min', 'p_max', 'p_modal'])
+    frame = pd.DataFrame({
+        'commodity': commodity,
+        'district_name': df['district_name'].astype(str).str.strip(),
+        'market_name': df['market_name'].map(clean_name),
+        'date': parse_dates(df['t']),
+        'market_id': pd.to_numeric(df['market_id'], errors='coerce').fillna(-1),
+        'district_id': pd.to_numeric(df['district_id'], errors='coerce').fillna(-1)
+    })
+    for column in ('p_min', 'p_max', 'p_modal'):
+        frame[column] = pd.to_numeric(df[column], errors='coerce')
+
+    frame['p_min'] = frame['p_min'].fillna(frame['p_modal'] * P_MIN_FILL)
+    frame['p_max'] = frame['p_max'].fillna(frame['p_modal'] * P_MAX_FILL)
+    keep = (
+        frame['date'].notna() &
+        (frame['p_modal'] > P_MODAL_BOUNDS[0]) & (frame['p_modal'] < P_MODAL_BOUNDS[1]) &
+        (frame['p_min'] > 0) & (frame['p_min'] < P_RANGE_MAX) &
+        (frame['p_max'] > 0) & (frame['p_max'] < P_RANGE_MAX)
+    )
+    return frame[keep].reset_index(drop=True)
+
+
+def encode_chunk(writer, frame):
+    """Map a cleaned chunk onto the store's columns and dictionary codes"""
+    return {
+        'commodity': frame['commodity'].map(lambda name: writer.code('commodities', name)).to_numpy(),
+        'district': frame['district_name'].map(lambda name: writer.code('districts', name)).to_numpy(),
+        'market': frame['market_name'].map(lambda name: writer.code('markets', name)).to_numpy(),
+        'date': frame['date'].to_numpy(),
+        'market_id': frame['market_id'].to_numpy(),
+        'district_id': frame['district_id'].to_numpy(),
+        'p_min': frame['p_min'].to_numpy(),
+        'p_max': frame['p_max'].to_numpy(),
+        'p_modal': frame['p_modal'].to_numpy()
+    }
+
+
+def needs_rebuild(store_path, sources):
+    """True when a source was truncated or rewritten since its watermark"""
+    watermarks = read_manifest(store_path)['watermarks']
+    for _, path in sources:
+        watermark = watermarks.get(path)
+        if watermark and (not os.path.exists(path) or
+                          os.path.getsize(path) < watermark['offset'] or
+                          read_header(path) != watermark['header']):
+            logger.warning(f"⚠️ {path} changed before its watermark; rebuilding the store")
+            return True
+    return False
+
+
+def ingest(store_path=STORE_PATH, data_dirs=None, rebuild=False, chunk_rows=CHUNK_ROWS, on_chunk=None):
+    """Append rows added to the source CSVs since the last run
+
+    `on_chunk(frame)` is called with every cleaned chunk, so downstream
+    aggregates can update incrementally from the same pass.
+    """
+    start = time.perf_counter()
+    sources = source_files(data_dirs)
+    rebuild = rebuild or needs_rebuild(store_path, sources)
+    writer = StoreWriter(store_path, rebuild=rebuild)
+    stats = {'sources': len(sources), 'rows_read': 0, 'rows_kept': 0, 'segments': 0, 'rebuild': rebuild}
+
+    for commodity, path in sources:
+        header = read_header(path)
+        watermark = writer.manifest['watermarks'].get(path, {'offset': 0, 'rows': 0, 'header': header})
+        for rows, offset in iter_line_chunks(path, watermark['offset'], chunk_rows):
+            frame = clean_chunk(commodity, header, rows)
+            if writer.write_segment(encode_chunk(writer, frame)):
+                stats['segments'] += 1
+            if on_chunk is not None and len(frame):
+                on_chunk(frame)
+            stats['rows_read'] += len(rows)
+            stats['rows_kept'] += len(frame)
+            watermark = {'offset': offset, 'rows': watermark['rows'] + len(rows), 'header': header}
+        writer.manifest['watermarks'][path] = watermark
+
+    writer.commit()
+    stats['seconds'] = round(time.perf_counter() - start, 3)
+    logger.info(f"📥 Ingested {stats['rows_kept']}/{stats['rows_read']} rows into {stats['segments']} segments in {stats['seconds']}s")
+    return stats
+
+
+def compact(store_path=STORE_PATH):
+    """Merge every segment into one sorted segment
+
+    Unlike ingestion this holds the whole store in memory; run it as
+    occasional maintenance once many small daily segments have piled up.
+    """
+    store = HistoryStore(store_path)
+    manifest = read_manifest(store_path)
+    if len(store.segments) <= 1:
+        return manifest
+
+    columns = {name: np.concatenate([segment[name] for segment in store.segments]) for name in COLUMNS}
+    writer = StoreWriter(store_path)
+    old_segments = writer.manifest['segments']
+    writer.manifest['segments'] = []
+    writer.manifest['rows'] = 0
+    name = writer.write_segment(columns)
+    writer.commit()
+
+    del store
+    for segment in old_segments:
+        segment_path = os.path.join(store_path, segment)
+        for file_name in os.listdir(segment_path):
+            os.remove(os.path.join(segment_path, file_name))
+        os.rmdir(segment_path)
+    logger.info(f"🧹 Compacted {len(old_segments)} segments into {name}")
+    return writer.manifest
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--store', default=STORE_PATH)
+    parser.add_argument('--rebuild', action='store_true', help='re-ingest every source from scratch')
+    parser.add_argument('--compact', action='store_true', help='merge all segments into one')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+    if args.compact:
+        compact(args.store)
+    else:
+        ingest(args.store, rebuild=args.rebuild, chunk_rows=args.chunk_rows)
@@ -0,0 +1,100 @@
+"""Prediction intervals from the forest's per-tree outputs
+
+A RandomForestRegressor's price is the mean of its trees' predictions.
+Instead of computing only that mean, the per-tree matrix (rows x trees)
+coming out of the same tree walk is reduced to a compact summary per row:
+
+    [mean, std, q_1, ..., q_k]
+
+Here q are the configured quantiles of the tree predictions. The lower and
+upper band are the outermost quantiles, widened to include the mean when
+the trees are skewed. The summary is what the prediction
+cache and price table store, so cached answers carry their interval too.
+
+The confidence grade comes from the band width relative to the price. The
+tree spread measures how much the trees disagree, not a calibrated error
+bar, so the grade is a relative signal for buyers, not a guarantee.
+"""
+import numpy as np
+
+DEFAULT_QUANTILES = (0.1, 0.9)
+# Band width relative to the price at or below which a prediction gets each grade; anything wider is 'low'
+CONFIDENCE_GRADES = ((0.10, 'high'), (0.25, 'medium'))
+
+
+def parse_quantiles(value):
+    """'0.1,0.5,0.9' -> (0.1, 0.5, 0.9); None or '' -> DEFAULT_QUANTILES"""
+    if not value:
+        return DEFAULT_QUANTILES
+    quantiles = tuple(sorted({float(part) for part in value.split(',') if part.strip()}))
+    if not quantiles or not all(0 < q < 1 for q in quantiles):
+        raise ValueError(f"Quantiles must be between 0 and 1 exclusive, got {value!r}")
+    return quantiles
+
+
+def quantile_label(q):
+    """0.1 -> 'p10', 0.025 -> 'p2.5'"""
+    return f"p{q * 100:g}"
+
+
+def tree_predictions(model, X):
+    """Per-tree predictions of a fitted sklearn forest, shape (n_rows, n_trees)
+
+    Models without `estimators_` give a single column, which has no spread.
+    """
+    estimators = getattr(model, 'estimators_', None)
+    if estimators is None:
+        return np.asarray(model.predict(X), dtype=np.float64).reshape(-1, 1)
+    return np.stack([tree.predict(X) for tree in estimators], axis=1)
+
+
+def confidence_grade(relative_width):
+    for limit, grade in CONFIDENCE_GRADES:
+        if relative_width <= limit:
+            return grade
+    return 'low'
+
+
+class PriceIntervals:
+    """Summarizes per-tree predictions into price, spread and quantile bands"""
+
+    def __init__(self, quantiles=DEFAULT_QUANTILES):
+        self.quantiles = tuple(quantiles)
+        self.labels = [quantile_label(q) for q in self.quantiles]
+
+    @property
+    def width(self):
+        return 2 + len(self.quantiles)
+
+    def summarize(self, per_tree):
+        """(n_rows, n_trees) tree predictions -> (n_rows, width) summaries, non-negative and rounded"""
+        per_tree = np.asarray(per_tree, dtype=np.float64)
+        summary = np.empty((per_tree.shape[0], self.width))
+        summary[:, 0] = np.maximum(per_tree.mean(axis=1), 0)
+        summary[:, 1] = per_tree.std(axis=1) if per_tree.shape[1] > 1 else np.nan
+        summary[:, 2:] = np.maximum(np.quantile(per_tree, self.quantiles, axis=1).T, 0)
+        return np.round(summary, 2)
+
+    def describe(self, summary):
+        """(price, interval) for one summary row; interval is None without a spread"""
+        price = float(summary[0])
+        spread = float(summary[1])
+        if np.isnan(spread):
+            return price, None
+        bands = [float(value) for value in summary[2:]]
+        # With skewed trees the mean can sit outside the outer quantiles; the
+        # interval always contains the price it describes
+        lower, upper = min(bands[0], price), max(bands[-1], price)
+        relative_width = (upper - lower) / price if price else float('inf')
+        return price, {
+            "lower": lower,
+            "upper": upper,
+            "quantiles": dict(zip(self.labels, bands)),
+            "spread": spread,
+            "relative_width": round(relative_width, 4) if price else None,
+            "confidence": confidence_grade(relative_width)
+        }
+
+    def stats(self):
+        return {'quantiles': list(self.quantiles),
+                'confidence_grades': {grade: limit for limit, grade in CONFIDENCE_GRADES}}
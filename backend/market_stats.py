@@ -0,0 +1,175 @@
+"""Incrementally maintained rolling price aggregates per commodity/district
+
+Every series keeps a ring of WINDOW_DAYS daily buckets (report count, sum
+and sum of squares of the modal price) in shared NumPy arrays. Adding a
+record touches one bucket, and statistics for the 7- and 30-day windows are
+read from the buckets, so neither side ever looks at raw history.
+
+Windows end at each commodity's latest report rather than the calendar
+date, since commodities stop reporting at different times. Changes and
+volatility are per-series ratios, weighted by arrivals when combined.
+"""
+import threading
+
+import numpy as np
+
+# Two back-to-back 30-day windows, so 30-day change can be computed
+WINDOW_DAYS = 60
+
+
+class RollingAggregates:
+    """Daily-bucket ring buffers keyed by (commodity, district)"""
+
+    def __init__(self, capacity=64):
+        self.slots = {}
+        self.keys = []
+        self.latest = {}
+        self.late_records = 0
+        self._lock = threading.Lock()
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        bucket_day = np.full((capacity, WINDOW_DAYS), -1, dtype=np.int32)
+        count = np.zeros((capacity, WINDOW_DAYS), dtype=np.int32)
+        total = np.zeros((capacity, WINDOW_DAYS), dtype=np.float64)
+        total_sq = np.zeros((capacity, WINDOW_DAYS), dtype=np.float64)
+        used = len(self.keys)
+        if used:
+            bucket_day[:used] = self.bucket_day[:used]
+            count[:used] = self.count[:used]
+            total[:used] = self.total[:used]
+            total_sq[:used] = self.total_sq[:used]
+        self.bucket_day, self.count, self.total, self.total_sq = bucket_day, count, total, total_sq
+
+    def _slot(self, key):
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = len(self.keys)
+            if slot == len(self.bucket_day):
+                self._allocate(2 * slot)
+            self.slots[key] = slot
+            self.keys.append(key)
+        return slot
+
+    def add(self, commodity, district, day, price):
+        """Add one record (day = days since epoch); O(1)"""
+        with self._lock:
+            self._add(commodity, self._slot((commodity, district)), int(day), float(price))
+
+    def _add(self, commodity, slot, day, price):
+        latest = self.latest.get(commodity)
+        if latest is None or day > latest:
+            self.latest[commodity] = latest = day
+        if day <= latest - WINDOW_DAYS:
+            self.late_records += 1
+            return
+        bucket = day % WINDOW_DAYS
+        if self.bucket_day[slot, bucket] != day:
+            if self.bucket_day[slot, bucket] > day:
+                self.late_records += 1
+                return
+            # Bucket still holds a day that has left the window; recycle it
+            self.bucket_day[slot, bucket] = day
+            self.count[slot, bucket] = 0
+            self.total[slot, bucket] = 0.0
+            self.total_sq[slot, bucket] = 0.0
+        self.count[slot, bucket] += 1
+        self.total[slot, bucket] += price
+        self.total_sq[slot, bucket] += price * price
+
+    def update_frame(self, frame):
+        """Feed a cleaned ingest chunk or HistoryStore.recent() (columns commodity, district_name, date, p_modal)"""
+        with self._lock:
+            for commodity, district, day, price in zip(frame['commodity'], frame['district_name'],
+                                                       frame['date'], frame['p_modal']):
+                self._add(commodity, self._slot((commodity, str(district).lower())), int(day), float(price))
+
+    def _window(self, slots, days_ago, length):
+        """(count, sum, sum of squares) per slot for `length` days ending `days_ago` days before its latest report"""
+        hi = np.array([self.latest[self.keys[slot][0]] for slot in slots])[:, None] - days_ago
+        lo = hi - length + 1
+        days = self.bucket_day[slots]
+        mask = (days >= lo) & (days <= hi)
+        return ((self.count[slots] * mask).sum(axis=1),
+                (self.total[slots] * mask).sum(axis=1),
+                (self.total_sq[slots] * mask).sum(axis=1))
+
+    def _slots_for(self, commodity=None, district=None):
+        return np.array([slot for (c, d), slot in self.slots.items()
+                         if (commodity is None or c == commodity) and (district is None or d == district)],
+                        dtype=np.intp)
+
+    def series_stats(self, commodity=None, district=None):
+        """Window statistics for matching series
+
+        Change and volatility are computed per (commodity, district) series
+        and combined with an arrivals-weighted mean, so series at very
+        different price levels don't distort each other and a shift in the
+        commodity mix doesn't read as a price move. Rupee means are only
+        reported when every matching series is the same commodity.
+        """
+        with self._lock:
+            slots = self._slots_for(commodity, district)
+            if not len(slots):
+                return None
+            commodities = {self.keys[slot][0] for slot in slots}
+            as_of = max(self.latest[self.keys[slot][0]] for slot in slots)
+            n7, s7, _ = self._window(slots, 0, 7)
+            p7, ps7, _ = self._window(slots, 7, 7)
+            n30, s30, sq30 = self._window(slots, 0, 30)
+            p30, ps30, _ = self._window(slots, 30, 30)
+
+        def per_series(total, count):
+            return np.divide(total, count, out=np.zeros_like(total), where=count > 0)
+
+        def weighted(values, weights, valid):
+            """Arrivals-weighted mean over the valid series, as a rounded percentage"""
+            if not valid.any():
+                return None
+            return round(float(np.average(values[valid], weights=weights[valid])) * 100, 2)
+
+        mean_7, prev_7 = per_series(s7, n7), per_series(ps7, p7)
+        mean_30, prev_30 = per_series(s30, n30), per_series(ps30, p30)
+        comparable = (n7 > 0) & (p7 > 0)
+        comparable_30 = (n30 > 0) & (p30 > 0)
+        variance = np.maximum(per_series(sq30, n30) - mean_30 ** 2, 0.0)
+        volatile = (n30 > 1) & (mean_30 > 0)
+
+        # Series-level ratios; entries outside the masks are never read
+        with np.errstate(divide='ignore', invalid='ignore'):
+            change_7 = mean_7 / prev_7 - 1
+            change_30 = mean_30 / prev_30 - 1
+            cv_30 = np.sqrt(variance) / mean_30
+
+        single_commodity = len(commodities) == 1
+        return {
+            'as_of_day': int(as_of),
+            'series': int(len(slots)),
+            'commodities': len(commodities),
+            'active_series_7d': int((n7 > 0).sum()),
+            # 7-day momentum: share of series whose last week beat the week before
+            'rising_series_7d': int(((mean_7 > prev_7) & comparable).sum()),
+            'comparable_series_7d': int(comparable.sum()),
+            'arrivals_7d': int(n7.sum()),
+            'arrivals_30d': int(n30.sum()),
+            'mean_modal_7d': round(float(s7.sum() / n7.sum()), 2) if single_commodity and n7.sum() else None,
+            'mean_modal_30d': round(float(s30.sum() / n30.sum()), 2) if single_commodity and n30.sum() else None,
+            'change_7d_pct': weighted(change_7, n7, comparable),
+            'change_30d_pct': weighted(change_30, n30, comparable_30),
+            'volatility_30d_pct': weighted(cv_30, n30, volatile)
+        }
+
+    def clear(self):
+        with self._lock:
+            self.slots, self.keys = {}, []
+            self.latest = {}
+            self.late_records = 0
+            self._allocate(len(self.bucket_day))
+
+    def stats(self):
+        return {
+            'series': len(self.keys),
+            'latest_day': dict(self.latest),
+            'late_records': self.late_records,
+            'bytes': int(self.bucket_day.nbytes + self.count.nbytes + self.total.nbytes + self.total_sq.nbytes)
+        }
@@ -0,0 +1,171 @@
+"""Low-overhead counters, gauges and histograms in Prometheus text format
+
+A small in-process implementation so the API needs no extra dependency.
+Recording a value is a dict lookup, a bisect and an increment under a
+lock. `MetricsRegistry.render()` produces the text exposition format
+(version 0.0.4) that Prometheus scrapes from /api/metrics.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+# Seconds; spans sub-millisecond cache hits to multi-second cold model loads
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def process_memory():
+    """Resident set split into private (anon) and file-backed pages, from /proc (Linux only)"""
+    fields = {'VmRSS': 'rss_bytes', 'RssAnon': 'rss_anon_bytes', 'RssFile': 'rss_file_bytes', 'RssShmem': 'rss_shmem_bytes'}
+    try:
+        with open('/proc/self/status') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return {}
+    memory = {}
+    for line in lines:
+        name, _, value = line.partition(':')
+        if name in fields:
+            memory[fields[name]] = int(value.split()[0]) * 1024
+    return memory
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=(), collect=None):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        # Optional callable returning {label value tuple: value}, read at scrape time
+        self.collect = collect
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self):
+        if self.collect is not None:
+            items = sorted((tuple(str(part) for part in key), value) for key, value in self.collect().items())
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+                                for key, value in items]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, **labels):
+        """Context manager observing the elapsed seconds of its block"""
+        return _Timer(self, labels)
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, (list(series[0]), series[1], series[2])) for key, series in self._values.items())
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics rendered together in registration order"""
+
+    def __init__(self, prefix=''):
+        self.prefix = prefix
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labels=(), collect=None):
+        return self._add(Counter(self.prefix + name, documentation, labels, collect))
+
+    def gauge(self, name, documentation, labels=(), collect=None):
+        return self._add(Gauge(self.prefix + name, documentation, labels, collect))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(self.prefix + name, documentation, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
@@ -1,27 +1,25 @@
 import requests
 import json
 
-url = "http://127.0.0.1:5000/predict"
+# Quick manual check against a running server; see ../benchmark.py for load tests
+url = "http://127.0.0.1:5000/api/predict"
 
 # Test with different values
 test_cases = [
     {
-        "p_min": 1800,
-        "p_max": 2500, 
-        "Month": 7,
-        "district_encoded": 42
+        "commodity": "rice",
+        "district": "bhandara",
+        "market": "tumsar"
     },
     {
-        "p_min": 2000,
-        "p_max": 2800,
-        "Month": 8,
-        "district_encoded": 42
+        "commodity": "rice",
+        "district": "bhandara",
+        "market": "bhandara"
     },
     {
-        "p_min": 1500,
-        "p_max": 2200,
-        "Month": 6,
-        "district_encoded": 45
+        "commodity": "rice",
+        "district": "atlantis",
+        "market": "tumsar"
     }
 ]
 
@@ -30,7 +28,8 @@ for i, data in enumerate(test_cases):
         response = requests.post(url, json=data)
         print(f"Test Case {i+1}:")
         print(f"  Input: {data}")
-        print(f"  Prediction: {response.json()['Predicted_p_modal']}")
+        print(f"  Status: {response.status_code}")
+        print(f"  Response: {json.dumps(response.json(), ensure_ascii=False)}")
         print()
     except Exception as e:
-        print(f"Error in test case {i+1}: {e}")
\ No newline at end of file
+        print(f"Error in test case {i+1}: {e}")
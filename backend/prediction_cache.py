@@ -0,0 +1,91 @@
+"""Same-day prediction cache
+
+A prediction depends only on the commodity model, the district/market and
+the calendar date, so identical requests on the same day can reuse the
+first result. Entries live in a bounded LRU that is emptied when the date
+rolls over or the model registry reloads.
+"""
+import threading
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """Bounded LRU of predictions keyed by (commodity, district, market, date)"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._day = None
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so results computed against an
+        # older model generation are never stored
+        self.generation = 0
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'rollovers': 0, 'invalidations': 0}
+
+    def _roll(self, day):
+        """Drop entries from an earlier date; caller holds the lock
+
+        Returns False when `day` itself is older than the cached date, e.g.
+        a request that started just before midnight.
+        """
+        if self._day is not None and day < self._day:
+            return False
+        if day != self._day:
+            if self._day is not None:
+                self.counters['rollovers'] += 1
+            self._entries.clear()
+            self._day = day
+        return True
+
+    def get(self, commodity, district, market, day):
+        """Return the cached value, or None on a miss"""
+        if not self.max_entries:
+            return None
+        key = (commodity, district, market)
+        with self._lock:
+            value = self._entries.get(key) if self._roll(day) else None
+            if value is None:
+                self.counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters['hits'] += 1
+            return value
+
+    def put(self, commodity, district, market, day, value, generation=None):
+        """Store a value; pass the `generation` read before computing it"""
+        if not self.max_entries:
+            return
+        key = (commodity, district, market)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if not self._roll(day):
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def invalidate(self, commodity=None):
+        """Forget cached predictions for one commodity, or for all of them"""
+        with self._lock:
+            if commodity is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == commodity]:
+                    del self._entries[key]
+            self.generation += 1
+            self.counters['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters['hits'] + self.counters['misses']
+            return {
+                **self.counters,
+                'hit_rate': round(self.counters['hits'] / lookups, 4) if lookups else 0.0,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'generation': self.generation,
+                'date': self._day.isoformat() if self._day else None
+            }
@@ -0,0 +1,165 @@
+"""Background-materialized table of daily price predictions
+
+The prediction space is small and fixed: every commodity, the districts its
+encoder knows and their markets, for a handful of days. A background thread
+computes it in one vectorized pass per commodity and swaps in a new
+immutable snapshot, so lookups are a dict access plus an array index.
+"""
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class PriceSnapshot:
+    """Immutable predictions for `days` consecutive dates from `start`"""
+
+    def __init__(self, start, days, index, prices, version, commodities=()):
+        self.start = start
+        self.days = days
+        self.index = index
+        self.prices = prices
+        self.version = version
+        self.commodities = frozenset(commodities)
+        self.built_at = time.time()
+
+    def lookup(self, commodity, district, market, day):
+        offset = (day - self.start).days
+        if offset < 0 or offset >= self.days:
+            return None
+        row = self.index.get((commodity, district, market))
+        if row is None:
+            return None
+        value = self.prices[row, offset]
+        if np.ndim(value):
+            return tuple(round(float(part), 2) for part in value)
+        return round(float(value), 2)
+
+
+class DailyPriceTable:
+    """Keeps a PriceSnapshot for today and the next `days - 1` days
+
+    `compute(commodity, dates)` must return `(index, prices)` where `index`
+    maps (district, market) to a row of the `prices` matrix, which has one
+    column per date. Markets of the same district may share a row. A
+    trailing axis (e.g. price plus interval bands) is returned from lookups
+    as a tuple.
+
+    `commodities` may be a callable returning the current list, e.g. the
+    models that are already loaded. The table is rebuilt when that list
+    gains a commodity the snapshot lacks.
+    """
+
+    def __init__(self, commodities, compute, days=7, version=lambda: 0, refresh_interval=60):
+        self.commodities = commodities
+        self.compute = compute
+        self.days = days
+        self.version = version
+        self.refresh_interval = refresh_interval
+
+        self.snapshot = None
+        self._wake = threading.Event()
+        self._start_lock = threading.Lock()
+        # Counters are bumped from request threads and the refresh thread
+        self._counter_lock = threading.Lock()
+        self._thread = None
+        self.counters = {'hits': 0, 'misses': 0, 'refreshes': 0, 'refresh_errors': 0, 'last_refresh_seconds': 0.0}
+
+    def lookup(self, commodity, district, market, day):
+        """O(1) lookup; None when the table has no value for that day"""
+        snapshot = self.snapshot
+        price = None
+        # A snapshot built from models that have since been reloaded is never served
+        if snapshot is not None and snapshot.version == self.version():
+            price = snapshot.lookup(commodity, district, market, day)
+        self._count('hits' if price is not None else 'misses')
+        return price
+
+    def _commodities(self):
+        return list(self.commodities() if callable(self.commodities) else self.commodities)
+
+    def refresh(self, today=None):
+        """Rebuild the whole table and swap it in atomically"""
+        today = today or date.today()
+        version = self.version()
+        commodities = self._commodities()
+        dates = [today + timedelta(days=offset) for offset in range(self.days)]
+        start = time.perf_counter()
+
+        index = {}
+        blocks = []
+        rows = 0
+        for commodity in commodities:
+            try:
+                commodity_index, prices = self.compute(commodity, dates)
+            except Exception as e:
+                self._count('refresh_errors')
+                logger.error(f"❌ Price table refresh failed for {commodity}: {str(e)}")
+                continue
+            for (district, market), row in commodity_index.items():
+                index[(commodity, district, market)] = rows + row
+            prices = np.asarray(prices, dtype=np.float64)
+            blocks.append(prices.reshape(-1, self.days, *prices.shape[2:]))
+            rows += blocks[-1].shape[0]
+
+        prices = np.concatenate(blocks) if blocks else np.empty((0, self.days), dtype=np.float64)
+        self.snapshot = PriceSnapshot(today, self.days, index, prices, version, commodities)
+
+        elapsed = time.perf_counter() - start
+        with self._counter_lock:
+            self.counters['refreshes'] += 1
+            self.counters['last_refresh_seconds'] = round(elapsed, 3)
+        logger.info(f"📅 Price table refreshed: {len(index)} series x {self.days} days in {elapsed:.2f}s")
+        return self.snapshot
+
+    def invalidate(self):
+        """Ask the background thread to rebuild now, e.g. after a model reload"""
+        self._wake.set()
+
+    def is_stale(self, today=None):
+        snapshot = self.snapshot
+        return (snapshot is None or
+                snapshot.start != (today or date.today()) or
+                snapshot.version != self.version() or
+                not snapshot.commodities.issuperset(self._commodities()))
+
+    def _run(self):
+        while True:
+            if self.is_stale():
+                try:
+                    self.refresh()
+                except Exception as e:
+                    self._count('refresh_errors')
+                    logger.error(f"❌ Price table refresh failed: {str(e)}")
+            self._wake.wait(self.refresh_interval)
+            self._wake.clear()
+
+    def start(self):
+        """Start the background refresher once; safe to call on every request"""
+        if self._thread is not None or not self.days:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='price-table', daemon=True)
+                self._thread.start()
+
+    def _count(self, name):
+        with self._counter_lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        snapshot = self.snapshot
+        with self._counter_lock:
+            counters = dict(self.counters)
+        return {
+            **counters,
+            'days': self.days,
+            'series': len(snapshot.index) if snapshot else 0,
+            'start_date': snapshot.start.isoformat() if snapshot else None,
+            'built_at': datetime.fromtimestamp(snapshot.built_at).isoformat(timespec='seconds') if snapshot else None
+        }
+
@@ -0,0 +1,333 @@
+"""Seasonal profitability index behind /api/crop-suggestions
+
+Built offline, per commodity x district x season, from the history store
+and the trained models. District '*' holds the statewide row. Each row has:
+
+    level        mean modal price in that season over the last LOOKBACK_YEARS
+    baseline     mean modal price over all seasons in the same years
+    trend        year-over-year change of the seasonal mean (fraction per year)
+    volatility   coefficient of variation of the season's prices
+    forecast     mean model prediction for the next occurrence of the season
+    expected     level carried forward a year by the trend, averaged with the
+                 forecast when the commodity has a model
+    score        expected / baseline - 1 - RISK_AVERSION * volatility
+    confidence   60-97, from the score's rank among the season's rows
+
+There is no cost data, so "profitable" means selling that season is
+expected to beat the crop's usual price by the widest risk-adjusted
+margin. That keeps crops with very different price levels comparable.
+
+The index is saved as one .npz of flat columns. Serving a request costs a
+dict lookup for the (district, season) rows and a sort of a few entries.
+
+    python profitability.py                  # after ingest.py / train.py
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from bundle import BUNDLES_PATH
+from catalog import COMMODITY_CONFIG, COMMODITY_FILES, DISTRICT_ALIASES, DISTRICT_TO_MARKETS, build_feature_grid
+from district_index import DistrictIndex
+from history_store import STORE_PATH, HistoryStore, slug
+
+logger = logging.getLogger(__name__)
+
+INDEX_PATH = './data/profitability_index.npz'
+INDEX_FORMAT = 1
+
+SEASONS = {
+    'kharif': (6, 7, 8, 9, 10),
+    'rabi': (11, 12, 1, 2, 3),
+    'zaid': (4, 5)
+}
+SEASON_NAMES = list(SEASONS)
+# Month number -> season code (index 0 unused)
+MONTH_SEASON = np.array([0] + [next(code for code, months in enumerate(SEASONS.values()) if month in months)
+                               for month in range(1, 13)], dtype=np.int8)
+
+STATEWIDE = '*'
+LOOKBACK_YEARS = 3
+# Years of seasonal means the trend is fitted on
+TREND_YEARS = 6
+MIN_OBSERVATIONS = 20
+RISK_AVERSION = 0.5
+# Score bonus for a crop that suits the requested soil type
+SOIL_BONUS = 0.05
+
+FLOAT_COLUMNS = ('level', 'baseline', 'trend', 'volatility', 'forecast', 'expected', 'score')
+
+
+def season_year(years, months):
+    """Rabi spans New Year; January-March belong to the season that started the previous November"""
+    return np.where(months <= 3, years - 1, years)
+
+
+def next_season_dates(season, today):
+    """Every date of the current or next occurrence of a season, from `today` on"""
+    months = SEASONS[season]
+    day = today
+    while day.month not in months:
+        day += timedelta(days=1)
+    dates = []
+    while day.month in months:
+        dates.append(day)
+        day += timedelta(days=1)
+    return dates
+
+
+def season_stats(days, prices, season_code, lookback_start):
+    """Level, trend, volatility and observations for one series in one season, or None"""
+    dates = days.astype('datetime64[D]')
+    years = dates.astype('datetime64[Y]').astype(np.int64) + 1970
+    months = dates.astype('datetime64[M]').astype(np.int64) % 12 + 1
+    in_season = MONTH_SEASON[months] == season_code
+    recent = in_season & (days >= lookback_start)
+    if recent.sum() < MIN_OBSERVATIONS:
+        return None
+
+    seasons = season_year(years[in_season], months[in_season])
+    season_prices = prices[in_season]
+    keys = np.unique(seasons)[-TREND_YEARS:]
+    means = np.array([season_prices[seasons == key].mean() for key in keys])
+    trend = float(np.polyfit(keys, means, 1)[0] / means.mean()) if len(keys) > 1 else 0.0
+
+    recent_prices = prices[recent]
+    recent_years = np.unique(season_year(years[recent], months[recent]))
+    level = float(np.mean([season_prices[seasons == key].mean() for key in recent_years]))
+    return {
+        'level': level,
+        'trend': float(np.clip(trend, -0.5, 0.5)),
+        'volatility': float(recent_prices.std() / recent_prices.mean()) if recent_prices.mean() else 0.0,
+        'observations': int(recent.sum()),
+        'years': int(len(recent_years))
+    }
+
+
+def commodity_prices(store, commodity):
+    """(district code, date, modal price) arrays for every row of a commodity, or None without rows"""
+    if commodity not in store.commodities:
+        return None
+    code = store.commodities.index(commodity)
+    parts = []
+    for segment in store.segments:
+        rows = np.flatnonzero(segment['commodity'] == code)
+        parts.append((np.asarray(segment['district'][rows]), np.asarray(segment['date'][rows]),
+                      np.asarray(segment['p_modal'][rows], dtype=np.float64)))
+    if not parts:
+        return None
+    districts, days, prices = (np.concatenate(column) for column in zip(*parts))
+    valid = prices > 0
+    return districts[valid], days[valid].astype(np.int64), prices[valid]
+
+
+def predict_grid(model_data, features):
+    if model_data.get('engine') is not None:
+        return model_data['engine'].predict(features)
+    return model_data['model'].predict(model_data['preprocessor'].transform(features))
+
+
+def model_forecasts(commodity, registry, district_index, today):
+    """{(district key, season): mean predicted price over the season's next occurrence}"""
+    if commodity not in registry:
+        return {}
+    model_data = registry[commodity]
+    forecasts = {}
+    for district in district_index.commodity_districts.get(commodity, []):
+        district_info = DISTRICT_TO_MARKETS.get(district['id'])
+        district_encoded = district_index.encode(commodity, district_info['district_name']) if district_info else None
+        if district_encoded is None:
+            continue
+        for season in SEASONS:
+            dates = next_season_dates(season, today)
+            features = build_feature_grid(commodity, district_info, district_encoded, dates)
+            forecasts[(district['id'], season)] = float(np.maximum(predict_grid(model_data, features), 0).mean())
+    return forecasts
+
+
+def build_index(store, registry, today=None):
+    """Index rows for every commodity in the store, as a dict of columns"""
+    today = today or date.today()
+    district_index = DistrictIndex(DISTRICT_TO_MARKETS, DISTRICT_ALIASES, registry.districts, registry.encoders)
+    rows = []
+    for commodity in store.commodity_names:
+        if commodity not in COMMODITY_CONFIG:
+            continue
+        series = commodity_prices(store, commodity)
+        if series is None or not len(series[1]):
+            continue
+        district_codes, days, prices = series
+        lookback_start = int(days.max()) - 365 * LOOKBACK_YEARS
+        forecasts = model_forecasts(commodity, registry, district_index, today)
+
+        # Key districts by their catalog id when the raw name resolves to one
+        keys = {}
+        for code in np.unique(district_codes):
+            name = store.districts[code]
+            keys.setdefault(district_index.resolve_id(name.lower()) or slug(name), []).append(code)
+        groups = [(STATEWIDE, np.ones(len(days), dtype=bool))]
+        groups += [(key, np.isin(district_codes, codes)) for key, codes in sorted(keys.items())]
+
+        for key, selected in groups:
+            recent = selected & (days >= lookback_start)
+            if not recent.any():
+                continue
+            baseline = float(prices[recent].mean())
+            for season_code, season in enumerate(SEASON_NAMES):
+                stats = season_stats(days[selected], prices[selected], season_code, lookback_start)
+                if stats is None:
+                    continue
+                if key == STATEWIDE:
+                    district_forecasts = [price for (district, s), price in forecasts.items() if s == season]
+                    forecast = float(np.mean(district_forecasts)) if district_forecasts else np.nan
+                else:
+                    forecast = forecasts.get((key, season), np.nan)
+                expected = stats['level'] * (1 + stats['trend'])
+                if not np.isnan(forecast):
+                    expected = (expected + forecast) / 2
+                rows.append({
+                    'commodity': commodity, 'district': key, 'season': season_code,
+                    **stats, 'baseline': baseline, 'forecast': forecast, 'expected': expected,
+                    'score': expected / baseline - 1 - RISK_AVERSION * stats['volatility']
+                })
+
+    commodities = sorted({row['commodity'] for row in rows})
+    districts = [STATEWIDE] + sorted({row['district'] for row in rows} - {STATEWIDE})
+    columns = {
+        'commodity': np.array([commodities.index(row['commodity']) for row in rows], dtype=np.int16),
+        'district': np.array([districts.index(row['district']) for row in rows], dtype=np.int16),
+        'season': np.array([row['season'] for row in rows], dtype=np.int8),
+        'observations': np.array([row['observations'] for row in rows], dtype=np.int32),
+        'years': np.array([row['years'] for row in rows], dtype=np.int8),
+        **{name: np.array([row[name] for row in rows], dtype=np.float32) for name in FLOAT_COLUMNS}
+    }
+
+    # Confidence is the score's percentile among the same season's rows,
+    # less a penalty when the level rests on a single year
+    confidence = np.zeros(len(rows), dtype=np.int8)
+    for season_code in range(len(SEASONS)):
+        members = np.flatnonzero(columns['season'] == season_code)
+        if len(members):
+            ranks = columns['score'][members].argsort().argsort()
+            percentile = ranks / max(len(members) - 1, 1)
+            confidence[members] = np.round(60 + 37 * percentile - 5 * (columns['years'][members] < 2))
+    columns['confidence'] = confidence
+
+    meta = {
+        'format': INDEX_FORMAT,
+        'built_at': datetime.now().isoformat(timespec='seconds'),
+        'forecast_from': today.isoformat(),
+        'history_updated_at': store.updated_at,
+        'model_versions': {commodity: registry.sources.get(commodity) or 'legacy' for commodity in registry.available},
+        'seasons': SEASONS,
+        'commodities': commodities,
+        'districts': districts
+    }
+    return columns, meta
+
+
+def save_index(columns, meta, path=INDEX_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, meta=np.array(json.dumps(meta)), **columns)
+    os.replace(tmp_path, path)
+
+
+class ProfitabilityIndex:
+    """Read-only lookup over a saved index, grouped by (district, season)"""
+
+    def __init__(self, columns, meta):
+        if meta.get('format') != INDEX_FORMAT:
+            raise ValueError(f"Unsupported profitability index format {meta.get('format')}")
+        self.columns = columns
+        self.meta = meta
+        self.commodities = meta['commodities']
+        self.district_codes = {district: code for code, district in enumerate(meta['districts'])}
+        self.groups = {}
+        for row, key in enumerate(zip(columns['district'].tolist(), columns['season'].tolist())):
+            self.groups.setdefault(key, []).append(row)
+        self.groups = {key: np.array(rows) for key, rows in self.groups.items()}
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        with np.load(path) as data:
+            columns = {name: data[name] for name in data.files if name != 'meta'}
+            meta = json.loads(str(data['meta']))
+        return cls(columns, meta)
+
+    def __len__(self):
+        return len(self.columns['score'])
+
+    def top(self, season, district=None, limit=3, soil_affinity=()):
+        """Best `limit` rows for a season in a district (statewide when it has none)
+
+        Returns (rows, district key used). Commodities in `soil_affinity` get
+        SOIL_BONUS added to their score.
+        """
+        season_code = SEASON_NAMES.index(season)
+        key = district if (self.district_codes.get(district), season_code) in self.groups else STATEWIDE
+        rows = self.groups.get((self.district_codes.get(key), season_code))
+        if rows is None:
+            return [], key
+
+        names = [self.commodities[code] for code in self.columns['commodity'][rows]]
+        scores = self.columns['score'][rows] + np.array([SOIL_BONUS if name in soil_affinity else 0.0 for name in names])
+        ranked = []
+        for position in np.argsort(-scores, kind='stable')[:limit]:
+            row = rows[position]
+            ranked.append({
+                'commodity': names[position],
+                'district': key,
+                'season': season,
+                'score': float(scores[position]),
+                'soil_match': names[position] in soil_affinity,
+                'observations': int(self.columns['observations'][row]),
+                'years': int(self.columns['years'][row]),
+                'confidence': int(self.columns['confidence'][row]),
+                **{name: (None if np.isnan(self.columns[name][row]) else float(self.columns[name][row]))
+                   for name in FLOAT_COLUMNS if name != 'score'}
+            })
+        return ranked, key
+
+
+class IndexLoader:
+    """Reloads the saved index when its file changes; one os.stat per call"""
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self._mtime = None
+        self._index = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return self._index
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._index = ProfitabilityIndex.load(self.path)
+                    self._mtime = mtime
+                    logger.info(f"📈 Profitability index loaded: {len(self._index)} rows built {self._index.meta['built_at']}")
+        return self._index
+
+
+if __name__ == '__main__':
+    from registry import ModelRegistry
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--store', default=STORE_PATH)
+    parser.add_argument('--bundles', default=BUNDLES_PATH)
+    parser.add_argument('--output', default=INDEX_PATH)
+    parser.add_argument('--today', type=date.fromisoformat, help='forecast seasons from this date (default: today)')
+    args = parser.parse_args()
+    columns, meta = build_index(HistoryStore(args.store), ModelRegistry(COMMODITY_FILES, bundles_path=args.bundles), args.today)
+    save_index(columns, meta, args.output)
+    logger.info(f"✅ Wrote {len(columns['score'])} rows for {len(meta['commodities'])} commodities to {args.output}")
@@ -0,0 +1,402 @@
+"""Lazy, memory-bounded registry of commodity models
+
+Only the tiny district encoders (or bundle manifests) are read at startup
+so the catalog endpoints can list commodities and districts. Models are
+loaded on first use and kept in an LRU bounded by model count and by an
+estimated memory budget.
+
+A commodity is served from its live bundle (see bundle.py) when it has one
+and from the legacy pickles otherwise. `refresh()` swaps in new bundle
+versions atomically: the new model is loaded before anything is switched,
+and requests already holding the old entry finish on it.
+
+With `shared_weights`, commodities that only have legacy pickles are
+exported to bundles once, under a file lock so concurrent workers don't
+repeat it. Every worker then maps the same read-only .npy files. The
+forest pages live in the OS page cache and are shared by all processes:
+
+    MODEL_SHARED_WEIGHTS=1 MODEL_PRELOAD=1 gunicorn -w 4 --preload app:app
+"""
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Windows: exports are not serialized across processes
+    fcntl = None
+
+from bundle import BUNDLES_PATH, DistrictClasses, current_version, load_bundle, migrate, read_manifest
+from inference import compile_checked
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """Dict-like access to commodity models that loads them on first request
+
+    `registry[commodity]` returns the same entry shape the app always used
+    ('model', 'preprocessor', 'district_encoder', 'engine'), loading it if
+    needed and evicting the least recently used entries when over budget.
+    """
+
+    def __init__(self, files, max_models=0, max_bytes=0, compile_models=True, bundles_path=BUNDLES_PATH,
+                 verify_bundles=True, shared_weights=False):
+        self.files = files
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.compile_models = compile_models
+        self.bundles_path = bundles_path
+        self.verify_bundles = verify_bundles
+        self.shared_weights = shared_weights
+
+        self.available = []
+        self.districts = {}
+        self.encoders = {}
+        # commodity -> live bundle version, or None when served from legacy pickles
+        self.sources = {}
+        self.version = 0
+
+        self._loaded = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._reload_listeners = []
+        self._load_listeners = []
+        self._refresh_lock = threading.Lock()
+        self._watch_thread = None
+        self.stats_counters = {'loads': 0, 'hits': 0, 'misses': 0, 'evictions': 0, 'load_errors': 0, 'load_seconds': 0.0,
+                               'swaps': 0, 'swap_errors': 0, 'exported': 0}
+
+        if shared_weights:
+            self.export_legacy()
+        self.discover()
+
+    def _bundle_encoder(self, commodity, version):
+        return DistrictClasses(read_manifest(commodity, version, self.bundles_path)['districts'])
+
+    def export_legacy(self):
+        """Convert commodities that only have legacy pickles into bundles, once across processes"""
+        os.makedirs(self.bundles_path, exist_ok=True)
+        with open(os.path.join(self.bundles_path, '.export.lock'), 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            # Re-checked under the lock: another worker may have just exported them
+            pending = {commodity: files for commodity, files in self.files.items()
+                       if current_version(commodity, self.bundles_path) is None
+                       and all(os.path.exists(path) for path in files.values())}
+            try:
+                exported = migrate(pending, self.bundles_path) if pending else {}
+            except Exception as e:
+                logger.error(f"❌ Exporting shared model weights failed: {str(e)}")
+                exported = {}
+        self.stats_counters['exported'] += len(exported)
+        return exported
+
+    def preload(self):
+        """Load every available model now instead of on first request"""
+        for commodity in list(self.available):
+            try:
+                self[commodity]
+            except Exception:
+                # Already logged and counted by _load; the commodity stays lazily loadable
+                pass
+
+    def discover(self):
+        """Find commodities with a bundle or legacy files and read their district encoders"""
+        available = []
+        districts = {}
+        encoders = {}
+        sources = {}
+        for commodity, files in self.files.items():
+            version = current_version(commodity, self.bundles_path)
+            if version is not None:
+                try:
+                    encoders[commodity] = self._bundle_encoder(commodity, version)
+                    sources[commodity] = version
+                    available.append(commodity)
+                    districts[commodity] = [district.strip() for district in encoders[commodity].classes_]
+                    logger.info(f"📦 {commodity} bundle {version} available with {len(districts[commodity])} districts")
+                    continue
+                except Exception as e:
+                    logger.error(f"❌ Error reading {commodity} bundle {version}: {str(e)}")
+
+            missing_files = [f"{file_type}: {file_path}" for file_type, file_path in files.items()
+                             if not os.path.exists(file_path)]
+            if missing_files:
+                logger.warning(f"❌ Missing files for {commodity}: {', '.join(missing_files)}")
+                continue
+            try:
+                with open(files['district_encoder'], "rb") as f:
+                    district_encoder = pickle.load(f)
+            except Exception as e:
+                logger.error(f"❌ Error loading {commodity} district encoder: {str(e)}")
+                continue
+
+            available.append(commodity)
+            encoders[commodity] = district_encoder
+            sources[commodity] = None
+            # Store the districts this commodity knows
+            if hasattr(district_encoder, 'classes_'):
+                districts[commodity] = [district.strip() for district in district_encoder.classes_]
+            else:
+                districts[commodity] = []
+            logger.info(f"📦 {commodity} available with {len(districts[commodity])} districts")
+
+        with self._lock:
+            # Mutate in place so module-level aliases keep seeing the current catalog
+            self.available[:] = available
+            self.districts.clear()
+            self.districts.update(districts)
+            self.encoders = encoders
+            self.sources = sources
+            self._loaded.clear()
+            self._sizes.clear()
+            self.version += 1
+        return available
+
+    def reload(self):
+        """Drop every loaded model and re-read the catalog from disk"""
+        logger.info("🔄 Reloading model registry")
+        available = self.discover()
+        for listener in self._reload_listeners:
+            listener()
+        return available
+
+    def refresh(self):
+        """Swap in every commodity whose live bundle version changed
+
+        New versions are loaded and verified before the swap, which happens
+        under the registry lock in one step. A version that fails to load is
+        logged and the current one keeps serving. Returns {commodity: version}
+        for the commodities swapped.
+        """
+        with self._refresh_lock:
+            changed = {}
+            for commodity in self.files:
+                version = current_version(commodity, self.bundles_path)
+                if version is not None and self.sources.get(commodity) != version:
+                    changed[commodity] = version
+            if not changed:
+                return {}
+
+            prepared = {}
+            for commodity, version in changed.items():
+                try:
+                    encoder = self._bundle_encoder(commodity, version)
+                    # Reload models that are in use now, so traffic never waits on a cold load
+                    loaded = self._load_bundle(commodity, version, encoder) if self.is_loaded(commodity) else None
+                    prepared[commodity] = (version, encoder, loaded)
+                except Exception as e:
+                    with self._lock:
+                        self.stats_counters['swap_errors'] += 1
+                    logger.error(f"❌ Keeping {commodity} {self.sources.get(commodity) or 'legacy'}: bundle {version} failed to load: {str(e)}")
+
+            if not prepared:
+                return {}
+            with self._lock:
+                encoders = dict(self.encoders)
+                for commodity, (version, encoder, loaded) in prepared.items():
+                    encoders[commodity] = encoder
+                    self.sources[commodity] = version
+                    self.districts[commodity] = [district.strip() for district in encoder.classes_]
+                    if loaded is not None:
+                        self._loaded[commodity], self._sizes[commodity] = loaded
+                    else:
+                        self._loaded.pop(commodity, None)
+                        self._sizes.pop(commodity, None)
+                    self.stats_counters['swaps'] += 1
+                self.encoders = encoders
+                self.available[:] = [commodity for commodity in self.files if commodity in encoders]
+                self.version += 1
+
+            for commodity, (version, _, _) in prepared.items():
+                logger.info(f"🔁 {commodity} now serving bundle {version}")
+            for listener in self._reload_listeners:
+                listener()
+            return {commodity: version for commodity, (version, _, _) in prepared.items()}
+
+    def _watch(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"❌ Bundle watch failed: {str(e)}")
+
+    def watch(self, interval):
+        """Poll the bundle CURRENT pointers every `interval` seconds in a daemon thread"""
+        with self._lock:
+            if self._watch_thread is not None or interval <= 0:
+                return
+            self._watch_thread = threading.Thread(target=self._watch, args=(interval,), name='bundle-watch', daemon=True)
+        self._watch_thread.start()
+
+    def add_reload_listener(self, callback):
+        """Call `callback()` after every reload, e.g. to drop derived caches"""
+        self._reload_listeners.append(callback)
+
+    def add_load_listener(self, callback):
+        """Call `callback(commodity, source, seconds, ok)` after every model load attempt"""
+        self._load_listeners.append(callback)
+
+    def _loaded_in(self, commodity, source, start, ok):
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.stats_counters['loads' if ok else 'load_errors'] += 1
+            if ok:
+                self.stats_counters['load_seconds'] += elapsed
+        for listener in self._load_listeners:
+            listener(commodity, source, elapsed, ok)
+        return elapsed
+
+    def __contains__(self, commodity):
+        return commodity in self.encoders
+
+    def __iter__(self):
+        return iter(list(self.available))
+
+    def __len__(self):
+        return len(self.available)
+
+    def keys(self):
+        return list(self.available)
+
+    def is_loaded(self, commodity):
+        return commodity in self._loaded
+
+    def resident(self):
+        """Commodities whose models are loaded right now"""
+        with self._lock:
+            return list(self._loaded)
+
+    def peek(self, commodity):
+        """The loaded entry or None; never loads and doesn't count as a use for LRU order"""
+        with self._lock:
+            return self._loaded.get(commodity)
+
+    def __getitem__(self, commodity):
+        with self._lock:
+            entry = self._loaded.get(commodity)
+            if entry is not None:
+                self._loaded.move_to_end(commodity)
+                self.stats_counters['hits'] += 1
+                return entry
+            if commodity not in self.encoders:
+                raise KeyError(commodity)
+            self.stats_counters['misses'] += 1
+            load_lock = self._load_locks.setdefault(commodity, threading.Lock())
+
+        # Load outside the registry lock so other commodities stay servable;
+        # the per-commodity lock makes concurrent first requests share one load.
+        with load_lock:
+            with self._lock:
+                entry = self._loaded.get(commodity)
+                if entry is not None:
+                    self._loaded.move_to_end(commodity)
+                    return entry
+                version = self.version
+            entry, size = self._load(commodity)
+            with self._lock:
+                if version != self.version:
+                    # Catalog reloaded while we were loading; serve but don't keep it
+                    return entry
+                self._loaded[commodity] = entry
+                self._sizes[commodity] = size
+                self._evict(keep=commodity)
+            return entry
+
+    def get(self, commodity, default=None):
+        try:
+            return self[commodity]
+        except KeyError:
+            return default
+
+    def _load_bundle(self, commodity, version, encoder):
+        start = time.perf_counter()
+        try:
+            engine, manifest = load_bundle(commodity, version, self.bundles_path, verify=self.verify_bundles)
+        except Exception as e:
+            self._loaded_in(commodity, 'bundle', start, ok=False)
+            logger.error(f"❌ Error loading {commodity} bundle {version}: {str(e)}")
+            raise
+        entry = {
+            'model': None,
+            'preprocessor': None,
+            'district_encoder': encoder,
+            'engine': engine,
+            'version': version,
+            'manifest': manifest
+        }
+        elapsed = self._loaded_in(commodity, 'bundle', start, ok=True)
+        logger.info(f"✅ {commodity} bundle {version} mapped in {elapsed:.3f}s ({engine.nbytes / 1e6:.1f} MB)")
+        return entry, engine.nbytes
+
+    def _load(self, commodity):
+        version = self.sources.get(commodity)
+        if version is not None:
+            return self._load_bundle(commodity, version, self.encoders[commodity])
+
+        files = self.files[commodity]
+        start = time.perf_counter()
+        try:
+            with open(files['model'], "rb") as f:
+                model = pickle.load(f)
+            with open(files['preprocessor'], "rb") as f:
+                preprocessor = pickle.load(f)
+        except Exception as e:
+            self._loaded_in(commodity, 'pickle', start, ok=False)
+            logger.error(f"❌ Error loading {commodity}: {str(e)}")
+            raise
+
+        engine = compile_checked(model, preprocessor) if self.compile_models else None
+        entry = {
+            'model': model,
+            'preprocessor': preprocessor,
+            'district_encoder': self.encoders[commodity],
+            'engine': engine,
+            'version': None
+        }
+        size = os.path.getsize(files['model']) + os.path.getsize(files['preprocessor'])
+        if engine is not None:
+            size += engine.nbytes
+
+        elapsed = self._loaded_in(commodity, 'pickle', start, ok=True)
+        logger.info(f"✅ {commodity} loaded in {elapsed:.2f}s (~{size / 1e6:.1f} MB)")
+        return entry, size
+
+    def _evict(self, keep):
+        """Evict least recently used models until within budget; caller holds the lock"""
+        def over_budget():
+            if self.max_models and len(self._loaded) > self.max_models:
+                return True
+            return bool(self.max_bytes) and sum(self._sizes.values()) > self.max_bytes
+
+        while len(self._loaded) > 1 and over_budget():
+            commodity = next(iter(self._loaded))
+            if commodity == keep:
+                self._loaded.move_to_end(commodity)
+                continue
+            del self._loaded[commodity]
+            self._sizes.pop(commodity, None)
+            self.stats_counters['evictions'] += 1
+            logger.info(f"♻️ Evicted {commodity} from model registry")
+
+    def stats(self):
+        """Load/eviction counters and current residency"""
+        with self._lock:
+            return {
+                **self.stats_counters,
+                'load_seconds': round(self.stats_counters['load_seconds'], 3),
+                'version': self.version,
+                'available': len(self.available),
+                'bundles': {commodity: version for commodity, version in self.sources.items() if version},
+                'shared_weights': self.shared_weights,
+                'loaded': list(self._loaded.keys()),
+                'loaded_bytes': sum(self._sizes.values()),
+                'max_models': self.max_models,
+                'max_bytes': self.max_bytes
+            }
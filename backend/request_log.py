@@ -0,0 +1,208 @@
+"""Queue-backed structured logging with per-route sampling and request IDs
+
+Log calls only build a LogRecord and put it on a bounded in-memory queue;
+message formatting and the write to stderr happen on a listener thread. When
+the queue is full, records are dropped and counted instead of blocking the
+request.
+
+Every record carries the current request's correlation ID and route. The ID
+comes from the client's X-Request-ID header, or a new one is generated, and
+it is echoed back in the response. Hot paths log through `RequestLogger`. Its
+INFO/DEBUG calls return before building a record when the level is disabled
+or the request was not picked by its route's sample rate:
+
+    request_log.info("🎯 Prediction for %s", commodity, district=district)
+
+Positional args are merged into the message lazily. Keyword fields become
+structured fields in the output.
+"""
+import atexit
+import json
+import logging
+import queue
+import random
+import re
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+_request_id = ContextVar('request_id', default=None)
+_route = ContextVar('route', default=None)
+_sampled = ContextVar('sampled', default=True)
+
+# Client-supplied IDs are only trusted when they look like an ID
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+_sample_rates = {}
+_default_rate = 1.0
+_handler = None
+_listener = None
+
+
+def parse_sample_rates(spec):
+    """'predict=0.01,predict_batch=0.1' -> {'predict': 0.01, 'predict_batch': 0.1}"""
+    rates = {}
+    for part in (spec or '').split(','):
+        if '=' not in part:
+            continue
+        route, rate = part.split('=', 1)
+        rates[route.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+def sample_rate(route):
+    return _sample_rates.get(route, _default_rate)
+
+
+def begin_request(route, request_id=None):
+    """Bind a correlation ID and sampling decision to the current request; returns the ID"""
+    if not request_id or not REQUEST_ID_PATTERN.match(request_id):
+        request_id = uuid.uuid4().hex[:16]
+    rate = sample_rate(route)
+    _request_id.set(request_id)
+    _route.set(route)
+    _sampled.set(rate >= 1.0 or random.random() < rate)
+    return request_id
+
+
+def end_request():
+    _request_id.set(None)
+    _route.set(None)
+    _sampled.set(True)
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records with the request ID and route while still on the request thread"""
+
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        record.route = _route.get()
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Enqueue records as-is, leaving formatting to the listener; drop when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Tracebacks must be rendered before the frames go away
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class StructuredFormatter(logging.Formatter):
+    """One JSON object per record (`json_lines=True`) or readable text with key=value fields"""
+
+    def __init__(self, json_lines=False):
+        super().__init__()
+        self.json_lines = json_lines
+
+    def format(self, record):
+        fields = getattr(record, 'fields', None) or {}
+        request_id = getattr(record, 'request_id', None)
+        if self.json_lines:
+            entry = {
+                'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+                'level': record.levelname,
+                'logger': record.name,
+                'message': record.getMessage(),
+                'request_id': request_id,
+                'route': getattr(record, 'route', None),
+                **fields
+            }
+            if record.exc_text:
+                entry['exception'] = record.exc_text
+            return json.dumps(entry, ensure_ascii=False, default=str)
+
+        line = f"{record.levelname}:{record.name}:"
+        if request_id:
+            line += f"[{request_id}] "
+        line += record.getMessage()
+        if fields:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_text:
+            line += '\n' + record.exc_text
+        return line
+
+
+def configure_logging(level='INFO', json_lines=False, queue_size=10000, sample_rates=None, default_rate=1.0, stream=None):
+    """Route the root logger through a bounded queue drained by a background thread"""
+    global _sample_rates, _default_rate, _handler, _listener
+    if _listener is None:
+        atexit.register(stop_logging)
+    else:
+        stop_logging()
+    _sample_rates = dict(sample_rates or {})
+    _default_rate = default_rate
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(StructuredFormatter(json_lines))
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+    handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
+    _handler = handler
+    _listener = QueueListener(handler.queue, output)
+    _listener.start()
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def stats():
+    return {
+        'queued': _handler.queue.qsize() if _handler else 0,
+        'dropped': _handler.dropped if _handler else 0,
+        'sample_rates': _sample_rates,
+        'default_rate': _default_rate
+    }
+
+
+class RequestLogger:
+    """Sampled, structured facade over a logger for request hot paths
+
+    debug/info are skipped unless the level is enabled and the current
+    request was sampled; warning/error are always logged.
+    """
+
+    def __init__(self, logger):
+        self.logger = logger
+
+    def debug(self, message, *args, **fields):
+        if _sampled.get() and self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(message, *args, extra={'fields': fields}, stacklevel=2)
+
+    def info(self, message, *args, **fields):
+        if _sampled.get() and self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(message, *args, extra={'fields': fields}, stacklevel=2)
+
+    def warning(self, message, *args, **fields):
+        self.logger.warning(message, *args, extra={'fields': fields}, stacklevel=2)
+
+    def error(self, message, *args, **fields):
+        self.logger.error(message, *args, extra={'fields': fields}, stacklevel=2)
@@ -0,0 +1,127 @@
+"""Response encoding: fast JSON, field projection and negotiated compression
+
+- `FastJSONProvider` swaps Flask's JSON provider for orjson when it is
+  installed. orjson is optional and the stdlib provider stays the fallback.
+  Every jsonify() and cached catalog body goes through the provider.
+- `project(payload, fields)` keeps only the requested dotted paths, e.g.
+  `?fields=status,commodity_info.rice.district_count`. A path that crosses a
+  list applies to each item.
+- `compress_response` gzips (or, with the optional brotli package, brotli-
+  compresses) bodies above a size threshold for clients that accept it.
+"""
+import gzip
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional fast path
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/plain', 'text/html', 'text/csv')
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+MAX_FIELDS = 32
+
+
+def _default(value):
+    """Types orjson does not serialize natively"""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, with the stdlib provider's output conventions"""
+
+    def _options(self):
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return options
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_default, option=self._options()).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_default, option=self._options() | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def json_provider(name):
+    """Provider class for JSON_SERIALIZER: 'orjson' (when installed) or 'stdlib'"""
+    if name == 'orjson' and orjson is not None:
+        return FastJSONProvider
+    return DefaultJSONProvider
+
+
+def parse_fields(value):
+    """'a,b.c' -> ('a', 'b.c'); None or '' -> None (no projection)"""
+    if not value:
+        return None
+    fields = tuple(sorted({field.strip() for field in value.split(',') if field.strip()}))
+    return fields[:MAX_FIELDS] or None
+
+
+def project(payload, fields):
+    """Copy of `payload` with only the dotted `fields` paths; unknown paths are skipped"""
+    if not fields:
+        return payload
+    tree = {}
+    for field in fields:
+        node = tree
+        for part in field.split('.'):
+            node = node.setdefault(part, {})
+    return _select(payload, tree)
+
+
+def _select(value, tree):
+    if not tree:
+        return value
+    if isinstance(value, list):
+        return [_select(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {key: _select(value[key], subtree) for key, subtree in tree.items() if key in value}
+
+
+def negotiate_encoding(accept_encodings):
+    """'br' or 'gzip' from a request's Accept-Encoding, preferring brotli when available"""
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return accept_encodings.best_match(offered)
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response, accept_encodings, min_bytes):
+    """Compress a finished response in place when it is large enough and the client accepts it"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    encoding = negotiate_encoding(accept_encodings) if len(body) >= min_bytes else None
+    if encoding:
+        response.set_data(compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,66 @@
+"""Single-flight coalescing of identical concurrent computations
+
+When many requests miss the prediction cache for the same key at once
+(market opening), only the first runs the model. The rest wait for its
+result instead of each running the same transform + predict. A waiter gives
+up after `timeout` seconds and computes on its own, so one slow leader
+cannot stall everyone behind it. If the leader raises, its waiters re-raise
+the same error.
+"""
+import threading
+
+
+class _Call:
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run `compute` once per key among concurrent callers; `timeout=0` disables coalescing"""
+
+    def __init__(self, timeout=2.0):
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.counters = {'leaders': 0, 'coalesced': 0, 'timeouts': 0, 'shared_errors': 0}
+
+    def do(self, key, compute):
+        """Return (value, shared), where `shared` is True when another caller computed it"""
+        if not self.timeout:
+            return compute(), False
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.counters['leaders'] += 1
+
+        if leader:
+            try:
+                call.value = compute()
+                return call.value, False
+            except Exception as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        if not call.done.wait(self.timeout):
+            with self._lock:
+                self.counters['timeouts'] += 1
+            return compute(), False
+        with self._lock:
+            self.counters['shared_errors' if call.error is not None else 'coalesced'] += 1
+        if call.error is not None:
+            raise call.error
+        return call.value, True
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, 'in_flight': len(self._calls), 'timeout': self.timeout}
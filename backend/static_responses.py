@@ -0,0 +1,95 @@
+"""Prebuilt JSON responses for catalog endpoints
+
+Commodity, district and market payloads only change when the model
+registry reloads. They are serialized once per registry version and served
+from memory with a strong ETag, so repeat clients get a 304 or, within
+max-age, skip the request entirely.
+
+A `fields=` query parameter projects the payload down to the listed dotted
+paths; each distinct projection is cached as its own entry. Bodies above
+`compress_min_bytes` (0 disables) are compressed once per negotiated encoding and kept
+alongside the plain body, with the encoding appended to the ETag.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import current_app, request
+
+from serialization import compress, negotiate_encoding, parse_fields, project
+
+
+class VersionedResponseCache:
+    """Serialized JSON bodies keyed by endpoint arguments, field projection and registry version"""
+
+    def __init__(self, version, max_age=300, max_entries=512, compress_min_bytes=1024):
+        self.version = version
+        self.max_age = max_age
+        # Projections are client-chosen, so entries are bounded (LRU)
+        self.max_entries = max_entries
+        self.compress_min_bytes = compress_min_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {'builds': 0, 'hits': 0, 'not_modified': 0, 'compressions': 0, 'evictions': 0}
+
+    def _entry(self, key, build):
+        version = self.version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['version'] == version:
+                self._entries.move_to_end(key)
+                self.counters['hits'] += 1
+                return entry
+
+        fields = key[1]
+        body = current_app.json.dumps(project(build(), fields)).encode('utf-8')
+        entry = {'version': version, 'body': body, 'etag': hashlib.sha1(body).hexdigest(), 'encoded': {}}
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self.counters['builds'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters['evictions'] += 1
+        return entry
+
+    def _encoded(self, entry, encoding):
+        body = entry['encoded'].get(encoding)
+        if body is None:
+            body = entry['encoded'][encoding] = compress(entry['body'], encoding)
+            with self._lock:
+                self.counters['compressions'] += 1
+        return body
+
+    def respond(self, key, build):
+        """Response for `key`, calling `build()` only when the version changed
+
+        Applies the request's `fields=` projection, compresses when the client
+        accepts it, honours If-None-Match with a 304 and marks the response
+        cacheable.
+        """
+        entry = self._entry((key, parse_fields(request.args.get('fields'))), build)
+        body, etag = entry['body'], entry['etag']
+        encoding = None
+        if self.compress_min_bytes and len(body) >= self.compress_min_bytes:
+            encoding = negotiate_encoding(request.accept_encodings)
+        if encoding:
+            body, etag = self._encoded(entry, encoding), f"{etag}-{encoding}"
+        response = current_app.response_class(body, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = f"public, max-age={self.max_age}"
+        response = response.make_conditional(request)
+        if response.status_code == 304:
+            self.counters['not_modified'] += 1
+        return response
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {**self.counters, 'entries': len(self._entries), 'max_entries': self.max_entries,
+                'compress_min_bytes': self.compress_min_bytes}
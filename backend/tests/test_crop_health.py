@@ -0,0 +1,49 @@
+"""CropHealthJobs: deduplication and consistent job snapshots"""
+import io
+import os
+import threading
+
+import crop_health
+from crop_health import CropHealthJobs
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\0' * 64
+
+
+def test_polling_while_a_job_finishes_never_sees_a_half_finished_job(tmp_path, monkeypatch):
+    # Widen the window between the analysis and the job's bookkeeping
+    finishing = threading.Event()
+    real_remove = os.remove
+
+    def slow_remove(path):
+        finishing.set()
+        threading.Event().wait(0.2)
+        real_remove(path)
+
+    monkeypatch.setattr(crop_health.os, 'remove', slow_remove)
+    jobs = CropHealthJobs(spool_path=str(tmp_path), workers=1)
+    job, deduplicated = jobs.submit(io.BytesIO(PNG))
+    assert not deduplicated
+
+    assert finishing.wait(5)
+    seen = []
+    while True:
+        snapshot = jobs.get(job['id'])
+        seen.append(snapshot['status'])
+        if snapshot['status'] in ('done', 'failed'):
+            assert snapshot['finished_at'] is not None
+            assert snapshot['result'] is not None or snapshot['error'] is not None
+        if snapshot['status'] == 'done':
+            break
+    assert seen[0] == 'running'
+
+    job, deduplicated = jobs.submit(io.BytesIO(PNG))
+    assert deduplicated and job['status'] == 'done' and job['finished_at'] is not None
+
+
+def test_wait_returns_the_finished_job(tmp_path):
+    jobs = CropHealthJobs(spool_path=str(tmp_path), workers=1)
+    job, _ = jobs.submit(io.BytesIO(PNG))
+    finished = jobs.wait(job['id'], timeout=5)
+    assert finished['status'] == 'done'
+    assert finished['result']['image']['format'] == 'PNG'
+    assert not os.listdir(tmp_path)
@@ -0,0 +1,133 @@
+"""Ingest -> store -> feature cache round trips on small synthetic CSVs"""
+import os
+
+import pytest
+
+import ingest
+import train
+from history_store import HistoryStore, StoreWriter, read_manifest
+
+HEADER = 't,cmdty,market_id,market_name,state_id,state_name,district_id,district_name,variety,p_min,p_max,p_modal\n'
+
+
+def row(day, district='Nagpur', market='Kalamna', price=2000):
+    return f"{day:02d}-01-2024,Cotton,{100 + day},{market},27,Maharashtra,5,{district},Other,{price - 100},{price + 100},{price}\n"
+
+
+def write_csv(path, rows, header=HEADER):
+    path.write_text(header + ''.join(rows))
+
+
+@pytest.fixture
+def paths(tmp_path):
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    return {'csv': data_dir / 'Cotton.csv', 'data_dir': str(data_dir),
+            'store': str(tmp_path / 'store'), 'cache': str(tmp_path / 'features')}
+
+
+def run_ingest(paths, **kwargs):
+    return ingest.ingest(paths['store'], data_dirs=[paths['data_dir']], **kwargs)
+
+
+def test_chunks_split_on_line_boundaries(paths):
+    write_csv(paths['csv'], [row(day) for day in range(1, 6)])
+    chunks = list(ingest.iter_line_chunks(str(paths['csv']), chunk_rows=2))
+    assert [len(rows) for rows, _ in chunks] == [2, 2, 1]
+    assert [rows[0][0] for rows, _ in chunks] == ['01-01-2024', '03-01-2024', '05-01-2024']
+    assert chunks[-1][1] == paths['csv'].stat().st_size
+
+    # Resuming from a chunk's end offset continues with the next full line
+    resumed = list(ingest.iter_line_chunks(str(paths['csv']), chunks[0][1], chunk_rows=10))
+    assert [r[0] for r in resumed[0][0]] == ['03-01-2024', '04-01-2024', '05-01-2024']
+
+
+def test_partial_last_line_waits_for_next_run(paths):
+    complete = [row(day) for day in range(1, 4)]
+    partial = row(4)[:20]
+    write_csv(paths['csv'], complete + [partial])
+
+    stats = run_ingest(paths)
+    assert stats['rows_read'] == 3
+    watermark = read_manifest(paths['store'])['watermarks'][str(paths['csv'])]
+    assert watermark['offset'] == len(HEADER) + len(''.join(complete))
+
+    # The writer finishes the line and appends another
+    write_csv(paths['csv'], complete + [row(4), row(5)])
+    stats = run_ingest(paths)
+    assert stats['rows_read'] == 2 and not stats['rebuild']
+    assert HistoryStore(paths['store']).rows == 5
+
+
+def test_watermark_appends_only_new_rows(paths):
+    write_csv(paths['csv'], [row(day) for day in range(1, 4)])
+    assert run_ingest(paths)['rows_read'] == 3
+    assert run_ingest(paths)['rows_read'] == 0
+
+    write_csv(paths['csv'], [row(day) for day in range(1, 6)])
+    stats = run_ingest(paths)
+    assert stats['rows_read'] == 2 and stats['segments'] == 1
+    assert len(read_manifest(paths['store'])['segments']) == 2
+
+
+def test_truncated_or_rewritten_source_triggers_rebuild(paths):
+    write_csv(paths['csv'], [row(day) for day in range(1, 6)])
+    run_ingest(paths)
+    sources = ingest.source_files([paths['data_dir']])
+    assert not ingest.needs_rebuild(paths['store'], sources)
+
+    write_csv(paths['csv'], [row(day) for day in range(1, 3)])
+    assert ingest.needs_rebuild(paths['store'], sources)
+
+    write_csv(paths['csv'], [row(day) for day in range(1, 6)], header=HEADER.replace('variety', 'grade'))
+    assert ingest.needs_rebuild(paths['store'], sources)
+
+
+def test_feature_cache_appends_new_segments(paths):
+    write_csv(paths['csv'], [row(day) for day in range(1, 4)])
+    run_ingest(paths)
+    columns, _, new_rows = train.load_features('cotton', paths['store'], paths['cache'])
+    assert len(columns['date']) == 3 and new_rows == 3
+
+    columns, _, new_rows = train.load_features('cotton', paths['store'], paths['cache'])
+    assert len(columns['date']) == 3 and new_rows == 0
+
+    write_csv(paths['csv'], [row(day) for day in range(1, 6)])
+    run_ingest(paths)
+    columns, _, new_rows = train.load_features('cotton', paths['store'], paths['cache'])
+    assert len(columns['date']) == 5 and new_rows == 2
+
+
+def test_feature_cache_is_discarded_after_rebuild(paths):
+    write_csv(paths['csv'], [row(day) for day in range(1, 6)])
+    run_ingest(paths)
+    train.load_features('cotton', paths['store'], paths['cache'])
+
+    # Truncation forces a rebuild: a new store id and district codes
+    # assigned in a different order
+    store_id = read_manifest(paths['store'])['store_id']
+    write_csv(paths['csv'], [row(1, district='Wardha', market='Hinganghat'), row(2), row(3)])
+    assert run_ingest(paths)['rebuild']
+    assert read_manifest(paths['store'])['store_id'] != store_id
+
+    columns, district_names, new_rows = train.load_features('cotton', paths['store'], paths['cache'])
+    assert len(columns['date']) == 3 and new_rows == 3
+    assert sorted(district_names) == ['Nagpur', 'Nagpur', 'Wardha']
+
+
+def test_rebuild_keeps_the_live_store_readable_until_commit(paths):
+    write_csv(paths['csv'], [row(day) for day in range(1, 6)])
+    run_ingest(paths)
+    old_segments = read_manifest(paths['store'])['segments']
+
+    writer = StoreWriter(paths['store'], rebuild=True)
+    frame = ingest.clean_chunk('cotton', HEADER.strip().split(','), [r.strip().split(',') for r in (row(1), row(2))])
+    writer.write_segment(ingest.encode_chunk(writer, frame))
+    # Mid-rebuild, readers still see the complete old store
+    assert HistoryStore(paths['store']).rows == 5
+
+    writer.commit()
+    manifest = read_manifest(paths['store'])
+    assert HistoryStore(paths['store']).rows == 2
+    assert not set(manifest['segments']) & set(old_segments)
+    assert not any(os.path.exists(os.path.join(paths['store'], segment)) for segment in old_segments)
@@ -0,0 +1,59 @@
+"""Per-tree parity of the compiled forest and interval invariants on the rice model"""
+import os
+import pickle
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from catalog import COMMODITY_FILES, DISTRICT_TO_MARKETS, build_feature_row
+from inference import compile_forest, parity_sample
+from intervals import PriceIntervals, tree_predictions
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def rice():
+    files = {name: os.path.join(BACKEND, path) for name, path in COMMODITY_FILES['rice'].items()}
+    if not all(os.path.exists(path) for path in files.values()):
+        pytest.skip("rice model pickles not present")
+    with open(files['model'], 'rb') as f:
+        model = pickle.load(f)
+    with open(files['preprocessor'], 'rb') as f:
+        preprocessor = pickle.load(f)
+    return model, preprocessor, compile_forest(model, preprocessor)
+
+
+@pytest.fixture(scope='module')
+def features(rice):
+    _, preprocessor, _ = rice
+    district = DISTRICT_TO_MARKETS['bhandara']
+    days = [date(2025, 1, 1) + timedelta(days=offset) for offset in range(0, 365, 7)]
+    rows = np.array([build_feature_row('rice', district, 0, day) for day in days], dtype=np.float64)
+    return np.vstack([rows, parity_sample(preprocessor, n_rows=256)])
+
+
+def test_compiled_per_tree_outputs_match_sklearn_estimators(rice, features):
+    model, preprocessor, engine = rice
+    expected = np.stack([estimator.predict(preprocessor.transform(features)) for estimator in model.estimators_], axis=1)
+    actual = engine.predict_trees(features)
+    assert actual.shape == (len(features), len(model.estimators_))
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-6)
+    np.testing.assert_allclose(tree_predictions(model, preprocessor.transform(features)), expected)
+
+
+def test_interval_bounds_the_price_and_quantiles_are_monotone(rice, features):
+    _, _, engine = rice
+    intervals = PriceIntervals((0.05, 0.25, 0.5, 0.75, 0.95))
+    summaries = intervals.summarize(engine.predict_trees(features))
+    assert summaries.shape == (len(features), intervals.width)
+
+    bands = summaries[:, 2:]
+    assert np.all(np.diff(bands, axis=1) >= 0)
+    for summary in summaries:
+        price, interval = intervals.describe(summary)
+        assert interval['lower'] <= price <= interval['upper']
+        assert list(interval['quantiles'].values()) == sorted(interval['quantiles'].values())
+        assert interval['spread'] >= 0
+        assert interval['confidence'] in ('high', 'medium', 'low')
@@ -0,0 +1,44 @@
+"""RollingAggregates across series at different price levels"""
+import pytest
+
+from market_stats import RollingAggregates
+
+LATEST = 20000
+
+
+def test_flat_prices_at_different_levels_report_no_change():
+    aggregates = RollingAggregates()
+    # Cheap papaya reports mostly in the latest weeks, dear cotton mostly
+    # before, so pooled rupee means would swing with the arrival mix
+    for offset in range(60):
+        day = LATEST - offset
+        recent = offset < 30
+        for _ in range(5 if recent else 1):
+            aggregates.add('papaya', 'nagpur', day, 1000)
+        for _ in range(1 if recent else 5):
+            aggregates.add('cotton', 'wardha', day, 7000)
+
+    stats = aggregates.series_stats()
+    assert stats['commodities'] == 2
+    assert stats['change_7d_pct'] == pytest.approx(0, abs=0.01)
+    assert stats['change_30d_pct'] == pytest.approx(0, abs=0.01)
+    assert stats['volatility_30d_pct'] == pytest.approx(0, abs=0.01)
+    assert stats['mean_modal_30d'] is None
+
+    cotton = aggregates.series_stats('cotton')
+    assert cotton['mean_modal_7d'] == 7000.0 and cotton['change_30d_pct'] == pytest.approx(0, abs=0.01)
+
+
+def test_change_is_weighted_by_arrivals():
+    aggregates = RollingAggregates()
+    for offset in range(60):
+        day = LATEST - offset
+        recent = offset < 30
+        # Papaya up 10% with 3 arrivals a day, cotton flat with 1
+        for _ in range(3):
+            aggregates.add('papaya', 'nagpur', day, 1100 if recent else 1000)
+        aggregates.add('cotton', 'wardha', day, 7000)
+
+    stats = aggregates.series_stats()
+    assert stats['change_30d_pct'] == pytest.approx(7.5, abs=0.01)
+    assert stats['volatility_30d_pct'] == pytest.approx(0, abs=0.01)
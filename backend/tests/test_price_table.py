@@ -0,0 +1,33 @@
+"""DailyPriceTable over a changing set of resident commodities"""
+from datetime import date
+
+import numpy as np
+
+from price_table import DailyPriceTable
+
+
+def test_table_covers_only_listed_commodities_and_grows_with_them():
+    resident = ['rice']
+    computed = []
+
+    def compute(commodity, dates):
+        computed.append(commodity)
+        return {('Nagpur', 'kalamna'): 0}, np.full((1, len(dates)), 100.0)
+
+    table = DailyPriceTable(lambda: list(resident), compute, days=2)
+    today = date.today()
+    table.refresh(today)
+    assert computed == ['rice']
+    assert table.lookup('rice', 'Nagpur', 'kalamna', today) == 100.0
+    assert table.lookup('cotton', 'Nagpur', 'kalamna', today) is None
+    assert not table.is_stale(today)
+
+    # A model that gets loaded later makes the snapshot stale; one that is
+    # evicted does not, and its rows keep serving until the next rebuild
+    resident.append('cotton')
+    assert table.is_stale(today)
+    table.refresh(today)
+    assert computed == ['rice', 'rice', 'cotton']
+    resident.remove('rice')
+    assert not table.is_stale(today)
+    assert table.lookup('rice', 'Nagpur', 'kalamna', today) == 100.0
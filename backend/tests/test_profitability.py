@@ -0,0 +1,30 @@
+"""Profitability index building on stores without usable rows"""
+from history_store import HistoryStore, StoreWriter
+import profitability
+
+
+class EmptyRegistry:
+    available = []
+    districts = {}
+    encoders = {}
+    sources = {}
+
+    def __contains__(self, commodity):
+        return False
+
+
+def test_empty_store_builds_an_empty_index(tmp_path):
+    store = HistoryStore(str(tmp_path / 'missing'))
+    columns, meta = profitability.build_index(store, EmptyRegistry())
+    assert len(columns['score']) == 0
+    assert meta['commodities'] == []
+
+
+def test_commodity_without_segments_has_no_prices(tmp_path):
+    writer = StoreWriter(str(tmp_path / 'store'))
+    writer.code('commodities', 'cotton')
+    writer.commit()
+    store = HistoryStore(str(tmp_path / 'store'))
+    assert profitability.commodity_prices(store, 'cotton') is None
+    assert profitability.commodity_prices(store, 'rice') is None
+    assert len(profitability.build_index(store, EmptyRegistry())[0]['score']) == 0
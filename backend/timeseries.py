@@ -0,0 +1,69 @@
+"""Resampling and downsampling of price series for charts
+
+`resample` buckets rows by day, ISO week (Monday start) or calendar month.
+`lttb` then reduces a series to a point budget with Largest-Triangle-
+Three-Buckets, which keeps the peaks and troughs a line chart needs, so
+multi-year daily series can be sent as a few hundred points.
+"""
+import numpy as np
+
+INTERVALS = ('daily', 'weekly', 'monthly')
+# Fewest points LTTB can return: the first, the last and one in between
+MIN_POINTS = 3
+
+
+def bucket_starts(days, interval):
+    """First day (days since epoch) of the bucket each day falls in"""
+    days = np.asarray(days, dtype=np.int64)
+    if interval == 'daily':
+        return days
+    if interval == 'weekly':
+        # 1970-01-01 was a Thursday; shift so buckets start on Mondays
+        return days - (days + 3) % 7
+    if interval == 'monthly':
+        months = days.astype('datetime64[D]').astype('datetime64[M]')
+        return months.astype('datetime64[D]').astype(np.int64)
+    raise ValueError(f"Unknown interval '{interval}'. Use one of: {', '.join(INTERVALS)}")
+
+
+def resample(days, p_min, p_max, p_modal, interval='daily'):
+    """Aggregate rows into buckets: mean modal, lowest min, highest max, report count
+
+    Rows from several markets may be passed together; each bucket pools
+    every report in it.
+    """
+    starts, inverse = np.unique(bucket_starts(days, interval), return_inverse=True)
+    count = np.bincount(inverse, minlength=len(starts))
+    modal = np.bincount(inverse, weights=np.asarray(p_modal, dtype=np.float64), minlength=len(starts)) / count
+    low = np.full(len(starts), np.inf)
+    high = np.full(len(starts), -np.inf)
+    np.minimum.at(low, inverse, np.asarray(p_min, dtype=np.float64))
+    np.maximum.at(high, inverse, np.asarray(p_max, dtype=np.float64))
+    return {'date': starts, 'p_min': low, 'p_max': high, 'p_modal': modal, 'count': count}
+
+
+def lttb(x, y, threshold):
+    """Indices of the points Largest-Triangle-Three-Buckets keeps out of len(x)"""
+    n = len(x)
+    if threshold >= n or threshold < MIN_POINTS:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Interior points split into threshold - 2 buckets; first and last are always kept
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # Average of the next bucket (or the last point) is the third triangle vertex
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        areas = np.abs((x[previous] - avg_x) * (y[start:end] - y[previous]) -
+                       (x[previous] - x[start:end]) * (avg_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
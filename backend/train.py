@@ -0,0 +1,255 @@
+"""Train every commodity's price model from the history store
+
+Replaces the per-commodity notebooks with one reproducible pipeline. It
+uses the same cleaning rules (applied by ingest.py), the same nine features
+that predict() builds, the same time-based 80/20 split and the same
+RandomForest settings. Commodities are trained in parallel in a process
+pool, and each forest also uses `n_jobs` cores. Each trained model is
+published as a new bundle version (see bundle.py), which a running API
+picks up with a hot reload.
+
+Cleaned feature matrices are cached per commodity under data/features.
+Segments are append-only, so a later run only featurizes rows from
+segments it has not seen. A cache from a rebuilt store (new store_id) is
+discarded. With --incremental, commodities whose rows have
+not changed since their last training are skipped.
+
+    python ingest.py && python train.py              # retrain everything
+    python train.py --incremental                    # only commodities with new rows
+    python train.py --commodities rice cotton --workers 2
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.impute import SimpleImputer
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from bundle import BUNDLES_PATH, export_bundle
+from catalog import COMMODITY_FILES, STATE_ID
+from history_store import STORE_PATH, HistoryStore, from_days, read_manifest
+
+logger = logging.getLogger(__name__)
+
+FEATURE_CACHE_PATH = './data/features'
+STATE_FILE = 'train_state.json'
+# Columns cached per row; district_encoded is derived at training time
+CACHED_COLUMNS = ['market_id', 'district_id', 'p_min', 'p_max', 'year', 'month', 'day', 'district', 'date', 'p_modal']
+
+# Settings from the training notebooks
+FOREST_PARAMS = {'n_estimators': 100, 'max_depth': 10, 'min_samples_split': 5, 'random_state': 42}
+TRAIN_FRACTION = 0.8
+MIN_ROWS = 50
+
+
+def featurize_segment(segment, code):
+    """Cached feature columns for one commodity's rows in one segment"""
+    rows = np.flatnonzero(segment['commodity'] == code)
+    dates = np.asarray(segment['date'][rows]).astype('datetime64[D]')
+    years = dates.astype('datetime64[Y]')
+    months = dates.astype('datetime64[M]')
+    return {
+        'market_id': np.asarray(segment['market_id'][rows]),
+        'district_id': np.asarray(segment['district_id'][rows]),
+        'p_min': np.asarray(segment['p_min'][rows], dtype=np.float64),
+        'p_max': np.asarray(segment['p_max'][rows], dtype=np.float64),
+        'year': years.astype(np.int64) + 1970,
+        'month': (months - years).astype(np.int64) + 1,
+        'day': (dates - months).astype(np.int64) + 1,
+        'district': np.asarray(segment['district'][rows]),
+        'date': np.asarray(segment['date'][rows]),
+        'p_modal': np.asarray(segment['p_modal'][rows], dtype=np.float64)
+    }
+
+
+def load_features(commodity, store_path=STORE_PATH, cache_path=FEATURE_CACHE_PATH):
+    """Feature columns for a commodity, featurizing only segments not yet in the cache"""
+    store = HistoryStore(store_path)
+    manifest = read_manifest(store_path)
+    segments = manifest['segments']
+    store_id = manifest.get('store_id')
+    code = store.commodities.index(commodity)
+    matrix_path = os.path.join(cache_path, f"{commodity}.npz")
+    meta_path = os.path.join(cache_path, f"{commodity}.json")
+
+    cached, seen = None, []
+    if os.path.exists(matrix_path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        cached_districts = meta.get('districts', [])
+        # Segment names restart after a rebuild, so the cache must come from
+        # this very store, and its district codes must still mean the same
+        if (meta.get('store_id') == store_id and
+                store.districts[:len(cached_districts)] == cached_districts and
+                all(segment in segments for segment in meta['segments'])):
+            seen = meta['segments']
+            with np.load(matrix_path) as data:
+                cached = {name: data[name] for name in CACHED_COLUMNS}
+
+    new_parts = [featurize_segment(store.segments[position], code)
+                 for position, segment in enumerate(segments) if segment not in seen]
+    parts = ([cached] if cached is not None else []) + new_parts
+    columns = {name: np.concatenate([part[name] for part in parts]) for name in CACHED_COLUMNS}
+
+    if new_parts:
+        os.makedirs(cache_path, exist_ok=True)
+        tmp_path = matrix_path + '.tmp.npz'
+        np.savez(tmp_path, **columns)
+        os.replace(tmp_path, matrix_path)
+        with open(meta_path, 'w') as f:
+            json.dump({'store_id': store_id, 'segments': segments, 'districts': store.districts,
+                       'rows': int(len(columns['date']))}, f)
+    district_names = [store.districts[code] for code in columns['district']]
+    return columns, district_names, sum(len(part['date']) for part in new_parts)
+
+
+def train_commodity(commodity, store_path=STORE_PATH, cache_path=FEATURE_CACHE_PATH, bundles_path=BUNDLES_PATH, n_jobs=1):
+    """Fit one commodity's district encoder, preprocessor and forest and publish them as a bundle"""
+    start = time.perf_counter()
+    columns, district_names, new_rows = load_features(commodity, store_path, cache_path)
+    rows = len(columns['date'])
+    if rows < MIN_ROWS:
+        return {'commodity': commodity, 'status': 'skipped', 'reason': f"only {rows} rows"}
+
+    encoder = LabelEncoder()
+    district_encoded = encoder.fit_transform(district_names)
+    X = np.column_stack([
+        columns['market_id'], np.full(rows, STATE_ID), columns['district_id'],
+        columns['p_min'], columns['p_max'],
+        columns['year'], columns['month'], columns['day'],
+        district_encoded
+    ]).astype(np.float64)
+    y = columns['p_modal']
+
+    # Time-based split at the 80th percentile date, as in the notebooks
+    order = np.argsort(columns['date'], kind='stable')
+    X, y, dates = X[order], y[order], columns['date'][order]
+    split_day = np.quantile(dates, TRAIN_FRACTION)
+    train = dates < split_day
+    if not train.any() or train.all():
+        train = np.arange(rows) < int(rows * TRAIN_FRACTION)
+
+    preprocessor = Pipeline([
+        ('imputer', SimpleImputer(strategy='median')),
+        ('scaler', StandardScaler()),
+    ])
+    X_train = preprocessor.fit_transform(X[train])
+    X_test = preprocessor.transform(X[~train])
+    model = RandomForestRegressor(n_jobs=n_jobs, **FOREST_PARAMS)
+    model.fit(X_train, y[train])
+    # Predicting is single-threaded in the API
+    model.n_jobs = None
+
+    predictions = model.predict(X_test)
+    metrics = {
+        'test_rmse': round(float(np.sqrt(mean_squared_error(y[~train], predictions))), 2),
+        'test_mae': round(float(mean_absolute_error(y[~train], predictions)), 2),
+        'test_r2': round(float(r2_score(y[~train], predictions)), 4)
+    }
+
+    window = {
+        'start': from_days(int(dates[0])).isoformat(),
+        'end': from_days(int(dates[-1])).isoformat(),
+        'split_date': from_days(int(split_day)).isoformat(),
+        'rows': int(rows)
+    }
+    version = export_bundle(commodity, model, preprocessor, encoder, {
+        'training_window': window,
+        'metrics': metrics,
+        'params': FOREST_PARAMS
+    }, bundles_path)
+
+    return {
+        'commodity': commodity,
+        'status': 'trained',
+        'version': version,
+        'rows': int(rows),
+        'new_rows': int(new_rows),
+        'train_rows': int(train.sum()),
+        'test_rows': int((~train).sum()),
+        'districts': int(len(encoder.classes_)),
+        'split_date': window['split_date'],
+        **metrics,
+        'seconds': round(time.perf_counter() - start, 2)
+    }
+
+
+def read_state(cache_path=FEATURE_CACHE_PATH):
+    path = os.path.join(cache_path, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def commodity_rows(store):
+    """Rows per commodity, from the store's series index"""
+    rows = {}
+    for (commodity, _), markets in store.index.items():
+        for _, parts in markets.values():
+            rows[commodity] = rows.get(commodity, 0) + sum(end - start for _, start, end in parts)
+    return rows
+
+
+def train_all(commodities=None, store_path=STORE_PATH, cache_path=FEATURE_CACHE_PATH, bundles_path=BUNDLES_PATH,
+              workers=None, n_jobs=None, incremental=False):
+    """Train commodities in a process pool; returns per-commodity results"""
+    start = time.perf_counter()
+    store = HistoryStore(store_path)
+    rows = commodity_rows(store)
+    commodities = [commodity for commodity in (commodities or store.commodity_names) if commodity in COMMODITY_FILES]
+    state = read_state(cache_path)
+    if incremental:
+        unchanged = [commodity for commodity in commodities if state.get(commodity, {}).get('rows') == rows.get(commodity)]
+        for commodity in unchanged:
+            logger.info(f"⏭️ {commodity}: no new rows since last training")
+        commodities = [commodity for commodity in commodities if commodity not in unchanged]
+    if not commodities:
+        return []
+
+    cpus = os.cpu_count() or 1
+    workers = workers or min(len(commodities), cpus)
+    n_jobs = n_jobs or max(1, cpus // workers)
+    logger.info(f"🏋️ Training {len(commodities)} commodities with {workers} workers x {n_jobs} forest jobs")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {commodity: pool.submit(train_commodity, commodity, store_path, cache_path, bundles_path, n_jobs)
+                   for commodity in commodities}
+        results = []
+        for commodity, future in futures.items():
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"❌ Training {commodity} failed: {str(e)}")
+                result = {'commodity': commodity, 'status': 'failed', 'error': str(e)}
+            if result['status'] == 'trained':
+                logger.info(f"✅ {commodity} {result['version']}: {result['rows']} rows, test RMSE {result['test_rmse']}, R² {result['test_r2']} in {result['seconds']}s")
+                state[commodity] = {'rows': result['rows'], 'trained_at': time.strftime('%Y-%m-%dT%H:%M:%S'), **result}
+            results.append(result)
+
+    os.makedirs(cache_path, exist_ok=True)
+    with open(os.path.join(cache_path, STATE_FILE), 'w') as f:
+        json.dump(state, f, indent=2)
+    logger.info(f"🏁 Trained {sum(r['status'] == 'trained' for r in results)}/{len(results)} commodities in {time.perf_counter() - start:.1f}s")
+    return results
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--commodities', nargs='*', help='default: every commodity in the store')
+    parser.add_argument('--store', default=STORE_PATH)
+    parser.add_argument('--cache', default=FEATURE_CACHE_PATH, help='feature matrix cache directory')
+    parser.add_argument('--bundles', default=BUNDLES_PATH, help='bundle directory to publish to')
+    parser.add_argument('--workers', type=int, help='training processes (default: one per commodity, up to the CPU count)')
+    parser.add_argument('--n-jobs', type=int, help='cores per forest (default: CPUs / workers)')
+    parser.add_argument('--incremental', action='store_true', help='skip commodities without new rows')
+    args = parser.parse_args()
+    train_all(args.commodities, args.store, args.cache, args.bundles, args.workers, args.n_jobs, args.incremental)
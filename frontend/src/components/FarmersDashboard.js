@@ -267,7 +267,9 @@ const FarmersDashboard = () => {
           crop: data.commodity_display || cropForm.cropName,
           marketAverage: `₹${(data.predicted_price * 0.9).toFixed(0)}/quintal`, // Simulated market average
           profitPotential: "+10.5%",
-          confidence: "92%",
+          confidence: data.interval
+            ? `${data.interval.confidence} (₹${data.interval.lower}–₹${data.interval.upper})`
+            : "n/a",
           recommendation: `Good time to sell in ${data.market} market`,
           actualData: data
         });
@@ -302,7 +304,16 @@ const FarmersDashboard = () => {
         body: formData
       });
 
-      if (response.ok) {
+      if (response.status === 202) {
+        // Analysis is still running; long-poll the job until it finishes
+        const { status_url: statusUrl } = await response.json();
+        for (let attempt = 0; attempt < 6; attempt++) {
+          const poll = await fetch(`${API_BASE_URL}${statusUrl.replace(/^\/api/, '')}?wait=10`);
+          if (poll.status !== 202) {
+            return poll.ok ? await poll.json() : null;
+          }
+        }
+      } else if (response.ok) {
         return await response.json();
       }
     } catch (error) {
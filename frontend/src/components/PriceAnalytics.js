@@ -189,17 +189,44 @@ const PriceAnalytics = () => {
     loadAnalyticsData();
   }, [selectedCommodity, selectedDistrict, timeRange]);
 
-  const loadAnalyticsData = () => {
+  // Time range -> days of history and chart resolution for /api/timeseries
+  const rangeQueries = {
+    '1month': { days: 30, interval: 'weekly' },
+    '3months': { days: 90, interval: 'monthly' },
+    '6months': { days: 180, interval: 'monthly' },
+    '1year': { days: 365, interval: 'monthly' }
+  };
+
+  const fetchChartData = async (commodity, district, range) => {
+    const { days, interval } = rangeQueries[range];
+    const params = new URLSearchParams({ commodity, district, days, interval, points: 60 });
+    const response = await fetch(`http://127.0.0.1:5000/api/timeseries?${params}`);
+    if (!response.ok) {
+      throw new Error(`Time series request failed: ${response.status}`);
+    }
+    const data = await response.json();
+    return data.dates.map((date, index) => ({
+      month: interval === 'monthly'
+        ? new Date(date).toLocaleString('en-IN', { month: 'short' })
+        : new Date(date).toLocaleDateString('en-IN', { day: 'numeric', month: 'short' }),
+      price: Math.round(data.p_modal[index]),
+      trend: index > 0 && data.p_modal[index] < data.p_modal[index - 1] ? 'down' : 'up'
+    }));
+  };
+
+  const loadAnalyticsData = async () => {
     setLoading(true);
-    
-    // Simulate API call
-    setTimeout(() => {
+
+    try {
+      setChartData(await fetchChartData(selectedCommodity, selectedDistrict, timeRange));
+    } catch (error) {
+      console.error('Error fetching price history:', error);
       setChartData(generateChartData(selectedCommodity, timeRange));
-      setMarketInsights(generateMarketInsights(selectedCommodity));
-      setPriceComparisons(generatePriceComparisons());
-      setTrendingCommodities(generateTrendingCommodities());
-      setLoading(false);
-    }, 1000);
+    }
+    setMarketInsights(generateMarketInsights(selectedCommodity));
+    setPriceComparisons(generatePriceComparisons());
+    setTrendingCommodities(generateTrendingCommodities());
+    setLoading(false);
   };
 
   const getCommodityColor = (commodityId) => {